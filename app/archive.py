@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from datetime import timedelta
+from os import getenv
+
+from app.background import PeriodicWorker
+from app.monitoring import users_archived_total
+from database.crud import archive_stale_users, now_utc
+
+# Как часто запускать архивацию; 0 — не архивировать
+ARCHIVE_INTERVAL = float(getenv('ARCHIVE_INTERVAL', 3600))
+# Неквалифицированные анкеты уходят в архив через столько дней после опроса
+ARCHIVE_NONQUAL_AFTER = timedelta(days=float(getenv('ARCHIVE_NONQUAL_DAYS', 30)))
+# Не закончившие опрос — через столько дней после последнего /start.
+# Больше FSM_TTL_HOURS и последнего напоминания: брошенную сессию уже не продолжить
+ARCHIVE_ABANDONED_AFTER = timedelta(days=float(getenv('ARCHIVE_ABANDONED_DAYS', 30)))
+ARCHIVE_BATCH_SIZE = int(getenv('ARCHIVE_BATCH_SIZE', 5000))
+# Пауза между пачками, чтобы не занимать базу целиком
+ARCHIVE_BATCH_PAUSE = float(getenv('ARCHIVE_BATCH_PAUSE', 0.5))
+
+
+class UserArchiver:
+    """
+    Периодически переносит устаревших пользователей из users в users_archive.
+
+    Горячая таблица остаётся с квалифицированными лидами и теми, кто
+    проходит опрос сейчас, поэтому её индексы не растут вместе с каждым
+    случайным /start. Перенос идёт пачками по ARCHIVE_BATCH_SIZE, каждая —
+    одна короткая транзакция; несколько реплик не мешают друг другу
+    (SKIP LOCKED). Поиск по user_id в crud смотрит и в архив, а /start
+    возвращает пользователя в users.
+    """
+
+    def __init__(self, interval: float = ARCHIVE_INTERVAL,
+                 batch_size: int = ARCHIVE_BATCH_SIZE):
+        self._batch_size = batch_size
+        self._worker = PeriodicWorker("архивация пользователей", interval, self._tick)
+
+    def start(self):
+        self._worker.start()
+
+    async def stop(self):
+        await self._worker.stop()
+
+    async def archive(self) -> int:
+        """Один проход архивации; возвращает число перенесённых пользователей."""
+        now = now_utc()
+        total = 0
+        while True:
+            moved = await archive_stale_users(now - ARCHIVE_NONQUAL_AFTER,
+                                              now - ARCHIVE_ABANDONED_AFTER,
+                                              self._batch_size)
+            total += moved
+            users_archived_total.inc(amount=moved)
+            if moved < self._batch_size:
+                return total
+            await asyncio.sleep(ARCHIVE_BATCH_PAUSE)
+
+    async def _tick(self):
+        if archived := await self.archive():
+            logging.info("В архив перенесено пользователей: %s", archived)
+
+
+user_archiver = UserArchiver()
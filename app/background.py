@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+
+class PeriodicWorker:
+    """
+    Фоновая задача, которая вызывает tick в цикле.
+
+    tick возвращает паузу до следующего вызова в секундах (None — interval).
+    notify() прерывает паузу, если что-то появилось раньше. Ошибка tick
+    пишется в лог, цикл продолжается после interval. При interval <= 0
+    задача не запускается.
+    """
+
+    def __init__(self, name: str, interval: float,
+                 tick: Callable[[], Awaitable[float | None]],
+                 first_delay: float = 0):
+        self.name = name
+        self.interval = interval
+        self._tick = tick
+        self._first_delay = first_delay
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Будит цикл, не дожидаясь конца паузы."""
+        self._wakeup.set()
+
+    async def _sleep(self, delay: float):
+        if delay <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        logging.info("Запущено: %s", self.name)
+        delay = self._first_delay
+        while True:
+            await self._sleep(delay)
+            self._wakeup.clear()
+            try:
+                delay = await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error("Ошибка (%s): %s", self.name, e, exc_info=True)
+                delay = self.interval
+            if delay is None:
+                delay = self.interval
@@ -3,47 +3,6 @@ HELLO = '''Здравствуйте! 👋
 Ответьте на несколько коротких вопросов — это займет 2–3 минуты и поможет оценить ваши шансы на поступление и понять, какой формат обучения подойдет именно вам.
 '''
 
-QUESTIONS = {
-    1: {
-        'text': 'Возраст студента (полных лет)',
-        'options': ['до 14', '15–17', '18–21', '22–29', '30+']
-    },
-    2: {
-        'text': 'Каким образованием за рубежом интересуетесь?',
-        'options': ['школа', 'бакалавриат', 'магистратура', 'другое']
-    },
-    3: {
-        'text': 'Уровень языка студента',
-        'options': ['A2 или ниже', 'B1', 'B2', 'C1-C2', 'Затрудняюсь ответить']
-    },
-    4: {
-        'text': 'Закладываемая сумма на оплату обучения и наши услуги по поступлению в зарубежный вуз, ежегодно (примерно)',
-        'options': ['до 1 000 €', '1 000–3 000 €', '3 000–5 000 €', 'Рассчитываю только на грант']
-    },
-    5: {
-        'text': 'Какой у вас бюджет на проживание (ежемесячно)?',
-        'options': ['до 500 €', '500–800 €', '800–1 200 €', '1 200 € и вышe', 'пока нет понимания']
-    },
-    6: {
-        'text': 'Планируемый год поступления:',
-        'options': ['2026', '2027', '2028 и позже']
-    },
-    7: {
-        'text': 'Интересующие страны:',
-        'options': ['Германия', 'Австрия', 'Италия', 'Несколько стран', 'Пока не определился(ась)']
-    },
-    8: {
-        'text': 'Кратко напишите текстом, на какую специальность и в какую страну вы планируете поступать.',
-        'type': 'text_input'
-    },
-    9: {
-        'text': 'Формат поступления',
-        'options': ['самостоятельно', 'сопровождением', 'пока не решил(а)']
-    }
-}
-
-ERROR_8 = 'Извините, я вас не понял. Пожалуйста, напишите одно краткое (до 1500 символов) текстовое сообщение: на какую специальность и в какую страну вы планируете поступать?'
-
 NON_QUEL_MSG = '''Спасибо за ваши ответы 🙌
 На текущем этапе шансы на поступление пока невысокие, но это не означает, что путь закрыт. В большинстве случаев ситуацию можно улучшить — например, за счёт уровня языка, выбора страны или корректной стратегии подготовки.
 Мы собрали полезные материалы и ответы на частые вопросы, которые помогут вам лучше разобраться в возможностях поступления и понять, с чего начать.
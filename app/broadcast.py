@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import os
+import shlex
+import socket
+from datetime import date, timedelta
+from os import getenv
+
+from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery, Message
+
+from app import keyboards as kb
+from app.background import PeriodicWorker
+from app.handers import MANAGER_IDS
+from app.outbound import Lane, outbound_lane
+from app.survey import survey_loader
+from database.crud import (checkpoint_broadcast, claim_broadcasts,
+                           count_segment, create_broadcast, finish_broadcast,
+                           get_running_broadcasts, release_broadcasts,
+                           stream_segment_user_ids)
+from database.models import Broadcast
+
+# Сколько отправок идёт одновременно; общий темп всё равно держит OutboundLimiter
+BROADCAST_CONCURRENCY = int(getenv('BROADCAST_CONCURRENCY', 30))
+BROADCAST_PAGE_SIZE = int(getenv('BROADCAST_PAGE_SIZE', 1000))
+# Аренда рассылки, с: продлевается после каждой пачки; рассылку упавшей
+# реплики другая забирает не раньше, чем аренда истечёт
+BROADCAST_LEASE = float(getenv('BROADCAST_LEASE', 120))
+
+BOOL_KEYS = {'qual', 'completed', 'has_phone'}
+DATE_KEYS = {'since', 'until'}
+ANSWER_KEYS = {f'ans_{i}' for i in range(1, 10)}
+TRUE_VALUES = {'1', 'true', 'yes', 'да'}
+FALSE_VALUES = {'0', 'false', 'no', 'нет'}
+
+BROADCAST_HELP = (
+    "Использование: /broadcast ключ=значение ...\n\n"
+    "qual=1|0 — квалифицированные / нет\n"
+    "completed=1|0 — прошли опрос / нет\n"
+    "has_phone=1|0 — оставили телефон / нет\n"
+    "ans_1 … ans_9=ответ — вариант ответа как на кнопке, с пробелами — в кавычках\n"
+    "since=ГГГГ-ММ-ДД, until=ГГГГ-ММ-ДД — дата регистрации (МСК)\n\n"
+    "Пример: /broadcast qual=1 ans_7=Германия since=2025-09-01\n"
+    "Без условий — все пользователи."
+)
+
+router = Router()
+router.message.filter(F.from_user.id.in_(MANAGER_IDS))
+router.callback_query.filter(F.from_user.id.in_(MANAGER_IDS))
+
+
+class BroadcastForm(StatesGroup):
+    waiting_for_message = State()
+    confirm = State()
+
+
+def parse_segment(args: str | None) -> dict:
+    """Разбирает условия /broadcast в словарь сегмента; ValueError — с текстом для менеджера."""
+    segment = {}
+    for token in shlex.split(args or ''):
+        key, sep, value = token.partition('=')
+        key = key.lower()
+        if not sep or not value:
+            raise ValueError(f"Ожидается ключ=значение: {token}")
+        if key in BOOL_KEYS:
+            if value.lower() in TRUE_VALUES:
+                segment[key] = True
+            elif value.lower() in FALSE_VALUES:
+                segment[key] = False
+            else:
+                raise ValueError(f"{key}: ожидается 1 или 0")
+        elif key in DATE_KEYS:
+            try:
+                segment[key] = date.fromisoformat(value).isoformat()
+            except ValueError:
+                raise ValueError(f"{key}: ожидается дата ГГГГ-ММ-ДД")
+        elif key in ANSWER_KEYS:
+            question = survey_loader.survey.questions.get(int(key.split('_')[1]))
+            if question is None or question.is_text:
+                raise ValueError(f"{key}: у вопроса нет вариантов ответа")
+            if (index := question.indexes.get(value)) is None:
+                options = ", ".join(question.options)
+                raise ValueError(f"{key}: нет такого варианта. Варианты: {options}")
+            segment[key] = index
+        else:
+            raise ValueError(f"Неизвестное условие: {key}")
+    return segment
+
+
+def describe_segment(segment: dict) -> str:
+    if not segment:
+        return "все пользователи"
+    survey = survey_loader.survey
+    return ", ".join(
+        f"{key}={survey.answer_text(int(key.split('_')[1]), value) if key in ANSWER_KEYS else value}"
+        for key, value in segment.items()
+    )
+
+
+def format_report(report) -> str:
+    elapsed = report.finished_at - report.created_at
+    minutes, seconds = divmod(int(elapsed.total_seconds()), 60)
+    return (
+        f"📣 Рассылка #{report.id} завершена за {minutes} мин {seconds} с\n"
+        f"Получателей в сегменте: {report.total}\n"
+        f"Доставлено: {report.sent}\n"
+        f"Заблокировали бота: {report.blocked}\n"
+        f"Ошибок: {report.failed}"
+    )
+
+
+class BroadcastRunner:
+    """
+    Выполняет рассылки в фоне.
+
+    Получатели читаются потоком из stream_segment_user_ids, отправка идёт
+    пачками по BROADCAST_CONCURRENCY в полосе BULK, после каждой пачки
+    прогресс сохраняется в broadcasts. После перезапуска рассылка
+    продолжается с last_user_id: повторно может уйти не больше одной пачки.
+
+    При нескольких репликах рассылку выполняет только арендовавший её
+    процесс (owner); аренда продлевается вместе с прогрессом. Фоновый цикл
+    забирает рассылки без владельца или с истёкшей арендой.
+    """
+
+    def __init__(self, concurrency: int = BROADCAST_CONCURRENCY,
+                 page_size: int = BROADCAST_PAGE_SIZE,
+                 lease: float = BROADCAST_LEASE,
+                 owner: str = f'{socket.gethostname()}:{os.getpid()}'):
+        self._concurrency = concurrency
+        self._page_size = page_size
+        self.lease = timedelta(seconds=lease)
+        self.owner = owner
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._bot: Bot | None = None
+        self._claim_worker = PeriodicWorker("захват рассылок", self.lease.total_seconds(),
+                                            self._claim, first_delay=self.lease.total_seconds())
+
+    def start(self, bot: Bot, broadcast: Broadcast):
+        task = self._tasks.get(broadcast.id)
+        if task is None or task.done():
+            self._tasks[broadcast.id] = asyncio.create_task(self._run(bot, broadcast))
+
+    async def resume(self, bot: Bot):
+        """
+        Продолжает рассылки, прерванные остановкой бота, и запускает цикл,
+        который подхватывает рассылки других реплик с истёкшей арендой.
+        """
+        self._bot = bot
+        await self._claim()
+        self._claim_worker.start()
+
+    async def _claim(self):
+        for broadcast in await claim_broadcasts(self.owner, self.lease):
+            logging.info("Продолжаем рассылку #%s после user_id %s", broadcast.id, broadcast.last_user_id)
+            self.start(self._bot, broadcast)
+
+    async def stop(self):
+        await self._claim_worker.stop()
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        try:
+            await release_broadcasts(self.owner)
+        except Exception as e:
+            logging.error("Не удалось снять аренду рассылок: %s", e)
+
+    async def _deliver(self, bot: Bot, broadcast: Broadcast, user_id: int) -> str:
+        try:
+            with outbound_lane(Lane.BULK):
+                await bot.copy_message(user_id, broadcast.from_chat_id, broadcast.message_id)
+            return 'sent'
+        except TelegramForbiddenError:
+            return 'blocked'
+        except TelegramBadRequest as e:
+            logging.warning("Рассылка #%s: не доставлено %s: %s", broadcast.id, user_id, e)
+            return 'failed'
+        except Exception as e:
+            logging.error("Рассылка #%s: ошибка отправки %s: %s", broadcast.id, user_id, e)
+            return 'failed'
+
+    async def _send_chunk(self, bot: Bot, broadcast: Broadcast, user_ids: list[int]) -> bool:
+        """
+        Отправляет пачку и сохраняет прогресс; False — рассылку остановили
+        или её забрал другой процесс.
+        """
+        results = await asyncio.gather(*(
+            self._deliver(bot, broadcast, user_id)
+            for user_id in user_ids if user_id not in MANAGER_IDS
+        ))
+        status = await checkpoint_broadcast(
+            broadcast.id, self.owner, self.lease, user_ids[-1],
+            sent=results.count('sent'),
+            blocked=results.count('blocked'),
+            failed=results.count('failed'),
+        )
+        return status == 'running'
+
+    async def _run(self, bot: Bot, broadcast: Broadcast):
+        logging.info("Рассылка #%s запущена: %s", broadcast.id, describe_segment(broadcast.segment))
+        try:
+            chunk = []
+            async for user_id in stream_segment_user_ids(
+                    broadcast.segment, broadcast.last_user_id, self._page_size):
+                chunk.append(user_id)
+                if len(chunk) < self._concurrency:
+                    continue
+                if not await self._send_chunk(bot, broadcast, chunk):
+                    logging.info("Рассылка #%s остановлена", broadcast.id)
+                    return
+                chunk = []
+            if chunk and not await self._send_chunk(bot, broadcast, chunk):
+                return
+
+            if report := await finish_broadcast(broadcast.id):
+                logging.info("Рассылка #%s завершена: доставлено %s, заблокировали %s, ошибок %s",
+                             broadcast.id, report.sent, report.blocked, report.failed)
+                await bot.send_message(report.created_by, format_report(report))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error("Ошибка в рассылке #%s: %s", broadcast.id, e, exc_info=True)
+        finally:
+            self._tasks.pop(broadcast.id, None)
+
+
+broadcast_runner = BroadcastRunner()
+
+
+@router.message(Command('broadcast'))
+async def broadcast_command(message: Message, command: CommandObject, state: FSMContext):
+    try:
+        segment = parse_segment(command.args)
+    except ValueError as e:
+        return await message.answer(f"{e}\n\n{BROADCAST_HELP}")
+
+    total = await count_segment(segment)
+    if not total:
+        return await message.answer(f"В сегменте ({describe_segment(segment)}) нет пользователей.")
+
+    await state.set_state(BroadcastForm.waiting_for_message)
+    await state.set_data({'segment': segment, 'total': total})
+    await message.answer(
+        f"Сегмент: {describe_segment(segment)}\nПолучателей: {total}\n\n"
+        f"Пришлите сообщение для рассылки (текст, фото, видео…) или /cancel"
+    )
+
+
+@router.message(Command('cancel'), BroadcastForm.waiting_for_message)
+@router.message(Command('cancel'), BroadcastForm.confirm)
+async def cancel_broadcast_setup(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer("Рассылка отменена")
+
+
+@router.message(BroadcastForm.waiting_for_message)
+async def broadcast_message(message: Message, state: FSMContext):
+    await state.update_data(from_chat_id=message.chat.id, message_id=message.message_id)
+    await state.set_state(BroadcastForm.confirm)
+    total = (await state.get_data())['total']
+    await message.reply(f"Отправить это сообщение {total} получателям?",
+                        reply_markup=kb.BROADCAST_CONFIRM_KEYBOARD)
+
+
+@router.callback_query(F.data == 'broadcast_confirm', BroadcastForm.confirm)
+async def broadcast_confirm(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    broadcast = await create_broadcast(
+        created_by=callback.from_user.id,
+        from_chat_id=data['from_chat_id'],
+        message_id=data['message_id'],
+        segment=data['segment'],
+        total=data['total'],
+        owner=broadcast_runner.owner,
+        lease=broadcast_runner.lease,
+    )
+    broadcast_runner.start(callback.bot, broadcast)
+    try:
+        await callback.message.edit_text(
+            f"📣 Рассылка #{broadcast.id} запущена. Прогресс: /broadcasts, "
+            f"остановить: /broadcast_stop {broadcast.id}")
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
+
+
+@router.callback_query(F.data == 'broadcast_abort')
+async def broadcast_abort(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    try:
+        await callback.message.edit_text("Рассылка отменена")
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
+
+
+@router.message(Command('broadcasts'))
+async def list_broadcasts(message: Message):
+    broadcasts = await get_running_broadcasts()
+    if not broadcasts:
+        return await message.answer("Активных рассылок нет")
+    lines = []
+    for b in broadcasts:
+        done = b.sent + b.blocked + b.failed
+        lines.append(f"#{b.id}: {done}/{b.total} ({describe_segment(b.segment)}), "
+                     f"доставлено {b.sent}, заблокировали {b.blocked}, ошибок {b.failed}")
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command('broadcast_stop'))
+async def stop_broadcast(message: Message, command: CommandObject):
+    if not command.args or not command.args.strip().isdigit():
+        return await message.answer("Использование: /broadcast_stop <номер рассылки>")
+    report = await finish_broadcast(int(command.args), status='cancelled')
+    if not report:
+        return await message.answer("Такой активной рассылки нет")
+    await message.answer(format_report(report).replace("завершена", "остановлена", 1))
@@ -0,0 +1,122 @@
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+from os import getenv
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.background import PeriodicWorker
+from app.monitoring import updates_duplicate_total
+from database.crud import (cleanup_processed_updates, forget_processed_update,
+                           mark_update_processed)
+
+# Сколько последних update_id помнит процесс
+UPDATE_DEDUPE_WINDOW = int(getenv('UPDATE_DEDUPE_WINDOW', 10000))
+# 1 — дополнительно сверяться с таблицей processed_updates (несколько реплик, перезапуски)
+UPDATE_DEDUPE_DB = getenv('UPDATE_DEDUPE_DB', '0').lower() in ('1', 'true', 'yes')
+# Telegram хранит недоставленные апдейты сутки: дольше помнить их незачем
+UPDATE_DEDUPE_RETENTION = timedelta(hours=float(getenv('UPDATE_DEDUPE_RETENTION_HOURS', 48)))
+UPDATE_DEDUPE_CLEANUP_INTERVAL = float(getenv('UPDATE_DEDUPE_CLEANUP_INTERVAL', 3600))
+
+
+class RecentUpdates:
+    """Окно последних update_id фиксированного размера: проверка и вставка за O(1)."""
+
+    def __init__(self, size: int = UPDATE_DEDUPE_WINDOW):
+        self._size = size
+        self._seen: OrderedDict[tuple[int, int], None] = OrderedDict()
+
+    def add(self, key: tuple[int, int]) -> bool:
+        """Запоминает апдейт; False — он уже был в окне."""
+        if key in self._seen:
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self._size:
+            self._seen.popitem(last=False)
+        return True
+
+    def discard(self, key: tuple[int, int]):
+        self._seen.pop(key, None)
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class UpdateDedupeMiddleware(BaseMiddleware):
+    """
+    Outer-middleware апдейтов сразу за UpdateSchedulerMiddleware:
+    отбрасывает повторно доставленные апдейты до FSM, обработчиков
+    и запросов к Telegram.
+
+    Сначала update_id проверяется по окну в памяти процесса. С
+    UPDATE_DEDUPE_DB новый апдейт ещё и записывается в processed_updates
+    одним INSERT ... ON CONFLICT DO NOTHING: так повтор ловится и другой
+    репликой, и после перезапуска. Если база недоступна, апдейт
+    обрабатывается — лучше редкий дубль, чем потерянное сообщение.
+    Если обработчик упал, отметка снимается: повторная доставка от
+    Telegram будет обработана, а не отброшена.
+    """
+
+    def __init__(self, window: int = UPDATE_DEDUPE_WINDOW,
+                 persistent: bool = UPDATE_DEDUPE_DB):
+        self._recent = RecentUpdates(window)
+        self._persistent = persistent
+        self._cleanup_worker: PeriodicWorker | None = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        bot_id = data["bot"].id
+        key = (bot_id, event.update_id)
+        if not self._recent.add(key):
+            updates_duplicate_total.inc('memory')
+            logging.debug("Повторный апдейт %s отброшен", event.update_id)
+            return None
+
+        if self._persistent:
+            try:
+                is_new = await mark_update_processed(bot_id, event.update_id)
+            except Exception as e:
+                logging.warning("Не удалось проверить апдейт %s в БД: %s", event.update_id, e)
+                is_new = True
+            if not is_new:
+                updates_duplicate_total.inc('db')
+                logging.info("Апдейт %s уже обработан другим процессом", event.update_id)
+                return None
+
+        try:
+            return await handler(event, data)
+        except BaseException:
+            await self._forget(key)
+            raise
+
+    async def _forget(self, key: tuple[int, int]):
+        self._recent.discard(key)
+        if self._persistent:
+            try:
+                await forget_processed_update(*key)
+            except Exception as e:
+                logging.warning("Не удалось снять отметку апдейта %s в БД: %s", key[1], e)
+
+    def start_cleanup(self, interval: float = UPDATE_DEDUPE_CLEANUP_INTERVAL):
+        if self._persistent and self._cleanup_worker is None:
+            self._cleanup_worker = PeriodicWorker("очистка processed_updates", interval, self._cleanup)
+            self._cleanup_worker.start()
+
+    @staticmethod
+    async def _cleanup():
+        if deleted := await cleanup_processed_updates(UPDATE_DEDUPE_RETENTION):
+            logging.info("Удалено старых записей processed_updates: %s", deleted)
+
+    async def close(self):
+        if self._cleanup_worker:
+            await self._cleanup_worker.stop()
+            self._cleanup_worker = None
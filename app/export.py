@@ -0,0 +1,187 @@
+import asyncio
+import csv
+import logging
+import os
+import shlex
+import tempfile
+from datetime import datetime
+from os import getenv
+from zoneinfo import ZoneInfo
+
+from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramEntityTooLarge
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+from app.broadcast import describe_segment, parse_segment
+from app.handers import MANAGER_IDS
+from app.survey import survey_loader
+from database.crud import stream_segment_rows
+from database.models import User
+
+# Сколько строк накапливается перед записью в файл в отдельном потоке
+EXPORT_CHUNK_SIZE = int(getenv('EXPORT_CHUNK_SIZE', 2000))
+
+EXPORT_COLUMNS = (
+    User.user_id, User.username, User.registered_at, User.survey_completed_at,
+    *(getattr(User, f'ans_{i}') for i in range(1, 10)),
+    User.qual, User.phone, User.comments,
+)
+
+
+def export_header() -> tuple:
+    questions = survey_loader.survey.questions
+    return (
+        'TG ID', 'Username', 'Дата регистрации', 'Дата прохождения опроса',
+        *(questions[i].text if i in questions else f'Вопрос {i}' for i in range(1, 10)),
+        'Квалифицирован', 'Телефон', 'Комментарий',
+    )
+
+
+EXPORT_HELP = (
+    "Использование: /export [users|leads] [csv|xlsx] [условия]\n\n"
+    "users — все пользователи сегмента (по умолчанию), leads — только "
+    "квалифицированные с телефоном.\n"
+    "Условия — как в /broadcast: qual=1, since=ГГГГ-ММ-ДД, until=ГГГГ-ММ-ДД и т.д.\n\n"
+    "Пример: /export leads xlsx since=2025-09-01 until=2025-09-30"
+)
+
+router = Router()
+router.message.filter(F.from_user.id.in_(MANAGER_IDS))
+
+_export_tasks: set[asyncio.Task] = set()
+
+
+# Позиции ответов в EXPORT_COLUMNS -> номер вопроса
+ANSWER_POSITIONS = {4 + i: i + 1 for i in range(9)}
+# С этих символов Excel начинает формулу: ответы, комментарии и username
+# пишут пользователи, и «=HYPERLINK(...)» не должен стать живой формулой
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _is_formula_like(value) -> bool:
+    return isinstance(value, str) and value.startswith(FORMULA_PREFIXES)
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.astimezone(ZoneInfo("Europe/Moscow")).strftime('%d.%m.%Y %H:%M')
+    if isinstance(value, bool):
+        return 'да' if value else 'нет'
+    return '' if value is None else value
+
+
+class CsvWriter:
+    def __init__(self, path: str):
+        # utf-8-sig — чтобы Excel сразу открыл кириллицу
+        self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file)
+
+    def write(self, rows: list):
+        # Апостроф в начале Excel показывает как текст, а не вычисляет
+        self._writer.writerows([f"'{value}" if _is_formula_like(value) else value for value in row]
+                               for row in rows)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxWriter:
+    def __init__(self, path: str):
+        self._path = path
+        # write_only: строки сразу уходят во временный XML, а не держатся в памяти
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet('Пользователи')
+
+    def write(self, rows: list):
+        for row in rows:
+            self._sheet.append([self._text_cell(value) if _is_formula_like(value) else value
+                                for value in row])
+
+    def _text_cell(self, value: str) -> WriteOnlyCell:
+        """Ячейка-строка: openpyxl иначе сохранит значение с «=» как формулу"""
+        cell = WriteOnlyCell(self._sheet, value)
+        cell.data_type = 's'
+        return cell
+
+    def close(self):
+        self._workbook.save(self._path)
+
+
+WRITERS = {'csv': CsvWriter, 'xlsx': XlsxWriter}
+
+
+async def export_segment(segment: dict, fmt: str, path: str) -> int:
+    """
+    Пишет сегмент в файл и возвращает число строк.
+
+    Строки читаются из БД потоком, а запись пачками по EXPORT_CHUNK_SIZE
+    выполняется в отдельном потоке, чтобы не блокировать event loop.
+    """
+    writer = await asyncio.to_thread(WRITERS[fmt], path)
+    survey = survey_loader.survey
+    count = 0
+    try:
+        chunk = [export_header()]
+        async for row in stream_segment_rows(segment, EXPORT_COLUMNS):
+            chunk.append([
+                _format_value(survey.answer_text(ANSWER_POSITIONS[pos], value)
+                              if pos in ANSWER_POSITIONS else value)
+                for pos, value in enumerate(row)
+            ])
+            count += 1
+            if len(chunk) >= EXPORT_CHUNK_SIZE:
+                await asyncio.to_thread(writer.write, chunk)
+                chunk = []
+        if chunk:
+            await asyncio.to_thread(writer.write, chunk)
+    finally:
+        await asyncio.to_thread(writer.close)
+    return count
+
+
+async def _send_export(bot: Bot, chat_id: int, segment: dict, kind: str, fmt: str):
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}', prefix='export_')
+    os.close(fd)
+    try:
+        count = await export_segment(segment, fmt, path)
+        filename = f"{kind}_{datetime.now(ZoneInfo('Europe/Moscow')):%Y%m%d_%H%M}.{fmt}"
+        await bot.send_document(
+            chat_id, FSInputFile(path, filename=filename),
+            caption=f"Выгрузка: {describe_segment(segment)}\nСтрок: {count}")
+        logging.info("Выгрузка %s: %s строк", filename, count)
+    except TelegramEntityTooLarge:
+        await bot.send_message(chat_id, "Файл больше 50 МБ — сузьте период или условия выгрузки.")
+    except Exception:
+        # Текст исключения (SQL, пути) в чат не отправляем — только в лог
+        logging.exception("Ошибка выгрузки")
+        await bot.send_message(chat_id, "Не удалось сформировать выгрузку, подробности в логе бота.")
+    finally:
+        os.unlink(path)
+
+
+@router.message(Command('export'))
+async def export_command(message: Message, command: CommandObject):
+    kind, fmt, conditions = 'users', 'csv', []
+    try:
+        # ValueError и от shlex: незакрытая кавычка в аргументах
+        for token in shlex.split(command.args or ''):
+            if token.lower() in ('users', 'leads'):
+                kind = token.lower()
+            elif token.lower() in WRITERS:
+                fmt = token.lower()
+            else:
+                conditions.append(token)
+        segment = parse_segment(shlex.join(conditions))
+    except ValueError as e:
+        return await message.answer(f"{e}\n\n{EXPORT_HELP}")
+    if kind == 'leads':
+        segment.update(qual=True, has_phone=True)
+
+    await message.answer(f"Готовлю выгрузку ({describe_segment(segment)})…")
+    # В фоне: иначе пока собирается файл, остальные апдейты менеджера ждут
+    task = asyncio.create_task(_send_export(message.bot, message.chat.id, segment, kind, fmt))
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
@@ -1,72 +1,85 @@
 import asyncio
 import logging
 import re
+from datetime import date, timedelta
 from os import getenv
 from zoneinfo import ZoneInfo
 
 from aiogram import Bot, F, Router
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import (CallbackQuery, InlineKeyboardButton,
-                           InlineKeyboardMarkup, KeyboardButton, Message,
-                           ReplyKeyboardMarkup, ReplyKeyboardRemove)
+from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
+from sqlalchemy import Row
 
 from app import keyboards as kb
-from app.bot_msg import (COMMENT_REQUEST, CONTACT_REQUEST, ERROR_8, FAQ, FINAL,
-                         HELLO, NON_QUEL_MSG, QUESTIONS, REMINDER_10MIN,
-                         REMINDER_24H, REMINDER_2H, SUCCESS_MESSAGE)
-from database.crud import (add_user, get_user_by_id, mark_reminder_sent,
-                           save_survey, update_user_comments,
-                           update_user_phone, update_user_started_at,
-                           user_completed_survey)
+from app.bot_msg import (COMMENT_REQUEST, CONTACT_REQUEST, FAQ, FINAL, HELLO,
+                         NON_QUEL_MSG, REMINDER_10MIN, REMINDER_24H,
+                         REMINDER_2H, SUCCESS_MESSAGE)
+from app.history import (EMPTY_HISTORY, HISTORY_DIGEST_KEY, history_digest,
+                         history_renderer)
+from app.monitoring import (leads_sent_total, survey_answers_total,
+                            survey_completed_total, survey_contacts_total,
+                            survey_started_total, survey_stats, today_msk)
+from app.outbound import Lane, outbound_lane
+from app.outbox import LeadDispatcher
+from app.reminders import ReminderScheduler
+from app.survey import survey_loader
+from database.crud import (assign_lead, cancel_user_reminders, claim_lead,
+                           complete_reminder, get_user_by_id, get_user_status,
+                           mark_lead_delivered, pick_least_loaded_manager,
+                           save_survey, schedule_user_reminders, start_user,
+                           submit_lead, update_user_phone,
+                           update_user_started_at, user_completed_survey)
 
 router = Router()
 
 
-contact_keyboard = ReplyKeyboardMarkup(
-    keyboard=[
-        [KeyboardButton(text="📱 Поделиться контактом", request_contact=True)]],
-    resize_keyboard=True
-)
-submit_keyboard = InlineKeyboardMarkup(
-    inline_keyboard=[[InlineKeyboardButton(
-        text="📤 Отправить заявку", callback_data="submit_application")]]
-)
-
+# Пул менеджеров: MANAGER_IDS через запятую, иначе единственный MANAGER_ID
+MANAGER_IDS = [int(manager_id) for manager_id in getenv('MANAGER_IDS', '').split(',')
+               if manager_id.strip()] or [int(getenv('MANAGER_ID', 7830643648))]
+MANAGER_ID = MANAGER_IDS[0]
+# all — лид получают все менеджеры, берёт первый нажавший;
+# round_robin — по очереди; load — тому, кому за LEAD_LOAD_WINDOW_HOURS досталось меньше
+LEAD_ROUTING = getenv('LEAD_ROUTING', 'all').lower()
+LEAD_LOAD_WINDOW = timedelta(hours=float(getenv('LEAD_LOAD_WINDOW_HOURS', 24)))
+# Пауза между сообщением для неквалифицированных и FAQ, с
+FAQ_DELAY = float(getenv('FAQ_DELAY', 3))
+bot_instance: Bot = None
 
-def get_continue_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    """Клавиатура для продолжения опроса из напоминания."""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(
-            text="Продолжить опрос", callback_data=f"continue_{user_id}")]]
-    )
+# Отложенные FAQ: ссылки держим, чтобы задачи не собрал сборщик мусора
+_faq_tasks: set[asyncio.Task] = set()
 
+REMINDERS = {
+    10: REMINDER_10MIN,
+    120: REMINDER_2H,
+    1440: REMINDER_24H,
+}
 
-def get_take_lead_keyboard(user_id: int) -> InlineKeyboardMarkup:
 
-    return InlineKeyboardMarkup(
-        inline_keyboard=[[
-            InlineKeyboardButton(text="✅ Взять в работу",
-                                 callback_data=f"take_lead_{user_id}")
-        ]]
-    )
+async def cancel_reminders(user_id: int):
+    await cancel_user_reminders(user_id)
+    logging.info("Напоминания для %s были отменены.", user_id)
 
 
-MANAGER_ID = int(getenv('MANAGER_ID', 7830643648))
-bot_instance: Bot = None
-user_reminder_tasks = {}
+async def _send_faq_later(message: Message):
+    await asyncio.sleep(FAQ_DELAY)
+    try:
+        await message.answer(FAQ, reply_markup=kb.FAQ_KEYBOARD)
+    except Exception as e:
+        logging.error("Не удалось отправить FAQ в чат %s: %s", message.chat.id, e)
 
 
-async def cancel_reminders(user_id: int):
-    if user_id in user_reminder_tasks:
-        tasks = user_reminder_tasks.pop(user_id, [])
-        for task in tasks:
-            if not task.done():
-                task.cancel()
-        logging.info(f"Напоминания для {user_id} были отменены.")
+def send_faq_later(message: Message):
+    """
+    FAQ через FAQ_DELAY секунд в фоне: обработчик не держит слот
+    UpdateSchedulerMiddleware на время паузы.
+    """
+    task = asyncio.create_task(_send_faq_later(message))
+    _faq_tasks.add(task)
+    task.add_done_callback(_faq_tasks.discard)
 
 
 def set_bot_instance(bot: Bot):
@@ -75,159 +88,161 @@ def set_bot_instance(bot: Bot):
 
 
 class Form(StatesGroup):
-    question_1, question_2, question_3, question_4, question_5, question_6, question_7, question_8, question_9, waiting_for_contact, waiting_for_comments = [
-        State() for _ in range(11)]
-
-
-STATES_MAP = {
-    1: Form.question_1, 2: Form.question_2, 3: Form.question_3, 4: Form.question_4, 5: Form.question_5,
-    6: Form.question_6, 7: Form.question_7, 8: Form.question_8, 9: Form.question_9,
-}
+    # Состояния вопросов (Form:question_N) строит app.survey из описания опроса
+    waiting_for_contact = State()
+    waiting_for_comments = State()
 
 
-def clean_text(text: str) -> str:
-    """Агрессивно очищает текст от всех переносов и лишних пробелов."""
-    if not isinstance(text, str):
-        text = str(text)
-    # Заменяем переносы, затем сжимаем множественные пробелы в один
-    return ' '.join(text.replace('\\n', ' ').strip().split())
+def text_question_state(_, raw_state: str | None) -> bool:
+    """Фильтр: пользователь сейчас отвечает на вопрос со свободным ответом."""
+    return raw_state in survey_loader.survey.text_states
 
 
 async def _update_history_display(bot: Bot, chat_id: int, state: FSMContext):
-    data = await state.get_data()
-    history_message_id = data.get("history_message_id")
-    question_items: list[tuple[int, str]] = []
-
-    for key, value in data.items():
-
-        if not key.startswith("question_"):
-            continue
-        _, idx = key.split("_", 1)
-        if not idx.isdigit():
-            continue
-        if not value:
-            continue
-        question_items.append((int(idx), value))
-
-    question_items.sort(key=lambda x: x[0])
-
-    if not question_items:
-        history_text = "📋 Ваши ответы:\n\nПока нет ответов."
-    else:
-        history_entries = []
-        for q_num, answer_text in question_items:
-            question_text_raw = QUESTIONS.get(
-                q_num, {}).get("text", f"Вопрос {q_num}")
-            question_clean = clean_text(question_text_raw)
-            answer_clean = clean_text(answer_text)
-            history_entries.append(
-                f"{q_num}. {question_clean}\n   ✅ {answer_clean}"
-            )
-        history_body = "\n\n".join(history_entries)
-        history_text = f"📋 Ваши ответы:\n\n{history_body}"
-
-    if history_message_id:
-        try:
-            await bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=history_message_id,
-                text=history_text
-            )
-        except TelegramBadRequest as e:
-            if "message is not modified" not in str(e):
-                logging.error(f"Error regenerating history: {e}")
+    await history_renderer.schedule(bot, chat_id, state)
 
 
 @router.message(CommandStart())
 async def start(message: Message, state: FSMContext) -> None:
     user_id = message.from_user.id
-    await add_user(user_id=user_id, username=message.from_user.username)
+    is_manager = user_id in MANAGER_IDS
+    status = await start_user(user_id=user_id, username=message.from_user.username,
+                              reset_progress=not is_manager)
 
-    if user_id == MANAGER_ID:
+    if is_manager:
         return await message.answer("✅ Бот работает! Все новые анкеты будут автоматически скидываться в этот чат.")
 
-    await update_user_started_at(user_id)
     await schedule_reminders(user_id, message.chat.id)
 
-    if await user_completed_survey(user_id):
-        user = await get_user_by_id(user_id)
-        if user and user.qual:
-            if not user.phone:
+    if status.survey_completed:
+        if status.qual:
+            if not status.has_phone:
                 await state.set_state(Form.waiting_for_contact)
-                await message.answer(CONTACT_REQUEST, reply_markup=contact_keyboard, parse_mode=ParseMode.HTML)
-            elif not user.comments:
+                await message.answer(CONTACT_REQUEST, reply_markup=kb.CONTACT_KEYBOARD, parse_mode=ParseMode.HTML)
+            elif not status.has_comments:
                 await state.set_state(Form.waiting_for_comments)
-                await message.answer(COMMENT_REQUEST, reply_markup=submit_keyboard)
+                await message.answer(COMMENT_REQUEST, reply_markup=kb.SUBMIT_KEYBOARD)
             else:
                 await message.answer(SUCCESS_MESSAGE)
                 await cancel_reminders(user_id)
         else:
             await message.answer(NON_QUEL_MSG, parse_mode=ParseMode.HTML)
-            await asyncio.sleep(3)
-            await message.answer(FAQ, reply_markup=kb.get_FAQ_keyboard())
+            send_faq_later(message)
             await cancel_reminders(user_id)
         return
 
     await state.clear()
-    await message.answer(HELLO, reply_markup=kb.get_start_keyboard())
+    await message.answer(HELLO, reply_markup=kb.START_KEYBOARD)
 
 
-async def format_username(username: str | None):
+def format_username(username: str | None):
     if not username:
         return '-'
     return username if username.startswith('@') else f'@{username}'
 
 
-async def send_manager_new_lead(user_id: int):
-    if not bot_instance:
-        return logging.error("Bot instance is not set.")
-    user = await get_user_by_id(user_id)
-    if not user or not user.qual or not user.phone:
-        return
-
+def format_lead(user) -> str:
+    """Текст анкеты для менеджера (User или строка из claim_lead_outbox)"""
     formatted_time = 'Не указано'
     if user.survey_completed_at:
         moscow_time = user.survey_completed_at.astimezone(ZoneInfo("Europe/Moscow"))
         formatted_time = moscow_time.strftime('%d.%m.%Y %H:%M')
 
-    answers = [f"{i}. {getattr(user, f'ans_{i}') or 'Нет ответа'}" for i in range(1, 10)]
-    lead_text = (
+    survey = survey_loader.survey
+    answers = [f"{i}. {survey.answer_text(i, getattr(user, f'ans_{i}')) or 'Нет ответа'}"
+               for i in survey.order]
+    return (
         f"Дата и время: {formatted_time}\n"
-        f"TG ID: {user.user_id}\nUsername: {await format_username(user.username)}\n"
+        f"TG ID: {user.user_id}\nUsername: {format_username(user.username)}\n"
         f"Список ответов пользователя:\n" + "\n".join(answers) +
         f"\n\nТелефон: {user.phone}\nКомментарий/способ связи: {user.comments or '-'}"
     )
-    try:
-        await bot_instance.send_message(MANAGER_ID, lead_text, reply_markup=get_take_lead_keyboard(user_id))
-        logging.info(f"Отправлена анкета пользователя {user_id} менеджеру {MANAGER_ID}")
-    except Exception as e:
-        logging.error(f"Ошибка при отправке анкеты менеджеру: {e}")
+
+
+async def choose_managers(lead: Row) -> list[int]:
+    if LEAD_ROUTING == 'all' or len(MANAGER_IDS) == 1:
+        return MANAGER_IDS
+    if LEAD_ROUTING == 'load':
+        candidate = await pick_least_loaded_manager(MANAGER_IDS, LEAD_LOAD_WINDOW)
+    else:
+        # id из outbox вместо счётчика: очередь одна на все процессы бота
+        candidate = MANAGER_IDS[lead.outbox_id % len(MANAGER_IDS)]
+    assigned = await assign_lead(lead.user_id, candidate)
+    return [assigned if assigned in MANAGER_IDS else candidate]
+
+
+async def _send_lead_to(lead: Row, manager_id: int, text: str):
+    await bot_instance.send_message(manager_id, text,
+                                    reply_markup=kb.get_take_lead_keyboard(lead.user_id))
+    # Сразу после отправки: если дальше что-то упадёт, этому менеджеру лид повторно не уйдёт
+    await mark_lead_delivered(lead.outbox_id, manager_id)
+
+
+async def send_lead(lead: Row):
+    """
+    Доставляет лид из lead_outbox менеджерам; исключение — повторить позже.
+
+    Менеджеры из lead.delivered_to уже получили лид в прошлой попытке и
+    пропускаются. Дубль возможен, только если процесс упал между отправкой
+    и mark_lead_delivered.
+    """
+    if not bot_instance:
+        raise RuntimeError("Bot instance is not set.")
+    managers = await choose_managers(lead)
+    delivered = [manager_id for manager_id in managers if manager_id in lead.delivered_to]
+    pending = [manager_id for manager_id in managers if manager_id not in lead.delivered_to]
+    if not pending:
+        logging.info("Анкета %s уже доставлена менеджерам %s", lead.user_id, delivered)
+        return
+    if lead.attempts > 1:
+        logging.warning("Повторная доставка анкеты %s (попытка %s) менеджерам %s: "
+                        "если прошлая попытка оборвалась после отправки, возможен дубль",
+                        lead.user_id, lead.attempts, pending)
+    text = format_lead(lead)
+    with outbound_lane(Lane.LEAD):
+        results = await asyncio.gather(*(
+            _send_lead_to(lead, manager_id, text) for manager_id in pending
+        ), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    # Повторяем, только если лид не дошёл ни до кого: менеджеру, заблокировавшему
+    # бота, нет смысла слать бесконечно, остальные уже работают с лидом
+    if len(errors) == len(pending) and not delivered:
+        raise errors[0]
+    for manager_id, result in zip(pending, results):
+        if isinstance(result, Exception):
+            logging.error("Анкета %s не доставлена менеджеру %s: %s", lead.user_id, manager_id, result)
+    leads_sent_total.inc()
+    logging.info("Отправлена анкета пользователя %s менеджерам %s", lead.user_id, pending)
+
+
+lead_dispatcher = LeadDispatcher(deliver=send_lead)
+
+
+async def submit_comments(user_id: int, comments: str):
+    if await submit_lead(user_id, comments):
+        survey_stats.incr('lead')
+        lead_dispatcher.notify()
 
 
 @router.callback_query(F.data.startswith('take_lead_'))
 async def take_lead(callback: CallbackQuery):
-    if callback.from_user.id != MANAGER_ID:
+    if callback.from_user.id not in MANAGER_IDS:
         return await callback.answer("Доступ запрещен", show_alert=True)
     user_id = int(callback.data.split('_')[2])
+    claimed_by = await claim_lead(user_id, callback.from_user.id)
+    if claimed_by != callback.from_user.id:
+        try:
+            await callback.message.edit_reply_markup()
+        except TelegramBadRequest:
+            pass
+        return await callback.answer(f"Лид уже в работе у менеджера {claimed_by}", show_alert=True)
     try:
         await callback.message.delete()
     except TelegramBadRequest:
         pass
     await callback.message.answer("Лид закреплён за вами")
     if user := await get_user_by_id(user_id):
-        formatted_time = 'Не указано'
-        if user.survey_completed_at:
-            moscow_time = user.survey_completed_at.astimezone(ZoneInfo("Europe/Moscow"))
-            formatted_time = moscow_time.strftime('%d.%m.%Y %H:%M')
-
-        answers = [f"{i}. {getattr(user, f'ans_{i}') or 'Нет ответа'}" for i in range(1, 10)]
-        lead_text = (
-            f"Дата и время: {formatted_time}\n"
-            f"TG ID: {user.user_id}\nUsername: @{user.username if user.username else '-'}\n"
-            f"Список ответов пользователя:\n" + "\n".join(answers) +
-            f"\n\nТелефон: {user.phone}\nКомментарий/способ связи: {user.comments or '-'}"
-        )
-        await callback.message.answer(lead_text)
+        await callback.message.answer(format_lead(user))
     await callback.answer()
 
 
@@ -237,70 +252,78 @@ async def start_form(callback: CallbackQuery, state: FSMContext) -> None:
     if await user_completed_survey(user_id):
         return await callback.answer("Вы уже прошли опрос.", show_alert=True)
 
+    first = survey_loader.survey.first
     await state.clear()
-    await state.set_state(STATES_MAP[1])
+    await state.set_state(survey_loader.survey.questions[first].state)
     await update_user_started_at(user_id)
-    history_msg = await callback.message.answer('📋 Ваши ответы:\n\nПока нет ответов.')
-    await state.set_data({'current_question': 1, 'history_message_id': history_msg.message_id})
+    history_msg = await callback.message.answer(EMPTY_HISTORY)
+    await state.set_data({'current_question': first, 'history_message_id': history_msg.message_id,
+                          HISTORY_DIGEST_KEY: history_digest(EMPTY_HISTORY)})
+    survey_started_total.inc()
+    survey_stats.incr('started')
 
     try:
         await callback.message.edit_reply_markup()
     except TelegramBadRequest:
         pass
 
-    await send_question(callback.message, state, 1)
+    await send_question(callback.message, state, first)
     await callback.answer()
 
 
 async def send_question(message: Message, state: FSMContext, question_num: int):
-    question_data = QUESTIONS[question_num]
-    markup = kb.get_back_keyboard(
-        question_num) if question_num == 8 else kb.get_question_keyboard(
-        question_num, question_data['options'])
-    question_msg = await message.answer(question_data['text'], reply_markup=markup)
+    question = survey_loader.survey.questions[question_num]
+    question_msg = await message.answer(question.text, reply_markup=question.keyboard)
     await state.update_data(question_message_id=question_msg.message_id)
 
 
+async def go_to_question(message: Message, state: FSMContext, question_num: int | None,
+                         user_id: int):
+    """Следующий шаг опроса: вопрос question_num или завершение, если это был последний."""
+    if question_num is None:
+        return await process_survey_completion(message, state, user_id, await state.get_data())
+    await state.update_data(current_question=question_num)
+    await state.set_state(survey_loader.survey.questions[question_num].state)
+    await send_question(message, state, question_num)
+
+
 async def schedule_reminders(user_id: int, chat_id: int):
-    await cancel_reminders(user_id)
-    if user_id == MANAGER_ID:
-        return
+    if user_id in MANAGER_IDS:
+        return await cancel_reminders(user_id)
 
-    user_reminder_tasks[user_id] = [
-        asyncio.create_task(send_reminder(
-            user_id, chat_id, 10, REMINDER_10MIN)),
-        asyncio.create_task(send_reminder(user_id, chat_id, 120, REMINDER_2H)),
-        asyncio.create_task(send_reminder(
-            user_id, chat_id, 1440, REMINDER_24H))
-    ]
-    logging.info(f"Scheduled reminders for user {user_id}.")
+    next_due = await schedule_user_reminders(user_id, chat_id, tuple(REMINDERS))
+    reminder_scheduler.notify(next_due)
+    logging.info("Scheduled reminders for user %s.", user_id)
 
 
-async def send_reminder(user_id: int, chat_id: int, minutes: int, text: str):
+async def send_reminder(reminder: Row):
+    """
+    Отправляет забранное напоминание и удаляет его из очереди. При временной
+    ошибке строка остаётся и будет забрана снова после аренды.
+    """
+    user_id, minutes = reminder.user_id, reminder.minutes
+    if not bot_instance:
+        logging.error("Ошибка в отправке напоминания: экземпляр бота не установлен.")
+        return
     try:
-        await asyncio.sleep(minutes * 60)
-        if await user_completed_survey(user_id):
-            return
-
-        user = await get_user_by_id(user_id)
-        if not user:
-            return
+        status = await get_user_status(user_id)
+        if minutes in REMINDERS and status and not status.survey_completed:
+            with outbound_lane(Lane.BULK):
+                await bot_instance.send_message(reminder.chat_id, REMINDERS[minutes],
+                                                reply_markup=kb.get_continue_keyboard(user_id))
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        # Бот заблокирован или чат недоступен: повтор не поможет
+        logging.warning("Напоминание %s пользователю %s не доставлено: %s", minutes, user_id, e)
+    except Exception as e:
+        logging.error("Ошибка в отправлении напоминания %s: %s, повтор после аренды", user_id, e)
+        return
+    try:
+        await complete_reminder(user_id, minutes, reminder.due_at)
+    except Exception as e:
+        logging.error("Не удалось удалить напоминание %s/%s: %s", user_id, minutes, e)
 
-        sent_flag = f'reminder_{"10m" if minutes == 10 else "2h" if minutes == 120 else "24h"}_sent'
-        if getattr(user, sent_flag, False):
-            return
 
-        if bot_instance:
-            await bot_instance.send_message(chat_id, text, reply_markup=get_continue_keyboard(user_id))
-            await mark_reminder_sent(user_id, minutes)
-        else:
-            logging.error(
-                "Ошибка в отправке напоминания: экземпляр бота не установлен.")
-    except asyncio.CancelledError:
-        logging.info(
-            f"Напоминание для {user_id} ({minutes} мин) было отменено.")
-    except Exception as e:
-        logging.error(f"Ошибка в отправлении напоминании {user_id}: {e}")
+reminder_scheduler = ReminderScheduler(deliver=send_reminder)
 
 
 @router.callback_query(F.data.startswith('continue_'))
@@ -324,10 +347,10 @@ async def continue_survey(callback: CallbackQuery, state: FSMContext):
         pass
 
     current_state = await state.get_state()
-    if not current_state:
+    q_num = (await state.get_data()).get('current_question')
+    if not current_state or q_num not in survey_loader.survey.questions:
         await start_form(callback, state)
     else:
-        q_num = (await state.get_data()).get('current_question', 1)
         await _update_history_display(callback.bot, callback.message.chat.id, state)
         await send_question(callback.message, state, q_num)
 
@@ -337,21 +360,50 @@ async def continue_survey(callback: CallbackQuery, state: FSMContext):
 async def process_survey_completion(message: Message, state: FSMContext, user_id: int, data: dict):
     # data = await state.get_data()
 
-    qual = not (data.get('question_1') == 'до 14' or data.get('question_2') == 'школа' or data.get('question_4') ==
-                'Рассчитываю только на грант' or data.get('question_6') == '2028 и позже' or data.get('question_9') == 'самостоятельно')
-    answers = {f'ans_{i}': data.get(f'question_{i}') for i in range(1, 10)}
+    survey = survey_loader.survey
+    answers = survey.answers(data)
+    qual = survey.qualifies(answers)
     await save_survey(user_id=user_id, qual=qual, **answers)
+    survey_completed_total.inc('qual' if qual else 'non_qual')
+    survey_stats.incr('completed', option=int(qual))
     await state.clear()
     if qual:
-        logging.info(f'Анкета от пользователя {user_id}: Квал - {qual}')
+        logging.info("Анкета от пользователя %s: Квал - %s", user_id, qual)
         await state.set_state(Form.waiting_for_contact)
-        await message.answer(CONTACT_REQUEST, reply_markup=contact_keyboard, parse_mode=ParseMode.HTML)
+        await message.answer(CONTACT_REQUEST, reply_markup=kb.CONTACT_KEYBOARD, parse_mode=ParseMode.HTML)
     else:
-        logging.info(f'Анкета от пользователя {user_id}: Неквал - {qual}')
+        logging.info("Анкета от пользователя %s: Неквал - %s", user_id, qual)
         await cancel_reminders(user_id)
         await message.answer(NON_QUEL_MSG, parse_mode=ParseMode.HTML)
-        await asyncio.sleep(3)
-        await message.answer(FAQ, reply_markup=kb.get_FAQ_keyboard())
+        send_faq_later(message)
+
+
+def _answer_option(survey, q_num: int, answer: str) -> int:
+    """Номер варианта для survey_stats; -1 — текстовый ответ"""
+    value = survey.answer_index(q_num, answer)
+    return value if isinstance(value, int) else -1
+
+
+def _uncount_answer(survey, q_num: int, answer: str, data: dict):
+    """Снимает ответ со счётчика того дня, когда он был учтён"""
+    day = data.get(f'answered_on_{q_num}')
+    survey_stats.incr('answer', q_num, _answer_option(survey, q_num, answer), amount=-1,
+                      day=date.fromisoformat(day) if day else None)
+
+
+def _count_answer(survey, q_num: int, answer: str, data: dict) -> dict:
+    """
+    Учитывает ответ в воронке и возвращает обновление данных FSM: сам ответ
+    и день, за который он посчитан. Повторный ответ на вопрос (после
+    «назад») заменяет прежний, поэтому в распределении остаётся только
+    последний, а прежний снимается со своего дня, даже если это был вчера.
+    """
+    if (previous := data.get(f'question_{q_num}')) is None:
+        survey_answers_total.inc(str(q_num))
+    else:
+        _uncount_answer(survey, q_num, previous, data)
+    survey_stats.incr('answer', q_num, _answer_option(survey, q_num, answer))
+    return {f'question_{q_num}': answer, f'answered_on_{q_num}': today_msk().isoformat()}
 
 
 async def handle_answer(callback: CallbackQuery, state: FSMContext):
@@ -360,11 +412,13 @@ async def handle_answer(callback: CallbackQuery, state: FSMContext):
     q_num, ans_idx = int(parts[1]), int(parts[2])
 
     current_data = await state.get_data()
-    if q_num != current_data.get('current_question'):
+    survey = survey_loader.survey
+    question = survey.questions.get(q_num)
+    if (q_num != current_data.get('current_question') or question is None
+            or not 0 <= ans_idx < len(question.options)):
         return await callback.answer()
 
-    answer_text = QUESTIONS[q_num]['options'][ans_idx]
-    await state.update_data({f'question_{q_num}': answer_text})
+    await state.update_data(_count_answer(survey, q_num, question.options[ans_idx], current_data))
     await _update_history_display(callback.bot, callback.message.chat.id, state)
 
     if q_msg_id := current_data.get('question_message_id'):
@@ -373,14 +427,7 @@ async def handle_answer(callback: CallbackQuery, state: FSMContext):
         except:
             pass
 
-    next_q = q_num + 1
-    if next_q in STATES_MAP:
-        await state.update_data(current_question=next_q)
-        await state.set_state(STATES_MAP[next_q])
-        await send_question(callback.message, state, next_q)
-    else:
-        final_data = await state.get_data()
-        await process_survey_completion(callback.message, state, user_id, final_data)
+    await go_to_question(callback.message, state, survey.next.get(q_num), user_id)
 
 
 @router.callback_query(F.data.startswith('answer_'))
@@ -397,19 +444,24 @@ async def process_back(callback: CallbackQuery, state: FSMContext):
         return await callback.answer("Вы уже прошли опрос.", show_alert=True)
 
     data = await state.get_data()
-    current_q = data.get('current_question', 1)
+    survey = survey_loader.survey
+    current_q = data.get('current_question', survey.first)
     if int(callback.data.split('_')[1]) != current_q:
         return await callback.answer()
 
-    prev_q = current_q - 1
-    if prev_q < 1:
+    prev_q = survey.prev.get(current_q)
+    if prev_q is None:
         return await callback.answer()
 
-    for i in range(current_q, 10):
-        data.pop(f'question_{i}', None)
+    q_num = current_q
+    while q_num is not None:
+        if (answer := data.pop(f'question_{q_num}', None)) is not None:
+            _uncount_answer(survey, q_num, answer, data)
+        data.pop(f'answered_on_{q_num}', None)
+        q_num = survey.next.get(q_num)
     data['current_question'] = prev_q
     await state.set_data(data)
-    await state.set_state(STATES_MAP[prev_q])
+    await state.set_state(survey.questions[prev_q].state)
 
     if q_msg_id := data.get('question_message_id'):
         try:
@@ -422,16 +474,18 @@ async def process_back(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.message(Form.question_8)
-async def process_text_answer(message: Message, state: FSMContext):
+@router.message(text_question_state)
+async def process_text_answer(message: Message, state: FSMContext, raw_state: str):
     user_id = message.from_user.id
     if await user_completed_survey(user_id):
         return await message.answer("Вы уже прошли опрос")
 
-    if not message.text or len(message.text) > 1500:
-        return await message.answer(ERROR_8)
+    survey = survey_loader.survey
+    question = survey.by_state[raw_state]
+    if not message.text or len(message.text) > question.max_length:
+        return await message.answer(question.error)
 
-    await state.update_data({'question_8': message.text})
+    await state.update_data(_count_answer(survey, question.id, message.text, await state.get_data()))
     current_data = await state.get_data()
 
     if q_msg_id := current_data.get('question_message_id'):
@@ -445,9 +499,7 @@ async def process_text_answer(message: Message, state: FSMContext):
         pass
 
     await _update_history_display(message.bot, message.chat.id, state)
-    await state.set_state(STATES_MAP[9])
-    await state.update_data(current_question=9)
-    await send_question(message, state, 9)
+    await go_to_question(message, state, survey.next.get(question.id), user_id)
 
 
 @router.message(Form.waiting_for_contact)
@@ -471,9 +523,11 @@ async def process_contact(message: Message, state: FSMContext) -> None:
         return
 
     await update_user_phone(message.from_user.id, phone)
+    survey_contacts_total.inc()
+    survey_stats.incr('contact')
     await message.answer("✅ Контакт получен!", reply_markup=ReplyKeyboardRemove())
     await state.set_state(Form.waiting_for_comments)
-    await message.answer(COMMENT_REQUEST, reply_markup=submit_keyboard)
+    await message.answer(COMMENT_REQUEST, reply_markup=kb.SUBMIT_KEYBOARD)
 
 
 @router.message(Form.waiting_for_comments)
@@ -482,17 +536,15 @@ async def process_comments(message: Message, state: FSMContext) -> None:
         await message.answer(FINAL)
         return
 
-    await update_user_comments(message.from_user.id, message.text)
+    await submit_comments(message.from_user.id, message.text)
     await message.answer(SUCCESS_MESSAGE)
     await cancel_reminders(message.from_user.id)
     await state.clear()
 
-    await send_manager_new_lead(message.from_user.id)
-
 
 @router.callback_query(F.data == "submit_application", Form.waiting_for_comments)
 async def submit_application(callback: CallbackQuery, state: FSMContext):
-    await update_user_comments(callback.from_user.id, "-")
+    await submit_comments(callback.from_user.id, "-")
     try:
         await callback.message.edit_reply_markup()
     except:
@@ -500,5 +552,4 @@ async def submit_application(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer(SUCCESS_MESSAGE)
     await cancel_reminders(callback.from_user.id)
     await state.clear()
-    await send_manager_new_lead(callback.from_user.id)
     await callback.answer()
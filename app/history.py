@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import logging
+from os import getenv
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+from app.survey import Survey, survey_loader
+
+HISTORY_DEBOUNCE = float(getenv('HISTORY_DEBOUNCE', 0.3))
+
+HISTORY_HEADER = "📋 Ваши ответы:"
+EMPTY_HISTORY = f"{HISTORY_HEADER}\n\nПока нет ответов."
+# Ключ в данных FSM: хэш текста, который должен стоять в сообщении истории
+HISTORY_DIGEST_KEY = 'history_digest'
+
+
+def clean_text(text: str) -> str:
+    """Агрессивно очищает текст от всех переносов и лишних пробелов."""
+    if not isinstance(text, str):
+        text = str(text)
+    # Заменяем переносы, затем сжимаем множественные пробелы в один
+    return ' '.join(text.replace('\\n', ' ').strip().split())
+
+
+def history_digest(text: str) -> str:
+    """Хэш текста истории, одинаковый во всех процессах (в отличие от hash())."""
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class HistoryRenderer:
+    """
+    Отрисовка сообщения «Ваши ответы».
+
+    Очищенный текст вопросов считается один раз на версию опроса. Хэш
+    текста, который должен стоять в сообщении, хранится в данных FSM
+    рядом с ответами, поэтому его видит любая реплика: правка без
+    изменений не уходит в Telegram, а несколько ответов подряд в пределах
+    debounce склеиваются в одну правку.
+    """
+
+    def __init__(self, debounce: float = HISTORY_DEBOUNCE):
+        self.debounce = debounce
+        self._survey: Survey | None = None
+        self._prefixes: list[tuple[str, str]] = []
+        self._pending: dict[tuple[int, int], tuple[Bot, str, BaseStorage, StorageKey]] = {}
+        self._tasks: dict[tuple[int, int], asyncio.Task] = {}
+
+    def prefixes(self) -> list[tuple[str, str]]:
+        """Ключ в данных FSM и заголовок каждого вопроса в порядке опроса."""
+        survey = survey_loader.survey
+        if survey is not self._survey:
+            self._prefixes = [
+                (f"question_{q_num}", f"{q_num}. {clean_text(survey.questions[q_num].text)}")
+                for q_num in survey.order
+            ]
+            self._survey = survey
+        return self._prefixes
+
+    def render(self, data: dict) -> str:
+        history_body = "\n\n".join(
+            f"{prefix}\n   ✅ {clean_text(answer)}"
+            for key, prefix in self.prefixes() if (answer := data.get(key))
+        )
+        if not history_body:
+            return EMPTY_HISTORY
+        return f"{HISTORY_HEADER}\n\n{history_body}"
+
+    async def schedule(self, bot: Bot, chat_id: int, state: FSMContext):
+        """Ставит правку истории в очередь; ничего не делает, если текст не изменился."""
+        data = await state.get_data()
+        if not (message_id := data.get('history_message_id')):
+            return
+        text = self.render(data)
+        digest = history_digest(text)
+        if data.get(HISTORY_DIGEST_KEY) == digest:
+            return
+        await state.update_data({HISTORY_DIGEST_KEY: digest})
+        key = (chat_id, message_id)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush_later(key))
+        self._pending[key] = (bot, text, state.storage, state.key)
+
+    async def _flush_later(self, key: tuple[int, int]):
+        await asyncio.sleep(self.debounce)
+        await self._flush(key)
+
+    async def _flush(self, key: tuple[int, int]):
+        self._tasks.pop(key, None)
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        bot, text, storage, storage_key = pending
+        chat_id, message_id = key
+        try:
+            await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                logging.error("Error regenerating history: %s", e)
+                await self._forget(storage, storage_key)
+        except Exception as e:
+            logging.error("Error regenerating history: %s", e)
+            await self._forget(storage, storage_key)
+
+    @staticmethod
+    async def _forget(storage: BaseStorage, storage_key: StorageKey):
+        """Правка не дошла: следующий ответ перерисует историю, даже с тем же текстом."""
+        try:
+            await storage.update_data(storage_key, {HISTORY_DIGEST_KEY: None})
+        except Exception as e:
+            logging.error("Не удалось сбросить хэш истории: %s", e)
+
+    async def close(self):
+        """Сразу отправляет отложенные правки (при остановке бота)."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*(self._flush(key) for key in list(self._pending)))
+
+
+history_renderer = HistoryRenderer()
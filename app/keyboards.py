@@ -1,7 +1,12 @@
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import (InlineKeyboardButton, InlineKeyboardMarkup,
+                           KeyboardButton, ReplyKeyboardMarkup)
+from aiohttp import FormData
 
 
-def get_question_keyboard(question_num: int, options: list) -> InlineKeyboardMarkup:
+def get_question_keyboard(question_num: int, options: list, back: bool = True) -> InlineKeyboardMarkup:
     buttons = []
     for idx, option in enumerate(options):
         buttons.append([InlineKeyboardButton(
@@ -9,7 +14,7 @@ def get_question_keyboard(question_num: int, options: list) -> InlineKeyboardMar
             callback_data=f'answer_{question_num}_{idx}'
         )])
 
-    if question_num > 1:
+    if back:
         buttons.append([InlineKeyboardButton(
             text='Назад',
             callback_data=f'back_{question_num}'
@@ -19,29 +24,115 @@ def get_question_keyboard(question_num: int, options: list) -> InlineKeyboardMar
 
 
 def get_back_keyboard(question_num: int) -> InlineKeyboardMarkup:
-    if question_num > 1:
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(
-                text='Назад',
-                callback_data=f'back_{question_num}'
-            )]
-        ])
-    return None
-
-
-def get_start_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
-            text='Оценить шансы на поступление', callback_data='start_form')],
-        [InlineKeyboardButton(
-            text='Получить бесплатную консультацию', callback_data='start_form')]
+            text='Назад',
+            callback_data=f'back_{question_num}'
+        )]
     ])
 
 
-def get_FAQ_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='Instagram*',
-                              url='http://instagram.com/jetminds.company/')],
-        [InlineKeyboardButton(text='Телеграм-канал',
-                              url='http://t.me/jetmindscompany')]
-    ])
+# Статические клавиатуры собираются один раз при импорте. Модели aiogram
+# неизменяемы (frozen), поэтому один экземпляр можно отправлять всем.
+START_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(
+        text='Оценить шансы на поступление', callback_data='start_form')],
+    [InlineKeyboardButton(
+        text='Получить бесплатную консультацию', callback_data='start_form')]
+])
+
+FAQ_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text='Instagram*',
+                          url='http://instagram.com/jetminds.company/')],
+    [InlineKeyboardButton(text='Телеграм-канал',
+                          url='http://t.me/jetmindscompany')]
+])
+
+CONTACT_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="📱 Поделиться контактом", request_contact=True)]],
+    resize_keyboard=True
+)
+
+SUBMIT_KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[[InlineKeyboardButton(
+        text="📤 Отправить заявку", callback_data="submit_application")]]
+)
+
+BROADCAST_CONFIRM_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📣 Запустить рассылку", callback_data="broadcast_confirm")],
+    [InlineKeyboardButton(text="Отмена", callback_data="broadcast_abort")]
+])
+
+# id -> клавиатура; клавиатуры вопросов регистрирует app.survey
+# при загрузке опроса и снимает при его замене
+_static_keyboards: dict[int, InlineKeyboardMarkup | ReplyKeyboardMarkup] = {}
+
+
+def register_static_keyboards(*markups):
+    for markup in markups:
+        _static_keyboards[id(markup)] = markup
+
+
+def unregister_static_keyboards(*markups):
+    for markup in markups:
+        if _static_keyboards.get(id(markup)) is markup:
+            del _static_keyboards[id(markup)]
+
+
+register_static_keyboards(START_KEYBOARD, FAQ_KEYBOARD, CONTACT_KEYBOARD,
+                          SUBMIT_KEYBOARD, BROADCAST_CONFIRM_KEYBOARD)
+
+
+def get_continue_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура для продолжения опроса из напоминания."""
+    # model_construct пропускает валидацию: данные заведомо корректны
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=[[
+        InlineKeyboardButton.model_construct(
+            text="Продолжить опрос", callback_data=f"continue_{user_id}")
+    ]])
+
+
+def get_take_lead_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=[[
+        InlineKeyboardButton.model_construct(
+            text="✅ Взять в работу", callback_data=f"take_lead_{user_id}")
+    ]])
+
+
+class KeyboardCacheSession(AiohttpSession):
+    """
+    Сессия, которая сериализует статические клавиатуры один раз.
+
+    Для запросов с зарегистрированной статической клавиатурой reply_markup
+    берётся из кэша готового JSON, а не выгружается из модели заново.
+    Кэш хранит и саму клавиатуру: её id не достанется новому объекту.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._serialized: dict[int, tuple[object, str]] = {}
+
+    def build_form_data(self, bot: Bot, method: TelegramMethod) -> FormData:
+        markup = getattr(method, 'reply_markup', None)
+        if markup is None or _static_keyboards.get(id(markup)) is not markup:
+            return super().build_form_data(bot, method)
+
+        cached = self._serialized.get(id(markup))
+        if cached is not None and cached[0] is markup:
+            serialized = cached[1]
+        else:
+            serialized = self.prepare_value(markup, bot=bot, files={})
+            self._serialized[id(markup)] = (markup, serialized)
+
+        form = FormData(quote_fields=False)
+        files = {}
+        for key, value in method.model_dump(warnings=False, exclude={'reply_markup'}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field('reply_markup', serialized)
+        for key, value in files.items():
+            form.add_field(key, value.read(bot), filename=value.filename or key)
+        return form
@@ -0,0 +1,207 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler)
+from os import getenv
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from zoneinfo import ZoneInfo
+
+from app.metrics import Counter
+
+MSK = ZoneInfo("Europe/Moscow")
+
+LOG_DIR = Path(getenv('LOG_DIR', 'logs'))
+# text — как раньше, json — одна JSON-строка на запись для сборщиков логов
+LOG_FORMAT = getenv('LOG_FORMAT', 'text').lower()
+# size — по размеру файла, time — по времени (LOG_ROTATE_WHEN)
+LOG_ROTATION = getenv('LOG_ROTATION', 'size').lower()
+LOG_MAX_BYTES = int(getenv('LOG_MAX_BYTES', 50 * 1024 * 1024))
+LOG_ROTATE_WHEN = getenv('LOG_ROTATE_WHEN', 'midnight')
+LOG_BACKUP_COUNT = int(getenv('LOG_BACKUP_COUNT', 10))
+# Записи сверх этого числа, не успевшие уйти на диск, отбрасываются
+LOG_QUEUE_SIZE = int(getenv('LOG_QUEUE_SIZE', 10000))
+# Доля апдейтов, для которых пишутся INFO/DEBUG; WARNING и выше пишутся всегда
+LOG_SAMPLE_RATE = float(getenv('LOG_SAMPLE_RATE', 1))
+
+log_records_dropped_total = Counter(
+    'log_records_dropped_total', 'Записи лога, отброшенные из-за переполнения очереди')
+
+update_id_var: ContextVar[int | None] = ContextVar('update_id', default=None)
+user_id_var: ContextVar[int | None] = ContextVar('user_id', default=None)
+handler_var: ContextVar[str | None] = ContextVar('handler', default=None)
+
+CONTEXT_FIELDS = ('update_id', 'user_id', 'handler')
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Кладёт в контекст логирования данные текущего апдейта.
+
+    Как outer-middleware апдейтов — update_id и user_id, как inner-middleware
+    сообщений и колбэков — имя обработчика. Задачи, созданные внутри
+    обработчика, наследуют этот контекст.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            user = data.get("event_from_user")
+            tokens = [(update_id_var, update_id_var.set(event.update_id)),
+                      (user_id_var, user_id_var.set(user.id if user else None))]
+        else:
+            tokens = [(handler_var, handler_var.set(data["handler"].callback.__name__))]
+        try:
+            return await handler(event, data)
+        finally:
+            for var, token in tokens:
+                var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Добавляет к записи update_id, user_id и handler и прореживает INFO/DEBUG.
+
+    Решение о сэмплировании принимается по update_id, поэтому у попавшего
+    в выборку апдейта в логе остаются все записи. Записи вне апдейтов
+    (запуск, фоновые задачи) не прореживаются.
+    """
+
+    def __init__(self, sample_rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self._threshold = int(sample_rate * 10000)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        update_id = update_id_var.get()
+        if (update_id is not None and record.levelno <= logging.INFO
+                and update_id * 7919 % 10000 >= self._threshold):
+            return False
+        record.update_id = update_id
+        record.user_id = user_id_var.get()
+        record.handler = handler_var.get()
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler, который при переполненной очереди теряет запись, а не падает.
+
+    В event loop только подставляются аргументы сообщения; форматирование,
+    включая traceback, выполняет поток QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped_total.inc()
+
+
+class MoscowFormatter(logging.Formatter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached_second: int | None = None
+        self._cached_time = ''
+
+    def formatTime(self, record, datefmt=None):
+        # Записи одной секунды делят одну строку времени
+        second = int(record.created)
+        if second != self._cached_second:
+            dt = datetime.fromtimestamp(second, tz=MSK)
+            self._cached_time = dt.strftime(datefmt or "%Y-%m-%d %H:%M:%S")
+            self._cached_second = second
+        return self._cached_time
+
+    def format(self, record):
+        text = super().format(record)
+        context = ' '.join(f'{field}={value}' for field in CONTEXT_FIELDS
+                           if (value := getattr(record, field, None)) is not None)
+        return f"{text} [{context}]" if context else text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=MSK).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            if (value := getattr(record, field, None)) is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _file_handler(path: Path) -> logging.Handler:
+    if LOG_ROTATION == 'time':
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN,
+                                        backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES,
+                               backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+
+
+def setup_logging() -> logging.Logger:
+    """
+    Настраивает корневой логгер.
+
+    Обработчики только кладут запись в очередь, а в файл и stdout её пишет
+    фоновый поток QueueListener: медленный диск не блокирует event loop.
+    Очередь дописывается на диск при выходе из процесса.
+    """
+    LOG_DIR.mkdir(exist_ok=True)
+
+    log_level = getenv("LOG_LEVEL", "INFO").upper()
+    numeric_level = getattr(logging, log_level, logging.INFO)
+
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = MoscowFormatter(
+            fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+
+    file_handler = _file_handler(LOG_DIR / "bot.log")
+    console_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, console_handler):
+        handler.setLevel(numeric_level)
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(ContextFilter())
+    listener = QueueListener(queue_handler.queue, file_handler, console_handler,
+                             respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger()
+    logger.setLevel(numeric_level)
+    logger.handlers.clear()
+    logger.addHandler(queue_handler)
+
+    logging.getLogger('aiogram').setLevel(logging.WARNING)
+    logging.getLogger('asyncio').setLevel(logging.WARNING)
+
+    return logger
@@ -0,0 +1,129 @@
+"""
+Минимальные метрики в формате Prometheus без внешних зависимостей.
+
+Метрики регистрируются в общем REGISTRY при создании, render() отдаёт
+их в текстовом формате экспозиции Prometheus.
+"""
+import bisect
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        REGISTRY.append(self)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues) -> float:
+        return self.values.get(labelvalues, 0)
+
+    def samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {value}'
+                for labels, value in self.values.items()]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 function: Callable[[], float] | None = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, *labelvalues):
+        self.values[labelvalues] = value
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def samples(self):
+        if self.function is not None:
+            return [f'{self.name} {self.function()}']
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам (+Inf последняя), сумма]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues):
+        item = self.values.get(labelvalues)
+        if item is None:
+            item = self.values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        item[0][bisect.bisect_left(self.buckets, value)] += 1
+        item[1] += value
+
+    def count(self, *labelvalues) -> int:
+        item = self.values.get(labelvalues)
+        return sum(item[0]) if item else 0
+
+    def quantile(self, q: float, *labelvalues) -> float:
+        """Оценка квантиля по верхней границе корзины."""
+        item = self.values.get(labelvalues)
+        if not item:
+            return 0.0
+        rank = q * sum(item[0])
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), item[0]):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        lines = []
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+REGISTRY: list[Metric] = []
+
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
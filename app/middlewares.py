@@ -0,0 +1,203 @@
+import asyncio
+from os import getenv
+from typing import Any, Awaitable, Callable, Mapping
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (DEFAULT_DESTINY, BaseStorage, StateType,
+                                      StorageKey)
+from aiogram.types import TelegramObject, User
+
+from app.monitoring import updates_waiting
+
+# Сколько апдейтов разных пользователей обрабатывается одновременно
+UPDATE_CONCURRENCY = int(getenv('UPDATE_CONCURRENCY', 100))
+# Отдельный лимит для менеджеров: их команды не ждут в общей очереди
+MANAGER_UPDATE_CONCURRENCY = int(getenv('MANAGER_UPDATE_CONCURRENCY', 10))
+
+
+class BufferedFSMContext(FSMContext):
+    """
+    FSMContext, который работает с локальной копией состояния и данных.
+
+    Хранилище читается один раз за апдейт (load), все изменения копятся
+    в памяти, а flush записывает их одним обращением и только если
+    что-то действительно изменилось.
+    """
+
+    def __init__(self, storage: BaseStorage, key: StorageKey):
+        super().__init__(storage=storage, key=key)
+        self._state: str | None = None
+        self._saved_state: str | None = None
+        self._data: dict[str, Any] | None = None
+        self._saved_data: dict[str, Any] | None = None
+
+    async def load(self):
+        if hasattr(self.storage, 'get_record'):
+            self._state, self._data = await self.storage.get_record(self.key)
+            self._saved_data = dict(self._data)
+        else:
+            self._state = await self.storage.get_state(self.key)
+        self._saved_state = self._state
+
+    async def _local_data(self) -> dict[str, Any]:
+        if self._data is None:
+            self._data = await self.storage.get_data(self.key)
+            self._saved_data = dict(self._data)
+        return self._data
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state.state if isinstance(state, State) else state
+
+    async def get_state(self) -> str | None:
+        return self._state
+
+    async def set_data(self, data: Mapping[str, Any]) -> None:
+        self._data = dict(data)
+
+    async def get_data(self) -> dict[str, Any]:
+        return (await self._local_data()).copy()
+
+    async def get_value(self, key: str, default: Any | None = None) -> Any | None:
+        return (await self._local_data()).get(key, default)
+
+    async def update_data(self, data: Mapping[str, Any] | None = None,
+                          **kwargs: Any) -> dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        current = await self._local_data()
+        current.update(kwargs)
+        return current.copy()
+
+    async def flush(self):
+        state_changed = self._state != self._saved_state
+        data_changed = self._data is not None and self._data != self._saved_data
+        if not state_changed and not data_changed:
+            return
+
+        data = self._data if data_changed else None
+        if hasattr(self.storage, 'set_record'):
+            await self.storage.set_record(self.key, self._state, data)
+        else:
+            if state_changed:
+                await self.storage.set_state(self.key, self._state)
+            if data_changed:
+                await self.storage.set_data(self.key, data)
+        self._saved_state = self._state
+        if data_changed:
+            self._saved_data = dict(self._data)
+
+
+class BufferedFSMMiddleware(FSMContextMiddleware):
+    """
+    Замена стандартного FSM-middleware: загружает FSM один раз до обработчиков
+    и сбрасывает накопленные изменения одной записью после них.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        context = self.resolve_event_context(data["bot"], data)
+        data["fsm_storage"] = self.storage
+        if context is None:
+            return await handler(event, data)
+
+        async with self.events_isolation.lock(key=context.key):
+            await context.load()
+            data.update({"state": context, "raw_state": await context.get_state()})
+            try:
+                return await handler(event, data)
+            finally:
+                await context.flush()
+
+    def get_context(
+        self,
+        bot: Bot,
+        chat_id: int,
+        user_id: int,
+        thread_id: int | None = None,
+        business_connection_id: str | None = None,
+        destiny: str = DEFAULT_DESTINY,
+    ) -> BufferedFSMContext:
+        return BufferedFSMContext(
+            storage=self.storage,
+            key=StorageKey(
+                user_id=user_id,
+                chat_id=chat_id,
+                bot_id=bot.id,
+                thread_id=thread_id,
+                business_connection_id=business_connection_id,
+                destiny=destiny,
+            ),
+        )
+
+
+class _UserQueue:
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """
+    Outer-middleware апдейтов: апдейты одного пользователя выполняются
+    строго по очереди, разных — параллельно, но не больше
+    UPDATE_CONCURRENCY одновременно.
+
+    Очередь пользователя — asyncio.Lock (FIFO), он удаляется вместе с
+    последним ожидающим апдейтом, поэтому словарь не растёт с числом
+    пользователей. Менеджеры выполняются в своей полосе с отдельным
+    лимитом и не стоят за пользовательским трафиком.
+    """
+
+    def __init__(self, manager_ids: list[int] = (),
+                 concurrency: int = UPDATE_CONCURRENCY,
+                 manager_concurrency: int = MANAGER_UPDATE_CONCURRENCY):
+        self._manager_ids = frozenset(manager_ids)
+        self._queues: dict[int, _UserQueue] = {}
+        self._lanes = {
+            'user': asyncio.Semaphore(concurrency),
+            'manager': asyncio.Semaphore(manager_concurrency),
+        }
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        if user is None:
+            return await self._run('user', handler, event, data)
+
+        queue = self._queues.get(user.id)
+        if queue is None:
+            queue = self._queues[user.id] = _UserQueue()
+        queue.pending += 1
+        try:
+            async with queue.lock:
+                lane = 'manager' if user.id in self._manager_ids else 'user'
+                return await self._run(lane, handler, event, data)
+        finally:
+            queue.pending -= 1
+            if not queue.pending:
+                del self._queues[user.id]
+
+    async def _run(self, lane: str, handler, event, data):
+        semaphore = self._lanes[lane]
+        updates_waiting.inc(lane)
+        try:
+            await semaphore.acquire()
+        finally:
+            updates_waiting.dec(lane)
+        try:
+            return await handler(event, data)
+        finally:
+            semaphore.release()
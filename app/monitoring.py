@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from os import getenv
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import (BaseRequestMiddleware,
+                                                     NextRequestMiddlewareType)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+from aiohttp import web
+from zoneinfo import ZoneInfo
+
+from app import metrics
+from app.background import PeriodicWorker
+from app.metrics import Counter, Gauge, Histogram
+from database.crud import add_survey_stats, user_status_cache
+
+METRICS_HOST = getenv('METRICS_HOST', '127.0.0.1')
+# 0 — не поднимать HTTP-эндпоинт
+METRICS_PORT = int(getenv('METRICS_PORT', 9100))
+STATS_FLUSH_INTERVAL = float(getenv('STATS_FLUSH_INTERVAL', 5))
+
+handler_seconds = Histogram(
+    'bot_handler_seconds', 'Латентность обработчиков', ('handler',))
+handler_errors_total = Counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ('handler',))
+updates_total = Counter('bot_updates_total', 'Полученные апдейты')
+updates_in_flight = Gauge('bot_updates_in_flight', 'Апдейты в обработке')
+updates_waiting = Gauge(
+    'bot_updates_waiting', 'Апдейты, ждущие свободного слота обработки', ('lane',))
+updates_duplicate_total = Counter(
+    'bot_updates_duplicate_total', 'Отброшенные повторные апдейты', ('source',))
+
+telegram_api_seconds = Histogram(
+    'telegram_api_seconds', 'Латентность запросов к Bot API', ('method',))
+telegram_api_errors_total = Counter(
+    'telegram_api_errors_total', 'Ошибки запросов к Bot API', ('method', 'error'))
+
+survey_started_total = Counter('survey_started_total', 'Начатые опросы')
+survey_answers_total = Counter(
+    'survey_answers_total', 'Ответы на вопросы опроса', ('question',))
+survey_completed_total = Counter(
+    'survey_completed_total', 'Завершённые опросы', ('result',))
+survey_contacts_total = Counter('survey_contacts_total', 'Оставленные телефоны')
+leads_sent_total = Counter('leads_sent_total', 'Лиды, отправленные менеджеру')
+users_archived_total = Counter('users_archived_total', 'Пользователи, перенесённые в users_archive')
+
+Gauge('user_status_cache_hits', 'Попадания в кэш статусов пользователей',
+      function=lambda: user_status_cache.hits)
+Gauge('user_status_cache_misses', 'Промахи кэша статусов пользователей',
+      function=lambda: user_status_cache.misses)
+
+
+def today_msk():
+    return datetime.now(ZoneInfo("Europe/Moscow")).date()
+
+
+class SurveyStats:
+    """
+    Счётчики воронки опроса в таблице survey_stats.
+
+    Обработчики только увеличивают счётчик в памяти, а фоновый цикл раз в
+    STATS_FLUSH_INTERVAL прибавляет накопленное к таблице одним upsert.
+    Чтение /stats не зависит от размера users: строк в survey_stats
+    порядка сотни на день.
+    """
+
+    def __init__(self, flush_interval: float = STATS_FLUSH_INTERVAL):
+        self._counts: dict[tuple, int] = defaultdict(int)
+        self._lock = asyncio.Lock()
+        self._worker = PeriodicWorker("сохранение статистики опроса", flush_interval,
+                                      self.flush, first_delay=flush_interval)
+
+    def incr(self, metric: str, question: int = 0, option: int = -1, amount: int = 1,
+             day: date | None = None):
+        """Меняет счётчик за day (по умолчанию — сегодня по Москве)"""
+        self._counts[(day or today_msk(), metric, question, option)] += amount
+
+    async def flush(self):
+        async with self._lock:
+            counts, self._counts = self._counts, defaultdict(int)
+            try:
+                await add_survey_stats(counts)
+            except Exception:
+                # Не теряем счётчики: вернутся в следующий сброс
+                for key, count in counts.items():
+                    self._counts[key] += count
+                raise
+
+    def start(self):
+        self._worker.start()
+
+    async def stop(self):
+        await self._worker.stop()
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error("Не удалось сохранить статистику опроса: %s", e)
+
+
+survey_stats = SurveyStats()
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware апдейтов: общее число и число апдейтов в обработке."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        updates_total.inc()
+        updates_in_flight.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            updates_in_flight.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: латентность и ошибки по имени функции-обработчика."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors_total.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - start, name)
+
+
+class TelegramApiMetrics(BaseRequestMiddleware):
+    """Middleware сессии бота: латентность и ошибки каждого метода Bot API."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            telegram_api_errors_total.inc(name, type(e).__name__)
+            raise
+        finally:
+            telegram_api_seconds.observe(time.perf_counter() - start, name)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type='text/plain')
+
+
+async def start_metrics_server(host: str = METRICS_HOST,
+                               port: int = METRICS_PORT) -> web.AppRunner | None:
+    """Поднимает /metrics; возвращает runner для остановки."""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from os import getenv
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (BaseRequestMiddleware,
+                                                     NextRequestMiddlewareType)
+from aiogram.exceptions import (TelegramEntityTooLarge, TelegramNetworkError,
+                                TelegramRetryAfter, TelegramServerError)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и ~1 в секунду на чат
+# (короткие всплески в одном чате допустимы).
+OUTBOUND_GLOBAL_RATE = float(getenv('OUTBOUND_GLOBAL_RATE', 30))
+OUTBOUND_CHAT_RATE = float(getenv('OUTBOUND_CHAT_RATE', 1))
+OUTBOUND_CHAT_BURST = float(getenv('OUTBOUND_CHAT_BURST', 10))
+OUTBOUND_MAX_RETRIES = int(getenv('OUTBOUND_MAX_RETRIES', 3))
+
+# Методы, которые отправляют или меняют сообщения и подпадают под лимиты
+RATE_LIMITED_PREFIXES = ('send', 'copy', 'forward', 'edit')
+# Лимит чата считается только по новым сообщениям: правки истории ответов
+# идут после каждого клика и не должны тормозить следующий вопрос
+CHAT_LIMITED_PREFIXES = ('send', 'copy', 'forward')
+# Повторять после сетевой ошибки или 5xx можно только их: Telegram мог
+# принять запрос до обрыва, и повторный send* отправит сообщение дважды
+IDEMPOTENT_PREFIXES = ('edit', 'get', 'answerCallbackQuery')
+MAX_CHAT_BUCKETS = 10000
+
+
+class Lane(IntEnum):
+    """Приоритет исходящего запроса: меньше — раньше."""
+    INTERACTIVE = 0
+    LEAD = 1
+    BULK = 2
+
+
+_current_lane: ContextVar[Lane] = ContextVar('outbound_lane', default=Lane.INTERACTIVE)
+
+
+@contextmanager
+def outbound_lane(lane: Lane):
+    """Все запросы к Bot API внутри блока идут с приоритетом lane."""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self, now: float) -> float:
+        """Занимает токен в долг и возвращает, сколько нужно подождать."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: единая очередь исходящих сообщений.
+
+    Соблюдает глобальный лимит и лимит на чат, выдаёт слоты по приоритету
+    (Lane), выдерживает retry_after из ответа 429 и повторяет идемпотентные
+    запросы при временных сетевых ошибках и 5xx. Отправку сообщений после
+    такой ошибки повторяет вызывающий код, если дубль для него допустим.
+    """
+
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE,
+                 chat_rate: float = OUTBOUND_CHAT_RATE,
+                 chat_burst: float = OUTBOUND_CHAT_BURST,
+                 max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global: TokenBucket | None = None
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._pump_task: asyncio.Task | None = None
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        limited = method.__api_method__.startswith(RATE_LIMITED_PREFIXES)
+        chat_limited = method.__api_method__.startswith(CHAT_LIMITED_PREFIXES)
+        chat_id = getattr(method, 'chat_id', None)
+        idempotent = method.__api_method__.startswith(IDEMPOTENT_PREFIXES)
+        attempt = 0
+        while True:
+            if limited:
+                await self._acquire(chat_id if chat_limited else None, _current_lane.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                logging.warning("429 на %s (чат %s), повтор через %s с",
+                                method.__api_method__, chat_id, e.retry_after)
+                if chat_limited or (limited and chat_id is None):
+                    # Повтор сам дождётся паузы в том бакете, из которого берёт токен
+                    self._pause(chat_id, e.retry_after)
+                else:
+                    # Правки не читают бакет чата: выдерживаем паузу здесь
+                    await asyncio.sleep(e.retry_after)
+            except TelegramEntityTooLarge:
+                raise
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                if not idempotent or attempt > self.max_retries:
+                    raise
+                delay = min(0.5 * 2 ** attempt, 10)
+                logging.warning(
+                    "Временная ошибка %s: %s. Повтор через %s с", method.__api_method__, e, delay)
+                await asyncio.sleep(delay)
+
+    def _pause(self, chat_id: int | str | None, retry_after: float):
+        now = asyncio.get_running_loop().time()
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id, now)
+            bucket.tokens = min(bucket.tokens, 0) - retry_after * bucket.rate
+        else:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    async def _acquire(self, chat_id: int | str | None, lane: Lane):
+        loop = asyncio.get_running_loop()
+        if chat_id is not None:
+            if delay := self._chat_bucket(chat_id, loop.time()).reserve(loop.time()):
+                await asyncio.sleep(delay)
+
+        if self._global is None:
+            self._global = TokenBucket(self.global_rate, self.global_rate, loop.time())
+        now = loop.time()
+        if not self._waiters and now >= self._paused_until and self._global.wait_time(now) == 0:
+            self._global.tokens -= 1
+            return
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (lane, next(self._seq), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        """Выдаёт глобальные слоты ожидающим запросам в порядке приоритета."""
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            now = loop.time()
+            delay = max(self._paused_until - now, self._global.wait_time(now))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    self._global.tokens -= 1
+                    future.set_result(None)
+                    break
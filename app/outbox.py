@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from os import getenv
+from typing import Awaitable, Callable
+
+from sqlalchemy import Row
+
+from app.background import PeriodicWorker
+from database.crud import (claim_lead_outbox, get_next_lead_due,
+                           mark_lead_sent, now_utc, retry_lead)
+
+LEAD_BATCH_SIZE = int(getenv('LEAD_BATCH_SIZE', 20))
+# Сколько секунд забранный лид недоступен другим процессам
+LEAD_LEASE = float(getenv('LEAD_LEASE', 120))
+LEAD_RETRY_BASE = float(getenv('LEAD_RETRY_BASE', 5))
+LEAD_RETRY_MAX = float(getenv('LEAD_RETRY_MAX', 3600))
+LEAD_MAX_SLEEP = float(getenv('LEAD_MAX_SLEEP', 30))
+
+
+class LeadDispatcher:
+    """
+    Фоновая доставка лидов из lead_outbox.
+
+    Лиды забираются пачками с арендой (lease), после успешной отправки
+    помечаются sent_at, после ошибки откладываются с экспоненциальной
+    задержкой. Лид не выбрасывается никогда: попытки повторяются, пока
+    отправка не пройдёт.
+    """
+
+    def __init__(self, deliver: Callable[[Row], Awaitable[None]],
+                 batch_size: int = LEAD_BATCH_SIZE,
+                 lease: float = LEAD_LEASE,
+                 max_sleep: float = LEAD_MAX_SLEEP):
+        self._deliver = deliver
+        self._batch_size = batch_size
+        self._lease = lease
+        self._max_sleep = max_sleep
+        self._worker = PeriodicWorker("доставка лидов", max_sleep, self._tick)
+
+    def start(self):
+        self._worker.start()
+
+    async def stop(self):
+        await self._worker.stop()
+
+    def notify(self):
+        """Будит цикл: в outbox появился новый лид."""
+        self._worker.notify()
+
+    async def _process(self, lead: Row):
+        try:
+            await self._deliver(lead)
+        except Exception as e:
+            delay = min(LEAD_RETRY_BASE * 2 ** (lead.attempts - 1), LEAD_RETRY_MAX)
+            logging.error("Лид %s не доставлен (попытка %s): %s. Повтор через %.0f с",
+                          lead.user_id, lead.attempts, e, delay)
+            await retry_lead(lead.outbox_id, str(e), delay)
+            return
+        await mark_lead_sent(lead.outbox_id)
+
+    async def _tick(self) -> float:
+        batch = await claim_lead_outbox(self._batch_size, self._lease)
+        if batch:
+            await asyncio.gather(*(self._process(lead) for lead in batch))
+            if len(batch) == self._batch_size:
+                return 0
+
+        if (next_due := await get_next_lead_due()) is None:
+            return self._max_sleep
+        delay = (next_due - now_utc()).total_seconds()
+        return min(max(delay, 0), self._max_sleep)
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+from os import getenv
+from typing import Awaitable, Callable
+
+from sqlalchemy import Row
+
+from app.background import PeriodicWorker
+from database.crud import claim_due_reminders, get_next_reminder_due, now_utc
+
+REMINDER_BATCH_SIZE = int(getenv('REMINDER_BATCH_SIZE', 100))
+# Верхняя граница сна: напоминания, запланированные другими процессами,
+# будут подхвачены не позже, чем через этот интервал.
+REMINDER_MAX_SLEEP = float(getenv('REMINDER_MAX_SLEEP', 60))
+# Сколько секунд забранное напоминание недоступно другим процессам;
+# не отправленное за это время будет забрано снова
+REMINDER_LEASE = float(getenv('REMINDER_LEASE', 300))
+
+
+class ReminderScheduler:
+    """
+    Единый цикл отправки напоминаний из таблицы reminders.
+
+    Цикл спит до ближайшего due_at, забирает наступившие напоминания пачками
+    в аренду и передаёт их в deliver, который удаляет строку после отправки.
+    Планирование и отмена — это обычные изменения строк в БД, поэтому
+    напоминания переживают перезапуск бота и ошибки отправки.
+    """
+
+    def __init__(self, deliver: Callable[[Row], Awaitable[None]],
+                 batch_size: int = REMINDER_BATCH_SIZE,
+                 max_sleep: float = REMINDER_MAX_SLEEP,
+                 lease: float = REMINDER_LEASE):
+        self._deliver = deliver
+        self._batch_size = batch_size
+        self._lease = timedelta(seconds=lease)
+        self._max_sleep = max_sleep
+        self._next_due: datetime | None = None
+        self._worker = PeriodicWorker("планировщик напоминаний", max_sleep, self._tick)
+
+    def start(self):
+        self._worker.start()
+
+    async def stop(self):
+        await self._worker.stop()
+
+    def notify(self, due_at: datetime):
+        """Будит цикл, если новое напоминание наступает раньше ожидаемого."""
+        if self._next_due is None or due_at < self._next_due:
+            self._next_due = due_at
+            self._worker.notify()
+
+    async def _tick(self) -> float:
+        batch = await claim_due_reminders(self._batch_size, self._lease)
+        if batch:
+            await asyncio.gather(*(self._deliver(r) for r in batch))
+            if len(batch) == self._batch_size:
+                return 0
+
+        self._next_due = await get_next_reminder_due()
+        if self._next_due is None:
+            return self._max_sleep
+        delay = (self._next_due - now_utc()).total_seconds()
+        return min(max(delay, 0), self._max_sleep)
@@ -0,0 +1,74 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from app.handers import MANAGER_IDS
+from app.history import clean_text
+from app.monitoring import survey_stats, today_msk
+from app.survey import survey_loader
+from database.crud import get_survey_stats
+
+router = Router()
+router.message.filter(F.from_user.id.in_(MANAGER_IDS))
+
+
+def _percent(part: int, total: int) -> str:
+    return f"{part * 100 / total:.0f}%" if total else "—"
+
+
+def render_stats(rows, days: int) -> str:
+    totals: dict[str, int] = defaultdict(int)
+    answers: dict[int, dict[int, int]] = defaultdict(dict)
+    completed: dict[int, int] = defaultdict(int)
+    for metric, question, option, count in rows:
+        if metric == 'answer':
+            answers[question][option] = count
+        elif metric == 'completed':
+            completed[option] = count
+        else:
+            totals[metric] += count
+
+    period = "сегодня" if days == 1 else f"{days} дн."
+    started = totals['started']
+    lines = [f"📊 Воронка опроса за {period}", f"Начали опрос: {started}"]
+
+    previous = started
+    survey = survey_loader.survey
+    for q_num in survey.order:
+        question = survey.questions[q_num]
+        answered = sum(answers[q_num].values())
+        lines.append(f"\n{q_num}. {clean_text(question.text)}\n"
+                     f"Ответили: {answered} ({_percent(answered, previous)} от предыдущего шага)")
+        for idx, option in enumerate(question.options):
+            count = answers[q_num].get(idx, 0)
+            lines.append(f"   {option}: {count} ({_percent(count, answered)})")
+        previous = answered
+
+    finished = completed[1] + completed[0]
+    lines.append(
+        f"\nЗавершили опрос: {finished}\n"
+        f"Квалифицированы: {completed[1]} ({_percent(completed[1], finished)})\n"
+        f"Оставили телефон: {totals['contact']} ({_percent(totals['contact'], completed[1])})\n"
+        f"Лидов: {totals['lead']}\n"
+        f"Конверсия старт → лид: {_percent(totals['lead'], started)}"
+    )
+    return "\n".join(lines)
+
+
+@router.message(Command('stats'))
+async def stats_command(message: Message, command: CommandObject):
+    args = (command.args or '').strip()
+    if args and not args.isdigit():
+        return await message.answer("Использование: /stats [дней], по умолчанию — сегодня")
+    days = max(int(args or 1), 1)
+    # Свежие счётчики из памяти — в таблицу, чтобы отчёт был точным
+    try:
+        await survey_stats.flush()
+    except Exception as e:
+        logging.error("Не удалось сохранить статистику перед /stats: %s", e)
+    rows = await get_survey_stats(today_msk() - timedelta(days=days - 1))
+    await message.answer(render_stats(rows, days))
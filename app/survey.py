@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import os
+from os import getenv
+from pathlib import Path
+from typing import NamedTuple
+
+from aiogram.fsm.state import State
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy import Text
+
+from app import keyboards as kb
+from app.background import PeriodicWorker
+from database.models import User
+
+SURVEY_CONFIG = Path(getenv('SURVEY_CONFIG', Path(__file__).parent / 'survey.json'))
+# Как часто проверять, не изменился ли файл опроса; 0 — без горячей перезагрузки
+SURVEY_RELOAD_INTERVAL = float(getenv('SURVEY_RELOAD_INTERVAL', 5))
+
+# Ответ на вопрос N хранится в users.ans_N: номер варианта (SMALLINT) или текст
+ANSWER_COLUMNS = {
+    int(column.name.split('_')[1]): isinstance(column.type, Text)
+    for column in User.__table__.columns if column.name.startswith('ans_')
+}
+
+
+class Question(NamedTuple):
+    id: int
+    text: str
+    # Пустой кортеж — вопрос со свободным ответом текстом
+    options: tuple[str, ...]
+    state: State
+    keyboard: InlineKeyboardMarkup | None
+    # Текст варианта -> номер, включая прежние формулировки
+    indexes: dict[str, int]
+    max_length: int
+    error: str
+
+    @property
+    def is_text(self) -> bool:
+        return not self.options
+
+
+class Survey:
+    """
+    Опрос, скомпилированный из описания в SURVEY_CONFIG.
+
+    Всё, что нужно обработчикам, считается один раз: состояния FSM,
+    клавиатуры, переходы вперёд/назад и множества номеров вариантов,
+    при которых анкета неквалифицирована.
+    На апдейт остаются только обращения к словарям.
+    """
+
+    def __init__(self, questions: list[Question], disqualify: dict[int, frozenset[int]]):
+        self.order = tuple(q.id for q in questions)
+        self.questions = {q.id: q for q in questions}
+        self.first = self.order[0]
+        self.next = dict(zip(self.order, self.order[1:]))
+        self.prev = dict(zip(self.order[1:], self.order))
+        self.by_state = {q.state.state: q for q in questions}
+        self.text_states = frozenset(q.state.state for q in questions if q.is_text)
+        self.disqualify = disqualify
+
+    @property
+    def keyboards(self) -> list[InlineKeyboardMarkup]:
+        return [q.keyboard for q in self.questions.values() if q.keyboard]
+
+    def answer_index(self, q_num: int, text: str | None) -> int | str | None:
+        """Значение для users.ans_N: номер варианта или текст для вопроса без вариантов"""
+        question = self.questions.get(q_num)
+        if text is None or question is None or question.is_text:
+            return text
+        return question.indexes.get(text)
+
+    def answer_text(self, q_num: int, value) -> str | None:
+        """Обратное к answer_index: текст ответа из users.ans_N"""
+        question = self.questions.get(q_num)
+        if value is None or question is None or not isinstance(value, int):
+            return value
+        return question.options[value] if 0 <= value < len(question.options) else str(value)
+
+    def answers(self, data: dict) -> dict[str, int | str | None]:
+        """Ответы из данных FSM в виде колонок users.ans_N"""
+        return {f'ans_{q_num}': self.answer_index(q_num, data.get(f'question_{q_num}'))
+                for q_num in self.order}
+
+    def qualifies(self, answers: dict[str, int | str | None]) -> bool:
+        return not any(answers.get(f'ans_{q_num}') in indexes
+                       for q_num, indexes in self.disqualify.items())
+
+    def qualifying_answers(self) -> dict[int, int]:
+        """Для каждого вопроса с вариантами — первый вариант, не дисквалифицирующий анкету"""
+        return {q_num: next(idx for idx in range(len(question.options))
+                            if idx not in self.disqualify.get(q_num, ()))
+                for q_num, question in self.questions.items() if not question.is_text}
+
+
+def _fail(message: str):
+    raise ValueError(f"Описание опроса: {message}")
+
+
+def compile_survey(definition: dict, previous: Survey | None = None) -> Survey:
+    """
+    Проверяет описание опроса и компилирует его; ValueError — описание некорректно.
+
+    Прежние формулировки вариантов перечисляются в aliases вопроса:
+    {"старый текст": "текущий вариант"}; по ним распознаются ответы
+    из незавершённых сессий и условия рассылок.
+
+    С previous проверяется совместимость с текущим опросом, чтобы не
+    сломать уже сохранённые ответы и незавершённые сессии: вопросы не
+    удаляются, варианты не удаляются и не переставляются (в базе хранится
+    номер), новые варианты дописываются в конец. Каждый прежний текст
+    варианта (и прежний alias) должен остаться вариантом или alias
+    с тем же номером.
+    """
+    raw_questions = definition.get('questions') or _fail("нет ни одного вопроса")
+    ids = [q.get('id') for q in raw_questions]
+    if len(ids) != len(set(ids)):
+        _fail("повторяющиеся id вопросов")
+    if previous and (missing := set(previous.order) - set(ids)):
+        _fail(f"нельзя удалить вопросы {sorted(missing)}: по ним идут сессии")
+
+    questions = []
+    for position, raw in enumerate(raw_questions):
+        q_id = raw.get('id')
+        if q_id not in ANSWER_COLUMNS:
+            _fail(f"id вопроса {q_id!r} — нет колонки users.ans_{q_id}")
+        if not raw.get('text'):
+            _fail(f"у вопроса {q_id} нет текста")
+        options = tuple(raw.get('options') or ())
+        if raw.get('type') == 'text':
+            if options:
+                _fail(f"у текстового вопроса {q_id} не может быть вариантов")
+            if not ANSWER_COLUMNS[q_id]:
+                _fail(f"users.ans_{q_id} хранит номер варианта, текстовый ответ туда не записать")
+        elif not options:
+            _fail(f"у вопроса {q_id} нет вариантов ответа")
+        elif ANSWER_COLUMNS[q_id]:
+            _fail(f"users.ans_{q_id} хранит текст, вопрос {q_id} должен быть текстовым")
+        if len(set(options)) != len(options):
+            _fail(f"повторяющиеся варианты в вопросе {q_id}")
+
+        indexes = {option: idx for idx, option in enumerate(options)}
+        for alias, target in (raw.get('aliases') or {}).items():
+            if alias in indexes:
+                _fail(f"alias «{alias}» в вопросе {q_id} совпадает с вариантом")
+            if target not in options:
+                _fail(f"alias «{alias}» в вопросе {q_id} ссылается на неизвестный вариант «{target}»")
+            indexes[alias] = options.index(target)
+        if previous and (old := previous.questions.get(q_id)):
+            if len(options) < len(old.options):
+                _fail(f"в вопросе {q_id} нельзя удалять варианты: в базе хранится их номер")
+            for text, idx in old.indexes.items():
+                if text not in indexes:
+                    _fail(f"вариант «{text}» вопроса {q_id} пропал: переименованный вариант "
+                          f"оставьте в aliases")
+                if indexes[text] != idx:
+                    _fail(f"вариант «{text}» вопроса {q_id} сменил номер {idx} → {indexes[text]}: "
+                          f"в базе хранится номер, варианты нельзя переставлять")
+
+        max_length = int(raw.get('max_length', 1500))
+        has_back = position > 0
+        if options:
+            keyboard = kb.get_question_keyboard(q_id, options, back=has_back)
+        else:
+            keyboard = kb.get_back_keyboard(q_id) if has_back else None
+        questions.append(Question(
+            id=q_id, text=raw['text'], options=options,
+            # Имена состояний как у прежнего Form.question_N: сессии переживают перезагрузку
+            state=State(state=f'question_{q_id}', group_name='Form'),
+            keyboard=keyboard, indexes=indexes,
+            max_length=max_length,
+            error=raw.get('error') or f"Пожалуйста, ответьте одним сообщением до {max_length} символов.",
+        ))
+
+    by_id = {q.id: q for q in questions}
+    disqualify = {}
+    for q_key, values in (definition.get('disqualify') or {}).items():
+        question = by_id.get(int(q_key))
+        if question is None or question.is_text:
+            _fail(f"условие квалификации ссылается на вопрос {q_key} без вариантов")
+        unknown = [value for value in values if value not in question.indexes]
+        if unknown:
+            _fail(f"в вопросе {q_key} нет вариантов {unknown}")
+        disqualify[question.id] = frozenset(question.indexes[value] for value in values)
+
+    return Survey(questions, disqualify)
+
+
+def load_survey(path: Path = SURVEY_CONFIG, previous: Survey | None = None) -> Survey:
+    with open(path, encoding='utf-8') as f:
+        return compile_survey(json.load(f), previous)
+
+
+class SurveyLoader:
+    """
+    Держит текущий опрос и перечитывает SURVEY_CONFIG при изменении файла.
+
+    Новый опрос компилируется целиком и подменяет старый одной ссылкой:
+    обработчики, уже взявшие survey, доработают со старым, следующие
+    апдейты получат новый. Ошибочное описание не применяется, бот
+    продолжает работать с прежним.
+    """
+
+    def __init__(self, path: Path = SURVEY_CONFIG,
+                 reload_interval: float = SURVEY_RELOAD_INTERVAL):
+        self.path = path
+        self._mtime = os.stat(path).st_mtime_ns
+        self.survey = load_survey(path)
+        kb.register_static_keyboards(*self.survey.keyboards)
+        self._worker = PeriodicWorker("перезагрузка опроса", reload_interval,
+                                      self._tick, first_delay=reload_interval)
+
+    async def reload(self) -> bool:
+        """Перечитывает файл, если он изменился; True — опрос обновлён."""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        survey = await asyncio.to_thread(load_survey, self.path, self.survey)
+        old, self.survey = self.survey, survey
+        kb.register_static_keyboards(*survey.keyboards)
+        kb.unregister_static_keyboards(*old.keyboards)
+        logging.info("Опрос перезагружен из %s: вопросов %s", self.path, len(survey.order))
+        return True
+
+    def start(self):
+        self._worker.start()
+
+    async def stop(self):
+        await self._worker.stop()
+
+    async def _tick(self):
+        try:
+            await self.reload()
+        except ValueError as e:
+            logging.error("Опрос не перезагружен, остаётся прежний: %s", e)
+
+
+survey_loader = SurveyLoader()
@@ -0,0 +1,101 @@
+import asyncio
+import hmac
+import logging
+from os import getenv
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+WEBHOOK_URL = getenv('WEBHOOK_URL')
+WEBHOOK_PATH = getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_MAX_IN_FLIGHT = int(getenv('WEBHOOK_MAX_IN_FLIGHT', 200))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """
+    Принимает апдейты от Telegram и передаёт их в Dispatcher в фоне.
+
+    Ответ 200 отдаётся сразу после разбора апдейта. Если одновременно
+    обрабатывается WEBHOOK_MAX_IN_FLIGHT апдейтов, новый получает 503,
+    и Telegram доставит его повторно.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot,
+                 secret: str | None = WEBHOOK_SECRET,
+                 max_in_flight: int = WEBHOOK_MAX_IN_FLIGHT):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret = secret
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(
+                request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+
+        if self._semaphore.locked():
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(
+                await request.json(), context={"bot": self.bot})
+        except ValueError as e:
+            logging.warning("Некорректный апдейт от webhook: %s", e)
+            return web.Response(status=400)
+
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception as e:
+            logging.error("Ошибка обработки апдейта %s: %s", update.update_id, e, exc_info=True)
+        finally:
+            self._semaphore.release()
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot):
+    """Поднимает aiohttp-сервер, регистрирует webhook и работает до отмены."""
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL не задан для режима webhook")
+
+    handler = WebhookHandler(dispatcher, bot)
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handler.handle)
+
+    workflow_data = {"dispatcher": dispatcher, "bots": [bot], "bot": bot,
+                     **dispatcher.workflow_data}
+    await dispatcher.emit_startup(**workflow_data)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    try:
+        await site.start()
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=min(WEBHOOK_MAX_IN_FLIGHT, 100),
+        )
+        logging.info("Webhook слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await handler.close()
+        await dispatcher.emit_shutdown(**workflow_data)
@@ -0,0 +1,250 @@
+"""
+Бенчмарк полного прохождения опроса внутри одного процесса.
+
+Синтетические апдейты (/start → start_form → ответы на опрос → контакт →
+комментарий) прогоняются через настоящие dp и router из main.py.
+Bot API заменён заглушкой сессии, база — реальная, но отдельная от боевой:
+BENCH_DATABASE_URL или --database-url. Созданные строки (пользователи,
+напоминания, лиды) удаляются в конце прогона.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.survey_bench --users 200 --concurrency 50
+
+Печатает пропускную способность (опросов в секунду), p50/p99 по каждому
+обработчику и число SQL-запросов на один опрос.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+# Счётчики запросов к БД нужны для отчёта — включаем до импорта модулей бота
+os.environ.setdefault('DB_METRICS', '1')
+os.environ.setdefault('METRICS_PORT', '0')
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import (AnswerCallbackQuery, DeleteMessage,
+                             EditMessageReplyMarkup, EditMessageText, GetMe,
+                             SendMessage)
+from aiogram.types import (CallbackQuery, Chat, Contact, Message,
+                           MessageEntity, Update, User)
+
+BENCH_TOKEN = '123456:bench'
+BENCH_DATABASE_URL = os.getenv('BENCH_DATABASE_URL')
+TEXT_ANSWER = 'Информатика, Германия'
+
+
+class StubSession(BaseSession):
+    """Сессия без сети: отвечает на методы Bot API правдоподобными объектами."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: dict[str, int] = defaultdict(int)
+        self._message_ids = itertools.count(1_000_000)
+        self._bot_user = User(id=123456, is_bot=True, first_name='bench')
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=method.chat_id, type='private'),
+                from_user=self._bot_user,
+                text=method.text,
+            )
+        if isinstance(method, GetMe):
+            return self._bot_user
+        if isinstance(method, (EditMessageText, EditMessageReplyMarkup,
+                               DeleteMessage, AnswerCallbackQuery)):
+            return True
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536,
+                             raise_for_status=True):
+        """Бот ничего не скачивает; на всякий случай отдаём пустой файл."""
+        self.calls['stream_content'] += 1
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class LatencyRecorder(BaseMiddleware):
+    """Записывает точную латентность каждого вызова обработчика."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[data["handler"].callback.__name__].append(
+                time.perf_counter() - start)
+
+
+class UpdateFactory:
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name='Bench', username=f'u{user_id}')
+
+    def _message(self, user_id: int, **kwargs) -> Message:
+        return Message(
+            message_id=next(self._message_ids),
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=user_id, type='private'),
+            from_user=self._user(user_id),
+            **kwargs,
+        )
+
+    def command(self, user_id: int, command: str) -> Update:
+        return Update(update_id=next(self._update_ids), message=self._message(
+            user_id, text=command,
+            entities=[MessageEntity(type='bot_command', offset=0, length=len(command))]))
+
+    def text(self, user_id: int, text: str) -> Update:
+        return Update(update_id=next(self._update_ids), message=self._message(user_id, text=text))
+
+    def contact(self, user_id: int, phone: str) -> Update:
+        return Update(update_id=next(self._update_ids), message=self._message(
+            user_id, contact=Contact(phone_number=phone, first_name='Bench', user_id=user_id)))
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return Update(update_id=next(self._update_ids), callback_query=CallbackQuery(
+            id=str(next(self._update_ids)),
+            from_user=self._user(user_id),
+            chat_instance=str(user_id),
+            data=data,
+            message=self._message(user_id, text='bench'),
+        ))
+
+
+def survey_updates(factory: UpdateFactory, user_id: int):
+    from app.survey import survey_loader
+
+    # Ответы, при которых пользователь квалифицирован и доходит до отправки лида
+    survey = survey_loader.survey
+    answers = survey.qualifying_answers()
+    yield factory.command(user_id, '/start')
+    yield factory.callback(user_id, 'start_form')
+    for q_num in survey.order:
+        if survey.questions[q_num].is_text:
+            yield factory.text(user_id, TEXT_ANSWER)
+        else:
+            yield factory.callback(user_id, f'answer_{q_num}_{answers[q_num]}')
+    yield factory.contact(user_id, f'+7999{user_id % 10_000_000:07d}')
+    yield factory.text(user_id, 'Звонить после 18:00')
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def cleanup(user_ids: range):
+    """Удаляет всё, что прогон записал в базу для пользователей user_ids."""
+    from sqlalchemy import delete
+
+    from database.config import AsyncSessionLocal
+    from database.models import (FSMRecord, LeadAssignment, LeadOutbox,
+                                 Reminder, User, UserArchive)
+
+    async with AsyncSessionLocal() as session:
+        for model in (Reminder, LeadOutbox, LeadAssignment, FSMRecord, User, UserArchive):
+            await session.execute(
+                delete(model).where(model.user_id.between(user_ids[0], user_ids[-1])))
+        await session.commit()
+
+
+async def run(args):
+    from app.handers import set_bot_instance
+    from app.history import history_renderer
+    from database.config import engine
+    from database.instrumentation import db_queries_total, instrument_engine
+    from database.migrate import migrate
+    from main import dp
+
+    recorder = LatencyRecorder()
+    dp.message.middleware(recorder)
+    dp.callback_query.middleware(recorder)
+
+    instrument_engine(engine)
+    await migrate(engine)
+
+    session = StubSession(latency=args.api_latency)
+    bot = Bot(token=BENCH_TOKEN, session=session)
+    set_bot_instance(bot)
+    factory = UpdateFactory()
+    base_user_id = args.user_id_base or random.randrange(10**12, 2 * 10**12)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def simulate(user_id: int):
+        async with semaphore:
+            for update in survey_updates(factory, user_id):
+                await dp.feed_update(bot, update)
+
+    user_ids = range(base_user_id, base_user_id + args.users)
+    queries_before = db_queries_total.get()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(simulate(user_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - start
+        queries = db_queries_total.get() - queries_before
+    finally:
+        await history_renderer.close()
+        await cleanup(user_ids)
+
+    print(f"Опросов: {args.users}, параллельно: {args.concurrency}, время: {elapsed:.2f} с")
+    print(f"Пропускная способность: {args.users / elapsed:.1f} опросов/с")
+    print(f"SQL-запросов на опрос: {queries / args.users:.1f}")
+    print(f"Вызовов Bot API на опрос: {sum(session.calls.values()) / args.users:.1f}")
+    print()
+    print(f"{'обработчик':<28}{'вызовов':>9}{'p50, мс':>10}{'p99, мс':>10}{'среднее':>10}")
+    for name, samples in sorted(recorder.samples.items()):
+        print(f"{name:<28}{len(samples):>9}"
+              f"{percentile(samples, 0.5) * 1000:>10.2f}"
+              f"{percentile(samples, 0.99) * 1000:>10.2f}"
+              f"{statistics.fmean(samples) * 1000:>10.2f}")
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100, help='сколько опросов пройти')
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help='сколько пользователей проходят опрос одновременно')
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help='искусственная задержка ответа Bot API, с')
+    parser.add_argument('--database-url', default=BENCH_DATABASE_URL,
+                        help='отдельная база для прогона (по умолчанию BENCH_DATABASE_URL)')
+    parser.add_argument('--user-id-base', type=int, default=0,
+                        help='первый user_id (по умолчанию случайный диапазон)')
+    args = parser.parse_args()
+    # Напоминания и лиды из прогона иначе разослал бы настоящий бот
+    if not args.database_url:
+        parser.error("нужна отдельная база: BENCH_DATABASE_URL или --database-url")
+    if args.database_url == os.getenv('DATABASE_URL'):
+        parser.error("база прогона совпадает с DATABASE_URL бота")
+    os.environ['DATABASE_URL'] = args.database_url
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
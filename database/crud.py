@@ -1,48 +1,242 @@
-from datetime import datetime
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time, timedelta
+from os import getenv
+from typing import AsyncIterator, NamedTuple
 
-from sqlalchemy import select, update
+from sqlalchemy import (Row, all_, and_, bindparam, delete, false, func,
+                        literal, or_, select, true, tuple_, union_all, update)
 
 from database.config import AsyncSessionLocal
-from database.models import User
+from database.instrumentation import timed
+from database.models import (Broadcast, LeadAssignment, LeadOutbox,
+                             ProcessedUpdate, Reminder, SurveyStat, User,
+                             UserArchive)
 from zoneinfo import ZoneInfo
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+
+
+USER_CACHE_SIZE = int(getenv('USER_CACHE_SIZE', 50000))
+USER_CACHE_TTL = float(getenv('USER_CACHE_TTL', 600))
+
+USER_COLUMNS = [column.name for column in User.__table__.columns]
 
 
 def now_utc():
     return datetime.now(ZoneInfo("UTC"))
 
-async def add_user(user_id: int, username: str | None):
+
+class UserStatus(NamedTuple):
+    survey_completed: bool
+    qual: bool
+    has_phone: bool
+    has_comments: bool
+
+
+class UserStatusCache:
     """
-    Добавляет нового пользователя или обновляет username существующего.
+    Ограниченный LRU-кэш статусов пользователей с TTL.
+
+    Функции записи ниже обновляют его сразу после commit (write-through),
+    а TTL ограничивает устаревание, если запись сделал другой процесс.
     """
-    async with AsyncSessionLocal() as session:
-        stmt = insert(User).values(
-            user_id=user_id,
-            username=username,
-            registered_at=now_utc()  # ИСПРАВЛЕНО
-        )
-        do_update_stmt = stmt.on_conflict_do_update(
-            index_elements=['user_id'],
-            set_=dict(username=username)
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[int, tuple[float, UserStatus]] = OrderedDict()
+
+    def get(self, user_id: int) -> UserStatus | None:
+        item = self._items.get(user_id)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[user_id]
+            self.misses += 1
+            return None
+        self._items.move_to_end(user_id)
+        self.hits += 1
+        return item[1]
+
+    def set(self, user_id: int, status: UserStatus):
+        self._items[user_id] = (time.monotonic() + self.ttl, status)
+        self._items.move_to_end(user_id)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def update(self, user_id: int, **changes):
+        """Обновляет поля закэшированного статуса, если он есть."""
+        item = self._items.get(user_id)
+        if item is not None:
+            self._items[user_id] = (item[0], item[1]._replace(**changes))
+
+    def invalidate(self, user_id: int):
+        self._items.pop(user_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._items),
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+user_status_cache = UserStatusCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def _status_from_user(user: User) -> UserStatus:
+    return UserStatus(
+        survey_completed=bool(user.survey_completed),
+        qual=bool(user.qual),
+        has_phone=user.phone is not None,
+        has_comments=user.comments is not None,
+    )
+
+
+def user_cache_stats() -> dict:
+    """Счётчики попаданий/промахов кэша статусов пользователей"""
+    return user_status_cache.stats()
+
+
+_STATUS_COLUMNS = (
+    User.survey_completed,
+    User.qual,
+    User.phone.is_not(None),
+    User.comments.is_not(None),
+)
+
+
+def _moved_from_archive(user_id):
+    """CTE: строка пользователя, удалённая из users_archive (или ни одной)"""
+    archive = UserArchive.__table__
+    return (
+        delete(archive)
+        .where(archive.c.user_id == user_id)
+        .returning(*(archive.c[name] for name in USER_COLUMNS))
+        .cte('moved')
+    )
+
+
+def _restore_archived_user(user_id: int):
+    """
+    Переносит пользователя из users_archive обратно в users одним запросом
+    и возвращает его статус, если он был в архиве.
+    """
+    moved = _moved_from_archive(user_id)
+    return (
+        insert(User)
+        .from_select(USER_COLUMNS, select(*(moved.c[name] for name in USER_COLUMNS)))
+        .returning(*_STATUS_COLUMNS)
+        .add_cte(moved)
+    )
+
+def _start_user_query(reset_progress: bool):
+    """
+    Запрос для start_user. Пользователь из users_archive переносится обратно
+    в users тем же запросом: анкета берётся из архива, username и сброс —
+    новые. Запрос строится один раз при импорте, значения передаются
+    параметрами user_id и username.
+    """
+    users = User.__table__
+    moved = _moved_from_archive(bindparam('user_id', type_=users.c.user_id.type))
+    reset = dict(started_at=func.now()) if reset_progress else {}
+    # Новая строка: колонки из архива, если пользователь там был, иначе по умолчанию
+    values = {name: moved.c[name] for name in USER_COLUMNS}
+    values.update({name: func.coalesce(moved.c[name], default) for name, default in dict(
+        registered_at=func.now(), qual=false(), survey_completed=false()).items()})
+    values.update(user_id=bindparam('user_id', type_=users.c.user_id.type),
+                  username=bindparam('username', type_=users.c.username.type), **reset)
+    one = select(literal(1).label('one')).subquery('one')
+    stmt = insert(users).from_select(
+        USER_COLUMNS,
+        select(*(values[name] for name in USER_COLUMNS)).select_from(one.outerjoin(moved, true())),
+    )
+    return (
+        stmt.on_conflict_do_update(
+            index_elements=[users.c.user_id],
+            set_={name: stmt.excluded[name] for name in ('username', *reset)},
         )
-        await session.execute(do_update_stmt)
+        .returning(users.c.survey_completed, users.c.qual,
+                   users.c.phone.is_not(None), users.c.comments.is_not(None))
+        .add_cte(moved)
+    )
+
+
+_START_USER_QUERIES = {reset: _start_user_query(reset) for reset in (True, False)}
+_LOCK_USER = select(User.user_id).where(User.user_id == bindparam('user_id')).with_for_update()
+
+@timed
+async def start_user(user_id: int, username: str | None, reset_progress: bool = True) -> UserStatus:
+    """
+    /start: добавляет пользователя (или возвращает его из архива) либо
+    обновляет username, сбрасывает started_at и возвращает статус.
+
+    Сначала берётся блокировка строки users: если её держит archive_stale_users,
+    ждём коммита архивации, и основной запрос (новый снимок) уже видит строку
+    в users_archive. Без этого INSERT дождался бы удаления строки и вставил
+    пустую анкету, а пользователь остался бы и в архиве. Наоборот, пока
+    строку держит /start, архивация её пропускает (SKIP LOCKED).
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(_LOCK_USER, dict(user_id=user_id))
+        result = await session.execute(_START_USER_QUERIES[reset_progress],
+                                       dict(user_id=user_id, username=username))
+        row = result.one()
         await session.commit()
+    status = UserStatus(*(bool(value) for value in row))
+    user_status_cache.set(user_id, status)
+    return status
 
+@timed
 async def get_user_by_id(user_id: int):
-    """Получить пользователя по ID"""
+    """Получить пользователя по ID; архивированный берётся из users_archive"""
     async with AsyncSessionLocal() as session:
         stmt = select(User).where(User.user_id == user_id)
         result = await session.execute(stmt)
-        return result.scalar_one_or_none()
+        user = result.scalar_one_or_none()
+        if user is None:
+            result = await session.execute(
+                select(UserArchive).where(UserArchive.user_id == user_id))
+            user = result.scalar_one_or_none()
+    if user:
+        user_status_cache.set(user_id, _status_from_user(user))
+    return user
 
-async def user_completed_survey(user_id: int) -> bool:
-    """Проверяет, прошёл ли пользователь опрос"""
+@timed
+async def get_user_status(user_id: int) -> UserStatus | None:
+    """Статус пользователя: сначала из кэша, при промахе — одним SELECT"""
+    if status := user_status_cache.get(user_id):
+        return status
     async with AsyncSessionLocal() as session:
-        stmt = select(User.survey_completed).where(User.user_id == user_id)
+        stmt = select(*_STATUS_COLUMNS).where(User.user_id == user_id)
         result = await session.execute(stmt)
-        completed = result.scalar_one_or_none()
-        return completed if completed else False
+        row = result.one_or_none()
+        if row is None:
+            stmt = select(
+                UserArchive.survey_completed,
+                UserArchive.qual,
+                UserArchive.phone.is_not(None),
+                UserArchive.comments.is_not(None),
+            ).where(UserArchive.user_id == user_id)
+            result = await session.execute(stmt)
+            row = result.one_or_none()
+    if row is None:
+        return None
+    status = UserStatus(*(bool(value) for value in row))
+    user_status_cache.set(user_id, status)
+    return status
 
+@timed
+async def user_completed_survey(user_id: int) -> bool:
+    """Проверяет, прошёл ли пользователь опрос"""
+    status = await get_user_status(user_id)
+    return status.survey_completed if status else False
+
+@timed
 async def save_survey(user_id: int, qual: bool, **answers):
     """
     Сохраняет результаты опроса пользователя.
@@ -63,42 +257,612 @@ async def save_survey(user_id: int, qual: bool, **answers):
         )
         await session.execute(stmt)
         await session.commit()
+    user_status_cache.update(user_id, survey_completed=True, qual=qual)
 
+@timed
 async def update_user_phone(user_id: int, phone: str):
     async with AsyncSessionLocal() as session:
         stmt = update(User).where(User.user_id == user_id).values(phone=phone)
         await session.execute(stmt)
         await session.commit()
+    user_status_cache.update(user_id, has_phone=True)
 
-async def update_user_comments(user_id: int, comments: str):
+@timed
+async def submit_lead(user_id: int, comments: str) -> bool:
+    """
+    Сохраняет комментарий и в той же транзакции ставит лид в lead_outbox,
+    если пользователь квалифицирован и оставил телефон.
+    Возвращает True, если лид поставлен в очередь; у пользователя не бывает
+    двух неотправленных лидов (частичный уникальный индекс), повторный
+    вызов возвращает False.
+    """
     async with AsyncSessionLocal() as session:
-        stmt = update(User).where(User.user_id == user_id).values(comments=comments)
-        await session.execute(stmt)
+        stmt = (
+            update(User)
+            .where(User.user_id == user_id)
+            .values(comments=comments)
+            .returning(User.qual, User.phone.is_not(None))
+        )
+        result = await session.execute(stmt)
+        row = result.one_or_none()
+        queued = bool(row and row[0] and row[1])
+        if queued:
+            now = now_utc()
+            stmt = (
+                insert(LeadOutbox)
+                .values(user_id=user_id, created_at=now, next_attempt_at=now, attempts=0)
+                .on_conflict_do_nothing(index_elements=[LeadOutbox.user_id],
+                                        index_where=LeadOutbox.sent_at.is_(None))
+                .returning(LeadOutbox.id)
+            )
+            queued = (await session.execute(stmt)).first() is not None
         await session.commit()
+    user_status_cache.update(user_id, has_comments=True)
+    return queued
 
+@timed
 async def update_user_started_at(user_id: int):
     async with AsyncSessionLocal() as session:
         stmt = update(User).where(User.user_id == user_id).values(
             started_at=now_utc(),  # ИСПРАВЛЕНО
-            reminder_10min_sent=False,
-            reminder_2h_sent=False,
-            reminder_24h_sent=False
         )
+        result = await session.execute(stmt)
+        # Опрос начат кнопкой из старого сообщения, а пользователь уже в архиве
+        if result.rowcount == 0 and (await session.execute(_restore_archived_user(user_id))).first():
+            await session.execute(stmt)
+        await session.commit()
+
+
+@timed
+async def schedule_user_reminders(user_id: int, chat_id: int, delays: tuple[int, ...]) -> datetime:
+    """
+    Планирует (или переносит) напоминания пользователя.
+    Возвращает ближайшее время отправки.
+    """
+    now = now_utc()
+    rows = [
+        dict(user_id=user_id, minutes=minutes, chat_id=chat_id,
+             due_at=now + timedelta(minutes=minutes))
+        for minutes in delays
+    ]
+    async with AsyncSessionLocal() as session:
+        stmt = insert(Reminder).values(rows)
+        do_update_stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'minutes'],
+            set_=dict(chat_id=stmt.excluded.chat_id, due_at=stmt.excluded.due_at,
+                      claimed_until=None)
+        )
+        await session.execute(do_update_stmt)
+        await session.commit()
+    return min(row['due_at'] for row in rows)
+
+@timed
+async def cancel_user_reminders(user_id: int):
+    async with AsyncSessionLocal() as session:
+        stmt = delete(Reminder).where(Reminder.user_id == user_id)
         await session.execute(stmt)
         await session.commit()
 
-async def mark_reminder_sent(user_id: int, minutes: int):
+@timed
+async def get_next_reminder_due() -> datetime | None:
+    """Время ближайшего неотправленного напоминания с учётом аренды"""
     async with AsyncSessionLocal() as session:
-        column_to_update = None
-        if minutes == 10:
-            column_to_update = "reminder_10min_sent"
-        elif minutes == 120:
-            column_to_update = "reminder_2h_sent"
-        elif minutes == 1440:
-            column_to_update = "reminder_24h_sent"
-        else:
+        stmt = select(func.min(func.greatest(Reminder.due_at, Reminder.claimed_until)))
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
+
+@timed
+async def claim_due_reminders(limit: int, lease: timedelta) -> list[Row]:
+    """
+    Забирает пачку наступивших напоминаний в аренду на lease и возвращает их.
+
+    Строка удаляется только после отправки (complete_reminder): если процесс
+    упадёт или отправка не пройдёт, по истечении аренды напоминание будет
+    забрано снова. SKIP LOCKED позволяет нескольким процессам разбирать
+    очередь без дублей.
+
+    Если у пользователя наступило сразу несколько этапов (бот простаивал),
+    отправляется только последний, более ранние удаляются.
+    """
+    now = now_utc()
+    newer = aliased(Reminder)
+    newer_due = (
+        select(newer.user_id)
+        .where(newer.user_id == Reminder.user_id, newer.minutes > Reminder.minutes,
+               newer.due_at <= now)
+        .exists()
+    )
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            delete(Reminder)
+            .where(Reminder.due_at <= now, newer_due)
+            .execution_options(synchronize_session=False)
+        )
+        due = (
+            select(Reminder.user_id, Reminder.minutes)
+            .where(Reminder.due_at <= now,
+                   or_(Reminder.claimed_until.is_(None), Reminder.claimed_until <= now))
+            .order_by(Reminder.due_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(Reminder)
+            .where(tuple_(Reminder.user_id, Reminder.minutes).in_(due))
+            .values(claimed_until=now + lease)
+            .returning(Reminder.user_id, Reminder.chat_id, Reminder.minutes, Reminder.due_at)
+            .execution_options(synchronize_session=False)
+        )
+        result = await session.execute(stmt)
+        reminders = list(result.all())
+        await session.commit()
+        return reminders
+
+@timed
+async def complete_reminder(user_id: int, minutes: int, due_at: datetime):
+    """
+    Удаляет отработанное напоминание. Если за время отправки пользователь
+    снова нажал /start и напоминание перепланировано, due_at уже другой
+    и строка остаётся.
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = delete(Reminder).where(Reminder.user_id == user_id, Reminder.minutes == minutes,
+                                      Reminder.due_at == due_at)
+        await session.execute(stmt)
+        await session.commit()
+
+
+def _all_users():
+    """users вместе с users_archive: сегменты рассылок и выгрузок включают архив"""
+    archive = UserArchive.__table__
+    return union_all(
+        select(*(User.__table__.c[name] for name in USER_COLUMNS)),
+        select(*(archive.c[name] for name in USER_COLUMNS)),
+    ).subquery('all_users')
+
+
+def _segment_filters(segment: dict, users) -> list:
+    """Условия WHERE для сегмента рассылки (ключи см. app.broadcast.parse_segment)"""
+    msk = ZoneInfo("Europe/Moscow")
+    columns = users.c
+    filters = []
+    for key, value in segment.items():
+        if key == 'qual':
+            filters.append(columns.qual.is_(value))
+        elif key == 'completed':
+            filters.append(columns.survey_completed.is_(value))
+        elif key == 'has_phone':
+            filters.append(columns.phone.is_not(None) if value else columns.phone.is_(None))
+        elif key == 'since':
+            day = datetime.combine(date.fromisoformat(value), dt_time(), msk)
+            filters.append(columns.registered_at >= day)
+        elif key == 'until':
+            day = datetime.combine(date.fromisoformat(value), dt_time(), msk)
+            filters.append(columns.registered_at < day + timedelta(days=1))
+        elif key.startswith('ans_'):
+            filters.append(columns[key] == value)
+    return filters
+
+@timed
+async def count_segment(segment: dict) -> int:
+    users = _all_users()
+    async with AsyncSessionLocal() as session:
+        stmt = select(func.count()).select_from(users).where(*_segment_filters(segment, users))
+        result = await session.execute(stmt)
+        return result.scalar_one()
+
+
+async def stream_segment_rows(segment: dict, columns: tuple, after_user_id: int = 0,
+                              page_size: int = 1000) -> AsyncIterator[Row]:
+    """
+    Перебирает строки сегмента по возрастанию user_id, начиная после after_user_id.
+    Первой колонкой в columns должен быть User.user_id. Колонки User читаются
+    из users и users_archive вместе.
+
+    Каждая страница читается серверным курсором (stream + yield_per), а
+    следующая начинается с последнего выданного id. Так транзакция с курсором
+    не живёт всё время обработки, а таблица users не загружается в память целиком.
+    """
+    users = _all_users()
+    columns = [users.c[column.key] for column in columns]
+    filters = _segment_filters(segment, users)
+    while True:
+        fetched = 0
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                select(*columns)
+                .where(users.c.user_id > after_user_id, *filters)
+                .order_by(users.c.user_id)
+                .limit(page_size)
+                .execution_options(yield_per=min(page_size, 500))
+            )
+            result = await session.stream(stmt)
+            async for row in result:
+                fetched += 1
+                after_user_id = row[0]
+                yield row
+        if fetched < page_size:
             return
 
-        stmt = update(User).where(User.user_id == user_id).values({column_to_update: True})
+
+async def stream_segment_user_ids(segment: dict, after_user_id: int,
+                                  page_size: int) -> AsyncIterator[int]:
+    """user_id сегмента по возрастанию (см. stream_segment_rows)"""
+    async for row in stream_segment_rows(segment, (User.user_id,), after_user_id, page_size):
+        yield row[0]
+
+@timed
+async def create_broadcast(created_by: int, from_chat_id: int, message_id: int,
+                           segment: dict, total: int, owner: str, lease: timedelta) -> Broadcast:
+    """Создаёт рассылку сразу в аренде у процесса, который её запустит."""
+    async with AsyncSessionLocal() as session:
+        broadcast = Broadcast(
+            created_by=created_by,
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            segment=segment,
+            total=total,
+            status='running',
+            last_user_id=0,
+            sent=0,
+            blocked=0,
+            failed=0,
+            created_at=now_utc(),
+            owner=owner,
+            lease_until=now_utc() + lease,
+        )
+        session.add(broadcast)
+        await session.commit()
+        await session.refresh(broadcast)
+        return broadcast
+
+@timed
+async def get_running_broadcasts() -> list[Broadcast]:
+    async with AsyncSessionLocal() as session:
+        stmt = select(Broadcast).where(Broadcast.status == 'running').order_by(Broadcast.id)
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+
+@timed
+async def claim_broadcasts(owner: str, lease: timedelta) -> list[Broadcast]:
+    """
+    Забирает в аренду идущие рассылки без владельца или с истёкшей арендой.
+    SKIP LOCKED и условие на lease_until не дают двум процессам забрать
+    одну рассылку.
+    """
+    now = now_utc()
+    async with AsyncSessionLocal() as session:
+        free = (
+            select(Broadcast.id)
+            .where(Broadcast.status == 'running',
+                   or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < now))
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(Broadcast)
+            .where(Broadcast.id.in_(free))
+            .values(owner=owner, lease_until=now + lease)
+            .returning(Broadcast)
+        )
+        result = await session.execute(stmt)
+        broadcasts = sorted(result.scalars().all(), key=lambda b: b.id)
+        await session.commit()
+        return broadcasts
+
+@timed
+async def release_broadcasts(owner: str):
+    """Снимает аренду при остановке: рассылки сразу продолжит другой процесс."""
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            update(Broadcast)
+            .where(Broadcast.owner == owner, Broadcast.status == 'running')
+            .values(lease_until=None)
+        )
+        await session.execute(stmt)
+        await session.commit()
+
+@timed
+async def checkpoint_broadcast(broadcast_id: int, owner: str, lease: timedelta, last_user_id: int,
+                               sent: int, blocked: int, failed: int) -> str | None:
+    """
+    Сохраняет прогресс после пачки отправок, продлевает аренду и возвращает
+    текущий статус: так рассылка узнаёт, что её остановили. None — рассылку
+    забрал другой процесс (аренда истекла), продолжать нельзя.
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.owner == owner)
+            .values(
+                last_user_id=last_user_id,
+                sent=Broadcast.sent + sent,
+                blocked=Broadcast.blocked + blocked,
+                failed=Broadcast.failed + failed,
+                lease_until=now_utc() + lease,
+            )
+            .returning(Broadcast.status)
+        )
+        result = await session.execute(stmt)
+        status = result.scalar_one_or_none()
+        await session.commit()
+        return status
+
+@timed
+async def finish_broadcast(broadcast_id: int, status: str = 'done') -> Row | None:
+    """
+    Завершает рассылку, если она ещё идёт, и возвращает её итоги.
+    None — рассылка уже завершена или отменена.
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == 'running')
+            .values(status=status, finished_at=now_utc())
+            .returning(Broadcast.id, Broadcast.created_by, Broadcast.total,
+                       Broadcast.sent, Broadcast.blocked, Broadcast.failed,
+                       Broadcast.created_at, Broadcast.finished_at)
+        )
+        result = await session.execute(stmt)
+        row = result.one_or_none()
+        await session.commit()
+        return row
+
+
+LEAD_COLUMNS = (
+    User.user_id, User.username, User.survey_completed_at,
+    *(getattr(User, f'ans_{i}') for i in range(1, 10)),
+    User.phone, User.comments,
+)
+
+@timed
+async def claim_lead_outbox(limit: int, lease: float) -> list[Row]:
+    """
+    Забирает пачку неотправленных лидов вместе с анкетой пользователя.
+
+    Забранные строки откладываются на lease секунд: если процесс упадёт
+    до mark_lead_sent, лид вернётся в очередь. SKIP LOCKED не даёт двум
+    процессам забрать одну строку.
+    """
+    now = now_utc()
+    async with AsyncSessionLocal() as session:
+        due = (
+            select(LeadOutbox.id)
+            .where(LeadOutbox.sent_at.is_(None), LeadOutbox.next_attempt_at <= now)
+            .order_by(LeadOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(LeadOutbox)
+            .where(LeadOutbox.id.in_(due), LeadOutbox.user_id == User.user_id)
+            .values(attempts=LeadOutbox.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=lease))
+            .returning(LeadOutbox.id.label('outbox_id'), LeadOutbox.attempts,
+                       LeadOutbox.delivered_to, *LEAD_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        result = await session.execute(stmt)
+        leads = list(result.all())
+        await session.commit()
+        return leads
+
+@timed
+async def mark_lead_sent(outbox_id: int) -> bool:
+    """Помечает лид доставленным; False — его уже пометил другой процесс."""
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            update(LeadOutbox)
+            .where(LeadOutbox.id == outbox_id, LeadOutbox.sent_at.is_(None))
+            .values(sent_at=now_utc(), last_error=None)
+            .returning(LeadOutbox.id)
+        )
+        result = await session.execute(stmt)
+        marked = result.scalar_one_or_none() is not None
+        await session.commit()
+        return marked
+
+@timed
+async def mark_lead_delivered(outbox_id: int, manager_id: int):
+    """Отмечает, что лид дошёл до менеджера: повторная доставка его пропустит."""
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            update(LeadOutbox)
+            .where(LeadOutbox.id == outbox_id,
+                   literal(manager_id) != all_(LeadOutbox.delivered_to))
+            .values(delivered_to=func.array_append(LeadOutbox.delivered_to, manager_id))
+        )
+        await session.execute(stmt)
+        await session.commit()
+
+@timed
+async def retry_lead(outbox_id: int, error: str, delay: float):
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            update(LeadOutbox)
+            .where(LeadOutbox.id == outbox_id, LeadOutbox.sent_at.is_(None))
+            .values(next_attempt_at=now_utc() + timedelta(seconds=delay), last_error=error[:1000])
+        )
         await session.execute(stmt)
         await session.commit()
+
+@timed
+async def get_next_lead_due() -> datetime | None:
+    async with AsyncSessionLocal() as session:
+        stmt = select(func.min(LeadOutbox.next_attempt_at)).where(LeadOutbox.sent_at.is_(None))
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
+
+
+@timed
+async def assign_lead(user_id: int, assigned_to: int | None) -> int | None:
+    """
+    Записывает, кому предложен лид, и возвращает фактического адресата:
+    при повторной доставке остаётся тот, кто был выбран в первый раз.
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = insert(LeadAssignment).values(
+            user_id=user_id, assigned_to=assigned_to, created_at=now_utc())
+        do_update_stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            # Пустое обновление нужно только для RETURNING существующей строки
+            set_=dict(user_id=stmt.excluded.user_id)
+        ).returning(LeadAssignment.assigned_to)
+        result = await session.execute(do_update_stmt)
+        assigned = result.scalar_one()
+        await session.commit()
+        return assigned
+
+@timed
+async def claim_lead(user_id: int, manager_id: int) -> int:
+    """
+    Закрепляет лид за менеджером и возвращает его владельца.
+
+    Один upsert по первичному ключу: строка создаётся для лидов, разосланных
+    до появления lead_assignments, а условие claimed_by IS NULL в DO UPDATE
+    гарантирует, что из одновременных нажатий выиграет одно.
+    """
+    now = now_utc()
+    async with AsyncSessionLocal() as session:
+        stmt = insert(LeadAssignment).values(
+            user_id=user_id, claimed_by=manager_id, claimed_at=now, created_at=now)
+        do_update_stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_=dict(claimed_by=stmt.excluded.claimed_by, claimed_at=stmt.excluded.claimed_at),
+            where=LeadAssignment.claimed_by.is_(None)
+        ).returning(LeadAssignment.claimed_by)
+        result = await session.execute(do_update_stmt)
+        claimed_by = result.scalar_one_or_none()
+        if claimed_by is None:
+            result = await session.execute(
+                select(LeadAssignment.claimed_by).where(LeadAssignment.user_id == user_id))
+            claimed_by = result.scalar_one()
+        await session.commit()
+        return claimed_by
+
+@timed
+async def pick_least_loaded_manager(manager_ids: list[int], window: timedelta) -> int:
+    """Менеджер, которому за окно window предложено меньше всего лидов"""
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            select(LeadAssignment.assigned_to, func.count())
+            .where(LeadAssignment.assigned_to.in_(manager_ids),
+                   LeadAssignment.created_at >= now_utc() - window)
+            .group_by(LeadAssignment.assigned_to)
+        )
+        result = await session.execute(stmt)
+        load = dict(result.all())
+    return min(manager_ids, key=lambda manager_id: load.get(manager_id, 0))
+
+
+@timed
+async def add_survey_stats(counts: dict[tuple[date, str, int, int], int]):
+    """Прибавляет накопленные счётчики (day, metric, question, option) -> n одним upsert"""
+    if not counts:
+        return
+    rows = [
+        dict(day=day, metric=metric, question=question, option=option, count=n)
+        for (day, metric, question, option), n in counts.items()
+    ]
+    async with AsyncSessionLocal() as session:
+        stmt = insert(SurveyStat).values(rows)
+        do_update_stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'metric', 'question', 'option'],
+            set_=dict(count=SurveyStat.count + stmt.excluded.count)
+        )
+        await session.execute(do_update_stmt)
+        await session.commit()
+
+@timed
+async def get_survey_stats(since: date) -> list[Row]:
+    """Счётчики воронки с даты since, просуммированные по дням"""
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            select(SurveyStat.metric, SurveyStat.question, SurveyStat.option,
+                   func.sum(SurveyStat.count))
+            .where(SurveyStat.day >= since)
+            .group_by(SurveyStat.metric, SurveyStat.question, SurveyStat.option)
+        )
+        result = await session.execute(stmt)
+        return list(result.all())
+
+
+@timed
+async def mark_update_processed(bot_id: int, update_id: int) -> bool:
+    """Запоминает апдейт; False — его уже принял в обработку другой процесс"""
+    async with AsyncSessionLocal() as session:
+        stmt = (
+            insert(ProcessedUpdate)
+            .values(bot_id=bot_id, update_id=update_id)
+            .on_conflict_do_nothing(index_elements=['bot_id', 'update_id'])
+            .returning(ProcessedUpdate.update_id)
+        )
+        result = await session.execute(stmt)
+        await session.commit()
+        return result.scalar_one_or_none() is not None
+
+@timed
+async def forget_processed_update(bot_id: int, update_id: int):
+    """Снимает отметку: обработка упала, повторная доставка должна пройти"""
+    async with AsyncSessionLocal() as session:
+        stmt = delete(ProcessedUpdate).where(ProcessedUpdate.bot_id == bot_id,
+                                             ProcessedUpdate.update_id == update_id)
+        await session.execute(stmt)
+        await session.commit()
+
+
+@timed
+async def cleanup_processed_updates(older_than: timedelta) -> int:
+    """Удаляет записи об апдейтах старше older_than"""
+    async with AsyncSessionLocal() as session:
+        stmt = delete(ProcessedUpdate).where(ProcessedUpdate.received_at < now_utc() - older_than)
+        result = await session.execute(stmt)
+        await session.commit()
+        return result.rowcount
+
+def _archive_stale_users_query(completed_before: datetime, abandoned_before: datetime,
+                               limit: int):
+    """Запрос для archive_stale_users"""
+    stale = (
+        select(User.user_id)
+        .where(or_(
+            and_(User.survey_completed.is_(True), User.qual.is_not(True),
+                 func.coalesce(User.survey_completed_at, User.registered_at) < completed_before),
+            and_(User.survey_completed.is_not(True),
+                 func.coalesce(User.started_at, User.registered_at) < abandoned_before),
+        ))
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    moved = (
+        delete(User)
+        .where(User.user_id.in_(stale.scalar_subquery()))
+        .returning(*(User.__table__.c[name] for name in USER_COLUMNS))
+        .cte('moved')
+    )
+    stmt = insert(UserArchive).from_select(
+        [*USER_COLUMNS, 'archived_at'],
+        select(*(moved.c[name] for name in USER_COLUMNS), func.now()),
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={name: stmt.excluded[name] for name in [*USER_COLUMNS, 'archived_at'] if name != 'user_id'},
+    ).add_cte(moved)
+
+@timed
+async def archive_stale_users(completed_before: datetime, abandoned_before: datetime,
+                              limit: int) -> int:
+    """
+    Переносит до limit пользователей из users в users_archive одним запросом
+    (DELETE ... RETURNING внутри INSERT) и возвращает их число.
+
+    В архив уходят неквалифицированные, прошедшие опрос до completed_before,
+    и не закончившие опрос, последний /start которых был до abandoned_before.
+    Строки, занятые другой транзакцией (например, /start этого пользователя),
+    пропускаются до следующего запуска. /start, пришедший, пока строку держит
+    архивация, ждёт её коммита и возвращает пользователя из архива (start_user).
+    """
+    stmt = _archive_stale_users_query(completed_before, abandoned_before, limit)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        await session.commit()
+        return result.rowcount
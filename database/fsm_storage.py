@@ -0,0 +1,138 @@
+import logging
+from datetime import timedelta
+from os import getenv
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.background import PeriodicWorker
+from database.config import engine
+from database.crud import now_utc
+from database.models import FSMRecord
+
+FSM_TTL_HOURS = float(getenv('FSM_TTL_HOURS', 24 * 7))
+FSM_CLEANUP_INTERVAL = float(getenv('FSM_CLEANUP_INTERVAL', 3600))
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице fsm_states.
+
+    Каждая запись — одна строка на (бот, чат, пользователь), запись идёт
+    через INSERT ... ON CONFLICT DO UPDATE, поэтому несколько процессов бота
+    могут обслуживать одних и тех же пользователей. Брошенные сессии
+    удаляются по updated_at фоновой очисткой.
+    """
+
+    def __init__(self, db_engine: AsyncEngine = engine,
+                 ttl: timedelta = timedelta(hours=FSM_TTL_HOURS)):
+        self.engine = db_engine
+        self.ttl = ttl
+        self._cleanup_worker: PeriodicWorker | None = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> dict:
+        return dict(
+            bot_id=key.bot_id,
+            chat_id=key.chat_id,
+            user_id=key.user_id,
+            thread_id=key.thread_id or 0,
+            destiny=key.destiny,
+        )
+
+    @staticmethod
+    def _where(key: StorageKey):
+        return (
+            (FSMRecord.bot_id == key.bot_id)
+            & (FSMRecord.chat_id == key.chat_id)
+            & (FSMRecord.user_id == key.user_id)
+            & (FSMRecord.thread_id == (key.thread_id or 0))
+            & (FSMRecord.destiny == key.destiny)
+        )
+
+    async def _upsert(self, key: StorageKey, **values) -> None:
+        values["updated_at"] = now_utc()
+        stmt = insert(FSMRecord).values(**self._key(key), **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(self._key(key)),
+            set_=values,
+        )
+        async with self.engine.begin() as conn:
+            await conn.execute(stmt)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._upsert(key, state=state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(FSMRecord.state).where(self._where(key)))
+            return result.scalar_one_or_none()
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        await self._upsert(key, data=data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(FSMRecord.data).where(self._where(key)))
+            data = result.scalar_one_or_none()
+            return dict(data) if data else {}
+
+    async def get_record(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        """Состояние и данные одним запросом"""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(FSMRecord.state, FSMRecord.data).where(self._where(key)))
+            row = result.one_or_none()
+        if row is None:
+            return None, {}
+        return row.state, dict(row.data or {})
+
+    async def set_record(self, key: StorageKey, state: StateType,
+                         data: Mapping[str, Any] | None = None) -> None:
+        """Записывает состояние и (если передано) данные одним upsert"""
+        state = state.state if isinstance(state, State) else state
+        if data is None:
+            await self._upsert(key, state=state)
+        else:
+            await self._upsert(key, state=state, data=dict(data))
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        """Слияние данных в одном запросе: data = data || :patch"""
+        patch = dict(data)
+        now = now_utc()
+        stmt = insert(FSMRecord).values(**self._key(key), data=patch, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(self._key(key)),
+            set_=dict(data=FSMRecord.data.concat(stmt.excluded.data), updated_at=now),
+        ).returning(FSMRecord.data)
+        async with self.engine.begin() as conn:
+            result = await conn.execute(stmt)
+            return dict(result.scalar_one())
+
+    async def cleanup(self) -> int:
+        """Удаляет сессии, которые не обновлялись дольше ttl"""
+        stmt = delete(FSMRecord).where(FSMRecord.updated_at < now_utc() - self.ttl)
+        async with self.engine.begin() as conn:
+            result = await conn.execute(stmt)
+            return result.rowcount
+
+    def start_cleanup(self, interval: float = FSM_CLEANUP_INTERVAL):
+        if self._cleanup_worker is None:
+            self._cleanup_worker = PeriodicWorker("очистка FSM-сессий", interval, self._cleanup)
+            self._cleanup_worker.start()
+
+    async def _cleanup(self):
+        if deleted := await self.cleanup():
+            logging.info("Удалено устаревших FSM-сессий: %s", deleted)
+
+    async def close(self) -> None:
+        if self._cleanup_worker:
+            await self._cleanup_worker.stop()
+            self._cleanup_worker = None
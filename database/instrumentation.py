@@ -0,0 +1,104 @@
+import functools
+import logging
+import time
+from os import getenv
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics import Counter, Gauge, Histogram
+
+# Выключено по умолчанию: тогда timed возвращает функцию как есть,
+# а обработчики событий движка не подключаются.
+DB_METRICS_ENABLED = getenv('DB_METRICS', '0').lower() in ('1', 'true', 'yes')
+DB_SLOW_QUERY_MS = float(getenv('DB_SLOW_QUERY_MS', 200))
+
+db_operation_seconds = Histogram(
+    'db_operation_seconds', 'Латентность операций database.crud', ('operation',))
+db_query_seconds = Histogram(
+    'db_query_seconds', 'Латентность отдельных SQL-запросов')
+db_queries_total = Counter(
+    'db_queries_total', 'Число выполненных SQL-запросов')
+db_slow_queries_total = Counter(
+    'db_slow_queries_total', 'Число запросов дольше DB_SLOW_QUERY_MS')
+db_pool_checkout_wait_seconds = Histogram(
+    'db_pool_checkout_wait_seconds', 'Ожидание соединения из пула')
+
+
+def timed(func):
+    """Пишет латентность корутины crud в db_operation_seconds."""
+    if not DB_METRICS_ENABLED:
+        return func
+
+    operation = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            db_operation_seconds.observe(time.perf_counter() - start, operation)
+
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _, start = conn.info['query_start'].pop()
+    elapsed = time.perf_counter() - start
+    db_query_seconds.observe(elapsed)
+    db_queries_total.inc()
+    if elapsed * 1000 >= DB_SLOW_QUERY_MS:
+        db_slow_queries_total.inc()
+        logging.warning("Медленный запрос (%.0f мс): %s", elapsed * 1000, ' '.join(statement.split())[:300])
+
+
+def _handle_error(exception_context):
+    """
+    Упавший запрос не доходит до after_cursor_execute: снимаем его со стека,
+    иначе стек растёт на соединении из пула и сбивает замеры следующих.
+    Ошибки чтения результата приходят уже после снятия и стек не трогают.
+    """
+    if exception_context.connection is None:
+        return
+    starts = exception_context.connection.info.get('query_start')
+    if starts and starts[-1][0] is exception_context.execution_context:
+        starts.pop()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Подключает метрики запросов и пула соединений к движку."""
+    if not DB_METRICS_ENABLED:
+        return
+
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', _handle_error)
+
+    pool = sync_engine.pool
+    connect = pool.connect
+
+    # У пула нет события «начали ждать соединение», поэтому время ожидания
+    # меряется обёрткой вокруг pool.connect.
+    @functools.wraps(connect)
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+    for name, documentation, attr in (
+        ('db_pool_size', 'Размер пула соединений', 'size'),
+        ('db_pool_checked_out', 'Выданные из пула соединения', 'checkedout'),
+        ('db_pool_overflow', 'Соединения сверх размера пула', 'overflow'),
+    ):
+        if hasattr(pool, attr):
+            Gauge(name, documentation, function=getattr(pool, attr))
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import re
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+# Ключ pg_advisory_lock: несколько процессов бота не накатывают миграции одновременно
+MIGRATION_LOCK_ID = 7_230_419
+MIGRATION_NAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> list[tuple[int, str, Path]]:
+    """Файлы NNNN_name.sql, отсортированные по номеру версии"""
+    migrations = []
+    for path in directory.glob('*.sql'):
+        if match := MIGRATION_NAME.match(path.name):
+            migrations.append((int(match.group(1)), match.group(2), path))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Повторяющиеся номера миграций в {directory}")
+    return migrations
+
+
+async def migrate(engine: AsyncEngine, directory: Path = MIGRATIONS_DIR) -> list[int]:
+    """
+    Накатывает непримененные миграции и возвращает их версии.
+
+    Каждая миграция выполняется в своей транзакции вместе с записью
+    в schema_version: упавшая миграция не оставляет базу наполовину
+    изменённой и будет повторена при следующем запуске.
+    """
+    applied_now = []
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        # Скрипты из нескольких команд выполняются напрямую через asyncpg:
+        # SQLAlchemy готовит каждый запрос как одну команду
+        driver = raw.driver_connection
+        await driver.execute('SELECT pg_advisory_lock($1)', MIGRATION_LOCK_ID)
+        try:
+            await driver.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+                )
+            ''')
+            applied = {row['version'] for row in await driver.fetch('SELECT version FROM schema_version')}
+            for version, name, path in load_migrations(directory):
+                if version in applied:
+                    continue
+                logging.info("Миграция %04d_%s...", version, name)
+                sql = path.read_text(encoding='utf-8')
+                async with driver.transaction():
+                    await driver.execute(sql)
+                    await driver.execute(
+                        'INSERT INTO schema_version (version, name) VALUES ($1, $2)', version, name)
+                applied_now.append(version)
+        finally:
+            await driver.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_ID)
+    if applied_now:
+        logging.info("Применены миграции: %s", applied_now)
+    return applied_now
+
+
+if __name__ == '__main__':
+    from database.config import engine
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(migrate(engine))
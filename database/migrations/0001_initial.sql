@@ -0,0 +1,125 @@
+-- Начальная схема (бывший database/init.sql).
+-- IF NOT EXISTS: на базах, созданных init.sql или create_all, миграция
+-- только досоздаёт недостающие таблицы и индексы.
+
+-- Таблица users
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username VARCHAR(100),
+    registered_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    survey_completed_at TIMESTAMP WITH TIME ZONE,
+    
+    -- Ответы на вопросы
+    ans_1 VARCHAR(100),
+    ans_2 VARCHAR(100),
+    ans_3 VARCHAR(100),
+    ans_4 VARCHAR(100),
+    ans_5 VARCHAR(100),
+    ans_6 VARCHAR(100),
+    ans_7 VARCHAR(100),
+    ans_8 TEXT,
+    ans_9 VARCHAR(100),
+    
+    -- Статусы
+    qual BOOLEAN DEFAULT FALSE,
+    survey_completed BOOLEAN DEFAULT FALSE,
+    
+    -- Контакты
+    phone VARCHAR(20),
+    comments TEXT,
+    
+    -- Напоминания
+    reminder_10min_sent BOOLEAN DEFAULT FALSE,
+    reminder_2h_sent BOOLEAN DEFAULT FALSE,
+    reminder_24h_sent BOOLEAN DEFAULT FALSE
+);
+
+-- Индексы для оптимизации запросов
+CREATE INDEX IF NOT EXISTS idx_users_qual ON users(qual);
+CREATE INDEX IF NOT EXISTS idx_users_survey_completed ON users(survey_completed);
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(registered_at);
+CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone) WHERE phone IS NOT NULL;
+
+-- Очередь напоминаний: одна строка на (пользователь, задержка)
+CREATE TABLE IF NOT EXISTS reminders (
+    user_id BIGINT NOT NULL,
+    minutes SMALLINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    due_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (user_id, minutes)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reminders_due_at ON reminders(due_at);
+
+-- Состояния FSM (опрос) для пары (чат, пользователь)
+CREATE TABLE IF NOT EXISTS fsm_states (
+    bot_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    thread_id BIGINT NOT NULL DEFAULT 0,
+    destiny VARCHAR(32) NOT NULL DEFAULT 'default',
+    state VARCHAR(100),
+    data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (bot_id, chat_id, user_id, thread_id, destiny)
+);
+
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at);
+
+-- Рассылки менеджера с контрольной точкой по user_id
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id BIGSERIAL PRIMARY KEY,
+    created_by BIGINT NOT NULL,
+    from_chat_id BIGINT NOT NULL,
+    message_id BIGINT NOT NULL,
+    segment JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status VARCHAR(16) NOT NULL DEFAULT 'running',
+    total INTEGER NOT NULL DEFAULT 0,
+    last_user_id BIGINT NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Очередь лидов для менеджера (transactional outbox)
+CREATE TABLE IF NOT EXISTS lead_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_lead_outbox_pending ON lead_outbox(next_attempt_at) WHERE sent_at IS NULL;
+
+-- Распределение лидов между менеджерами
+CREATE TABLE IF NOT EXISTS lead_assignments (
+    user_id BIGINT PRIMARY KEY,
+    assigned_to BIGINT,
+    claimed_by BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_lead_assignments_assigned ON lead_assignments(assigned_to, created_at);
+
+-- Счётчики воронки опроса по дням
+CREATE TABLE IF NOT EXISTS survey_stats (
+    day DATE NOT NULL,
+    metric VARCHAR(16) NOT NULL,
+    question SMALLINT NOT NULL DEFAULT 0,
+    option SMALLINT NOT NULL DEFAULT -1,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, metric, question, option)
+);
+
+-- Комментарии к таблице
+COMMENT ON TABLE users IS 'Пользователи Telegram бота';
+COMMENT ON COLUMN users.qual IS 'Квалификация пользователя (true/false)';
+COMMENT ON COLUMN users.survey_completed IS 'Завершил ли пользователь опрос';
+
@@ -0,0 +1,23 @@
+-- Ответы с вариантами хранятся номером варианта в QUESTIONS[n]['options']
+-- (app/bot_msg.py), свободный текст — только у вопроса 8.
+-- Значения, которых нет среди вариантов, становятся NULL, поэтому исходные
+-- ответы сначала копируются в users_answers_legacy.
+
+CREATE TABLE IF NOT EXISTS users_answers_legacy AS
+SELECT user_id, ans_1, ans_2, ans_3, ans_4, ans_5, ans_6, ans_7, ans_8, ans_9
+FROM users;
+
+ALTER TABLE users
+    ALTER COLUMN ans_1 TYPE SMALLINT USING CASE ans_1 WHEN 'до 14' THEN 0 WHEN '15–17' THEN 1 WHEN '18–21' THEN 2 WHEN '22–29' THEN 3 WHEN '30+' THEN 4 END,
+    ALTER COLUMN ans_2 TYPE SMALLINT USING CASE ans_2 WHEN 'школа' THEN 0 WHEN 'бакалавриат' THEN 1 WHEN 'магистратура' THEN 2 WHEN 'другое' THEN 3 END,
+    ALTER COLUMN ans_3 TYPE SMALLINT USING CASE ans_3 WHEN 'A2 или ниже' THEN 0 WHEN 'B1' THEN 1 WHEN 'B2' THEN 2 WHEN 'C1-C2' THEN 3 WHEN 'Затрудняюсь ответить' THEN 4 END,
+    ALTER COLUMN ans_4 TYPE SMALLINT USING CASE ans_4 WHEN 'до 1 000 €' THEN 0 WHEN '1 000–3 000 €' THEN 1 WHEN '3 000–5 000 €' THEN 2 WHEN 'Рассчитываю только на грант' THEN 3 END,
+    ALTER COLUMN ans_5 TYPE SMALLINT USING CASE ans_5 WHEN 'до 500 €' THEN 0 WHEN '500–800 €' THEN 1 WHEN '800–1 200 €' THEN 2 WHEN '1 200 € и вышe' THEN 3 WHEN 'пока нет понимания' THEN 4 END,
+    ALTER COLUMN ans_6 TYPE SMALLINT USING CASE ans_6 WHEN '2026' THEN 0 WHEN '2027' THEN 1 WHEN '2028 и позже' THEN 2 END,
+    ALTER COLUMN ans_7 TYPE SMALLINT USING CASE ans_7 WHEN 'Германия' THEN 0 WHEN 'Австрия' THEN 1 WHEN 'Италия' THEN 2 WHEN 'Несколько стран' THEN 3 WHEN 'Пока не определился(ась)' THEN 4 END,
+    ALTER COLUMN ans_9 TYPE SMALLINT USING CASE ans_9 WHEN 'самостоятельно' THEN 0 WHEN 'сопровождением' THEN 1 WHEN 'пока не решил(а)' THEN 2 END,
+    ALTER COLUMN ans_8 TYPE TEXT,
+    -- models.py объявлял String(12), init.sql — VARCHAR(20): приводим к 20
+    ALTER COLUMN phone TYPE VARCHAR(20);
+
+CREATE INDEX IF NOT EXISTS idx_users_ans_7 ON users(ans_7);
@@ -0,0 +1,13 @@
+-- update_id уже обработанных апдейтов: повторная доставка webhook или
+-- перезапуск реплики посреди пачки не должны обрабатывать апдейт дважды.
+-- Telegram хранит неподтверждённые апдейты не дольше суток, поэтому старые
+-- строки периодически удаляются (UPDATE_DEDUPE_RETENTION_HOURS).
+
+CREATE TABLE IF NOT EXISTS processed_updates (
+    bot_id BIGINT NOT NULL,
+    update_id BIGINT NOT NULL,
+    received_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (bot_id, update_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_processed_updates_received_at ON processed_updates(received_at);
@@ -0,0 +1,11 @@
+-- Архив пользователей: неквалифицированные анкеты и давно брошенные /start
+-- переносятся сюда из users (app/archive.py), чтобы горячая таблица и её
+-- индексы росли только вместе с активными пользователями.
+-- Те же колонки, что у users, но без вторичных индексов: в архиве ищут
+-- только по user_id. Новые колонки users нужно добавлять и сюда.
+
+CREATE TABLE IF NOT EXISTS users_archive (
+    LIKE users INCLUDING DEFAULTS,
+    archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id)
+);
@@ -0,0 +1,5 @@
+-- Аренда напоминаний: забранная строка остаётся в таблице до успешной
+-- отправки. Если процесс упал или Bot API ответил ошибкой, по истечении
+-- claimed_until напоминание снова попадёт в выборку.
+
+ALTER TABLE reminders ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,5 @@
+-- Аренда рассылок: при нескольких репликах рассылку выполняет только
+-- владелец (owner), пока не истёк lease_until. Владелец продлевает аренду
+-- после каждой пачки; рассылку упавшей реплики забирает другая.
+ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS owner VARCHAR(64);
+ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,9 @@
+-- Не больше одного неотправленного лида на пользователя: повторная отправка
+-- комментария не ставит в очередь дубль. Уже накопившиеся дубли удаляются,
+-- остаётся самый ранний.
+DELETE FROM lead_outbox AS dup
+USING lead_outbox AS kept
+WHERE dup.sent_at IS NULL AND kept.sent_at IS NULL
+  AND dup.user_id = kept.user_id AND dup.id > kept.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_lead_outbox_unsent_user ON lead_outbox(user_id) WHERE sent_at IS NULL;
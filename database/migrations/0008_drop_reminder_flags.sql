@@ -0,0 +1,13 @@
+-- Отправку напоминаний учитывает таблица reminders: строка удаляется после
+-- доставки и создаётся заново при следующем /start. Флаги reminder_*_sent
+-- в users больше никто не читает.
+
+ALTER TABLE users
+    DROP COLUMN IF EXISTS reminder_10min_sent,
+    DROP COLUMN IF EXISTS reminder_2h_sent,
+    DROP COLUMN IF EXISTS reminder_24h_sent;
+
+ALTER TABLE users_archive
+    DROP COLUMN IF EXISTS reminder_10min_sent,
+    DROP COLUMN IF EXISTS reminder_2h_sent,
+    DROP COLUMN IF EXISTS reminder_24h_sent;
@@ -0,0 +1,5 @@
+-- Менеджеры, которым лид уже доставлен. Отметка ставится сразу после
+-- отправки каждому менеджеру: если mark_lead_sent не прошёл и аренда
+-- истекла, повторная доставка идёт только тем, кому лид ещё не ушёл.
+
+ALTER TABLE lead_outbox ADD COLUMN IF NOT EXISTS delivered_to BIGINT[] NOT NULL DEFAULT '{}';
@@ -1,7 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, Boolean, DateTime, String, Text
+from sqlalchemy import (BigInteger, Boolean, Date, DateTime, Index, Integer,
+                        SmallInteger, String, Text, text)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from zoneinfo import ZoneInfo
 
@@ -14,8 +16,8 @@ class Base(DeclarativeBase):
     pass
 
 
-class User(Base):
-    __tablename__ = 'users'
+class UserColumns:
+    """Колонки пользователя, общие для users и users_archive."""
 
     user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     username: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
@@ -23,16 +25,17 @@ class User(Base):
     registered_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=now_msk)
     
-    phone: Mapped[Optional[str]] = mapped_column(String(12), nullable=True)
-    ans_1 = mapped_column(Text)
-    ans_2 = mapped_column(Text)
-    ans_3 = mapped_column(Text)
-    ans_4 = mapped_column(Text)
-    ans_5 = mapped_column(Text)
-    ans_6 = mapped_column(Text)
-    ans_7 = mapped_column(Text)
+    phone: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    # Номер варианта вопроса n из app/survey.json; у вопроса 8 — свободный текст
+    ans_1 = mapped_column(SmallInteger)
+    ans_2 = mapped_column(SmallInteger)
+    ans_3 = mapped_column(SmallInteger)
+    ans_4 = mapped_column(SmallInteger)
+    ans_5 = mapped_column(SmallInteger)
+    ans_6 = mapped_column(SmallInteger)
+    ans_7 = mapped_column(SmallInteger)
     ans_8 = mapped_column(Text)
-    ans_9 = mapped_column(Text)
+    ans_9 = mapped_column(SmallInteger)
 
     comments = mapped_column(Text, nullable=True)
     qual = mapped_column(Boolean, default=False)
@@ -42,10 +45,174 @@ class User(Base):
 
     started_at: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True), nullable=True)
-    
-    reminder_10min_sent: Mapped[bool] = mapped_column(Boolean, default=False)
-    reminder_2h_sent: Mapped[bool] = mapped_column(Boolean, default=False)
-    reminder_24h_sent: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class User(UserColumns, Base):
+    __tablename__ = 'users'
 
     def __repr__(self):
         return f"<User {self.user_id}>"
+
+
+class UserArchive(UserColumns, Base):
+    """
+    Пользователь, перенесённый из users архивацией (неквал или брошенный опрос).
+
+    Возвращается в users при следующем /start.
+    """
+    __tablename__ = 'users_archive'
+
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=now_msk)
+
+    def __repr__(self):
+        return f"<UserArchive {self.user_id}>"
+
+
+class Reminder(Base):
+    """Запланированное напоминание: одна строка на (пользователь, задержка)."""
+    __tablename__ = 'reminders'
+    __table_args__ = (Index('idx_reminders_due_at', 'due_at'),)
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    minutes: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    due_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # Забрано процессом на отправку до этого момента
+    claimed_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<Reminder {self.user_id} +{self.minutes}m>"
+
+
+class FSMRecord(Base):
+    """Состояние и данные FSM aiogram для пары (чат, пользователь)."""
+    __tablename__ = 'fsm_states'
+    __table_args__ = (Index('idx_fsm_states_updated_at', 'updated_at'),)
+
+    bot_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    thread_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, default=0)
+    destiny: Mapped[str] = mapped_column(String(32), primary_key=True, default='default')
+
+    state: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    data: Mapped[dict] = mapped_column(JSONB, default=dict)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<FSMRecord {self.chat_id}:{self.user_id} {self.state}>"
+
+
+class Broadcast(Base):
+    """
+    Рассылка менеджера по сегменту пользователей.
+
+    last_user_id — контрольная точка: получатели перебираются по возрастанию
+    user_id, поэтому после перезапуска рассылка продолжается с этого места.
+    owner и lease_until — какой процесс выполняет рассылку и до какого момента.
+    """
+    __tablename__ = 'broadcasts'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    created_by: Mapped[int] = mapped_column(BigInteger)
+    # Сообщение менеджера, которое копируется получателям
+    from_chat_id: Mapped[int] = mapped_column(BigInteger)
+    message_id: Mapped[int] = mapped_column(BigInteger)
+    segment: Mapped[dict] = mapped_column(JSONB, default=dict)
+
+    status: Mapped[str] = mapped_column(String(16), default='running')
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    last_user_id: Mapped[int] = mapped_column(BigInteger, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=now_msk)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    owner: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    lease_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<Broadcast {self.id} {self.status}>"
+
+
+class LeadOutbox(Base):
+    """
+    Очередь лидов для менеджера. Строка пишется в одной транзакции
+    с комментарием пользователя и помечается sent_at после доставки.
+    """
+    __tablename__ = 'lead_outbox'
+    __table_args__ = (
+        Index('idx_lead_outbox_pending', 'next_attempt_at',
+              postgresql_where=text('sent_at IS NULL')),
+        # Не больше одного неотправленного лида на пользователя
+        Index('idx_lead_outbox_unsent_user', 'user_id', unique=True,
+              postgresql_where=text('sent_at IS NULL')),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=now_msk)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=now_msk)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Менеджеры, которым лид уже ушёл: повторная доставка их пропускает
+    delivered_to: Mapped[list[int]] = mapped_column(
+        ARRAY(BigInteger), default=list, server_default=text("'{}'"))
+
+    def __repr__(self):
+        return f"<LeadOutbox {self.id} user={self.user_id}>"
+
+
+class LeadAssignment(Base):
+    """
+    Кому предложен и кем взят лид. Взятие — атомарный
+    UPDATE ... WHERE claimed_by IS NULL, поэтому у лида один владелец.
+    """
+    __tablename__ = 'lead_assignments'
+    __table_args__ = (Index('idx_lead_assignments_assigned', 'assigned_to', 'created_at'),)
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # NULL — лид разослан всем менеджерам
+    assigned_to: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    claimed_by: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=now_msk)
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<LeadAssignment {self.user_id} -> {self.claimed_by or self.assigned_to}>"
+
+
+class SurveyStat(Base):
+    """
+    Агрегированные счётчики воронки опроса за день (МСК).
+
+    metric: started, answer, completed, contact, lead. Для answer question —
+    номер вопроса, option — индекс варианта (-1 для текстового ответа);
+    для completed option — 1 (квал) или 0 (неквал).
+    """
+    __tablename__ = 'survey_stats'
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    metric: Mapped[str] = mapped_column(String(16), primary_key=True)
+    question: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=0)
+    option: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=-1)
+    count: Mapped[int] = mapped_column(BigInteger, default=0)
+
+    def __repr__(self):
+        return f"<SurveyStat {self.day} {self.metric} {self.question}/{self.option}: {self.count}>"
+
+
+class ProcessedUpdate(Base):
+    """update_id, уже принятый в обработку каким-либо процессом бота."""
+    __tablename__ = 'processed_updates'
+    __table_args__ = (Index('idx_processed_updates_received_at', 'received_at'),)
+
+    bot_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=now_msk)
+
+    def __repr__(self):
+        return f"<ProcessedUpdate {self.bot_id}:{self.update_id}>"
@@ -0,0 +1,175 @@
+"""
+Локальный фейковый Bot API для нагрузочного тестирования.
+
+Реализует getMe, getUpdates, setWebhook/deleteWebhook, sendMessage,
+editMessageText, editMessageReplyMarkup, deleteMessage и
+answerCallbackQuery. Умеет добавлять задержку к каждому ответу и
+отвечать 429 с заданной вероятностью. Бот подключается к нему через
+TELEGRAM_API_URL.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+
+from aiohttp import ClientSession, web
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+JSON_FIELDS = ('reply_markup', 'allowed_updates')
+# Сколько раз доставлять апдейт на webhook, прежде чем сдаться
+WEBHOOK_MAX_ATTEMPTS = 5
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, rate_429: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls: dict[str, int] = defaultdict(int)
+        self.throttled: dict[str, int] = defaultdict(int)
+        self.bot_connected = asyncio.Event()
+        # Исходящие сообщения бота по чатам — их читает нагрузочный драйвер
+        self.outbox: dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+
+        # Как в настоящем Bot API: апдейты лежат, пока бот не подтвердит их offset
+        self._updates: list[dict] = []
+        self._has_updates = asyncio.Event()
+        # Случайное начало, как у Telegram после простоя: иначе processed_updates
+        # (UPDATE_DEDUPE_DB) отбросит апдейты повторного прогона как дубли
+        self._update_ids = itertools.count(random.randint(1, 2 ** 31))
+        self._message_ids = itertools.count(1)
+        self._webhook_url: str | None = None
+        self._webhook_secret: str | None = None
+        self._webhook_session: ClientSession | None = None
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        self.app.on_cleanup.append(self._close)
+
+    # --- входящие апдейты (от «пользователей») ---
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    async def push_update(self, payload: dict):
+        """Ставит апдейт в очередь getUpdates или отправляет его на webhook."""
+        update = {"update_id": next(self._update_ids), **payload}
+        if self._webhook_url:
+            if self._webhook_session is None:
+                self._webhook_session = ClientSession()
+            headers = {}
+            if self._webhook_secret:
+                headers["X-Telegram-Bot-Api-Secret-Token"] = self._webhook_secret
+            # Как Telegram: тот же update_id повторяется, пока webhook не ответит 200
+            for _ in range(WEBHOOK_MAX_ATTEMPTS):
+                async with self._webhook_session.post(self._webhook_url, json=update,
+                                                      headers=headers) as response:
+                    if response.status == 200:
+                        return
+                logging.warning("Webhook ответил %s, повтор через 1 с", response.status)
+                await asyncio.sleep(1)
+            raise RuntimeError(f"Webhook не принял апдейт {update['update_id']} "
+                               f"за {WEBHOOK_MAX_ATTEMPTS} попыток")
+        else:
+            self._updates.append(update)
+            self._has_updates.set()
+
+    # --- Bot API ---
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = dict(await request.post()) or dict(request.query)
+        for field in JSON_FIELDS:
+            if isinstance(params.get(field), str):
+                params[field] = json.loads(params[field])
+        self.calls[method] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method != 'getUpdates' and random.random() < self.rate_429:
+            self.throttled[method] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        handler = getattr(self, f'api_{method}', None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def api_getMe(self, params):
+        return BOT_USER
+
+    async def api_getUpdates(self, params):
+        self.bot_connected.set()
+        timeout = float(params.get('timeout') or 0)
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        if offset:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    async def api_setWebhook(self, params):
+        self._webhook_url = params.get('url')
+        self._webhook_secret = params.get('secret_token')
+        self.bot_connected.set()
+        pending, self._updates = self._updates, []
+        for update in pending:
+            update.pop("update_id")
+            await self.push_update(update)
+        return True
+
+    async def api_deleteWebhook(self, params):
+        self._webhook_url = None
+        return True
+
+    def _message(self, chat_id: int, text: str | None, reply_markup=None,
+                 message_id: int | None = None) -> dict:
+        message = {
+            "message_id": message_id or self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text or "",
+        }
+        # В ответе Bot API у сообщения бывает только inline-клавиатура
+        if reply_markup and "inline_keyboard" in reply_markup:
+            message["reply_markup"] = reply_markup
+        return message
+
+    async def api_sendMessage(self, params):
+        chat_id = int(params['chat_id'])
+        message = self._message(chat_id, params.get('text'), params.get('reply_markup'))
+        # Драйверу нужна и reply-клавиатура (запрос контакта), поэтому в outbox
+        # кладётся разметка из запроса
+        self.outbox[chat_id].put_nowait(
+            (time.perf_counter(), {**message, "reply_markup": params.get('reply_markup')}))
+        return message
+
+    async def api_editMessageText(self, params):
+        return self._message(int(params['chat_id']), params.get('text'),
+                             params.get('reply_markup'), int(params['message_id']))
+
+    async def api_editMessageReplyMarkup(self, params):
+        return self._message(int(params['chat_id']), None,
+                             params.get('reply_markup'), int(params['message_id']))
+
+    async def api_deleteMessage(self, params):
+        return True
+
+    async def api_answerCallbackQuery(self, params):
+        return True
+
+    async def _close(self, app):
+        if self._webhook_session:
+            await self._webhook_session.close()
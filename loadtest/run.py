@@ -0,0 +1,175 @@
+"""
+Нагрузочный тест бота целиком через фейковый Bot API.
+
+1. Запустить драйвер (он же поднимает фейковый Bot API):
+       python -m loadtest.run --users 500 --concurrency 100 --latency 0.05 --rate-429 0.01
+2. Запустить бота, направив его на фейковый API:
+       TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+
+Драйвер ждёт подключения бота, затем N пользователей проходят опрос Form,
+реагируя на реальные сообщения и клавиатуры бота. В конце печатается
+сквозная латентность (от апдейта до ответа бота) и число вызовов API.
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+from aiohttp import web
+
+from app.bot_msg import SUCCESS_MESSAGE
+from app.survey import survey_loader
+from loadtest.fake_bot_api import FakeBotAPI
+
+RESPONSE_TIMEOUT = 60
+TEXT_ANSWER = "Информатика, Германия"
+
+
+def _buttons(message: dict) -> list[dict]:
+    markup = message.get("reply_markup") or {}
+    rows = markup.get("inline_keyboard") or markup.get("keyboard") or []
+    return [button for row in rows for button in row]
+
+
+class SimulatedUser:
+    def __init__(self, api: FakeBotAPI, user_id: int, callback_ids: itertools.count):
+        self.api = api
+        self.user_id = user_id
+        self.callback_ids = callback_ids
+        self.latencies: list[float] = []
+        self.user = {"id": user_id, "is_bot": False, "first_name": "Load",
+                     "username": f"load{user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+
+    def _message(self, **fields) -> dict:
+        return {"message_id": self.api.next_message_id(), "date": int(time.time()),
+                "chat": self.chat, "from": self.user, **fields}
+
+    async def send_text(self, text: str, **fields):
+        await self.api.push_update({"message": self._message(text=text, **fields)})
+
+    async def send_contact(self, phone: str):
+        await self.api.push_update({"message": self._message(contact={
+            "phone_number": phone, "first_name": "Load", "user_id": self.user_id})})
+
+    async def click(self, message: dict, data: str):
+        await self.api.push_update({"callback_query": {
+            "id": str(next(self.callback_ids)), "from": self.user,
+            "chat_instance": str(self.user_id), "data": data, "message": message}})
+
+    async def wait_reply(self, sent_at: float, accept) -> dict:
+        """Ждёт сообщение бота, на которое пользователь может отреагировать."""
+        outbox = self.api.outbox[self.user_id]
+        while True:
+            received_at, message = await asyncio.wait_for(outbox.get(), RESPONSE_TIMEOUT)
+            if accept(message):
+                self.latencies.append(received_at - sent_at)
+                return message
+
+    async def act(self, send, accept) -> dict:
+        sent_at = time.perf_counter()
+        await send()
+        return await self.wait_reply(sent_at, accept)
+
+    async def run(self):
+        has = lambda prefix: lambda m: any(
+            str(b.get("callback_data", "")).startswith(prefix) for b in _buttons(m))
+
+        # Вопросы и ответы — из того же описания опроса, что у бота
+        survey = survey_loader.survey
+        answers = survey.qualifying_answers()
+
+        def shown(q_num):
+            """Ждём сообщение с вопросом q_num, после последнего — запрос контакта"""
+            if q_num is None:
+                return lambda m: any(b.get("request_contact") for b in _buttons(m))
+            question = survey.questions[q_num]
+            if question.is_text:
+                return lambda m: m.get("text") == question.text
+            return has(f"answer_{q_num}_")
+
+        message = await self.act(
+            lambda: self.send_text("/start", entities=[
+                {"type": "bot_command", "offset": 0, "length": 6}]),
+            has("start_form"))
+        message = await self.act(lambda: self.click(message, "start_form"), shown(survey.first))
+
+        for q_num in survey.order:
+            if survey.questions[q_num].is_text:
+                send = lambda: self.send_text(TEXT_ANSWER)
+            else:
+                data = f"answer_{q_num}_{answers[q_num]}"
+                send = lambda data=data, message=message: self.click(message, data)
+            message = await self.act(send, shown(survey.next.get(q_num)))
+
+        await self.act(lambda: self.send_contact(f"+7999{self.user_id % 10_000_000:07d}"),
+                       has("submit_application"))
+        await self.act(lambda: self.send_text("Звонить после 18:00"),
+                       lambda m: m.get("text") == SUCCESS_MESSAGE)
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def run(args):
+    api = FakeBotAPI(latency=args.latency, rate_429=args.rate_429)
+    runner = web.AppRunner(api.app)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Фейковый Bot API: http://{args.host}:{args.port} — ждём подключения бота...")
+    await api.bot_connected.wait()
+
+    callback_ids = itertools.count(1)
+    users = [SimulatedUser(api, args.user_id_base + i, callback_ids) for i in range(args.users)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failures = 0
+
+    async def simulate(user: SimulatedUser):
+        nonlocal failures
+        async with semaphore:
+            try:
+                await user.run()
+            except (asyncio.TimeoutError, RuntimeError):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(simulate(user) for user in users))
+    elapsed = time.perf_counter() - start
+    await runner.cleanup()
+
+    latencies = [latency for user in users for latency in user.latencies]
+    completed = args.users - failures
+    print(f"Пользователей: {args.users}, завершили опрос: {completed}, "
+          f"не дождались ответа: {failures}")
+    print(f"Время: {elapsed:.2f} с, {completed / elapsed:.1f} опросов/с")
+    if latencies:
+        print(f"Сквозная латентность, мс: p50={percentile(latencies, 0.5) * 1000:.1f} "
+              f"p90={percentile(latencies, 0.9) * 1000:.1f} "
+              f"p99={percentile(latencies, 0.99) * 1000:.1f} "
+              f"среднее={statistics.fmean(latencies) * 1000:.1f}")
+    print("Вызовы API:", dict(api.calls))
+    if api.throttled:
+        print("Ответов 429:", dict(api.throttled))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='задержка каждого ответа Bot API, с')
+    parser.add_argument('--rate-429', type=float, default=0.0,
+                        help='доля запросов, на которые API отвечает 429')
+    parser.add_argument('--user-id-base', type=int, default=int(time.time()) * 1000,
+                        help='первый user_id (по умолчанию уникален для запуска)')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
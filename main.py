@@ -1,66 +1,71 @@
-import sys
 import asyncio
-import logging
 
 from os import getenv
-from pathlib import Path
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.fsm.storage.memory import DisabledEventIsolation, MemoryStorage
 from dotenv import load_dotenv
 
+from app.archive import user_archiver
+from app.broadcast import broadcast_runner
+from app.broadcast import router as broadcast_router
+from app.dedupe import UpdateDedupeMiddleware
+from app.export import router as export_router
+from app.stats import router as stats_router
 from app.handers import router
-from database.config import init_db
-from app.handers import set_bot_instance
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from database.config import engine
+from database.fsm_storage import PostgresStorage
+from database.instrumentation import instrument_engine
+from database.migrate import migrate
+from app.handers import (MANAGER_IDS, lead_dispatcher, reminder_scheduler,
+                         set_bot_instance)
+from app.history import history_renderer
+from app.keyboards import KeyboardCacheSession
+from app.logging_setup import LogContextMiddleware, setup_logging
+from app.middlewares import BufferedFSMMiddleware, UpdateSchedulerMiddleware
+from app.monitoring import (HandlerMetricsMiddleware, TelegramApiMetrics,
+                            UpdateMetricsMiddleware, start_metrics_server,
+                            survey_stats)
+from app.outbound import OutboundLimiter
+from app.survey import survey_loader
+from app.webhook import run_webhook
 load_dotenv()
 
 
-class MoscowFormatter(logging.Formatter):
-    def formatTime(self, record, datefmt=None):
-        dt = datetime.fromtimestamp(
-            record.created, tz=ZoneInfo("Europe/Moscow"))
-        return dt.strftime(datefmt or "%Y-%m-%d %H:%M:%S")
-
-
-def setup_logging():
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-
-    log_level = getenv("LOG_LEVEL", "INFO").upper()
-    numeric_level = getattr(logging, log_level, logging.INFO)
-
-    formatter = MoscowFormatter(
-        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
-    logger = logging.getLogger()
-    logger.setLevel(numeric_level)
-
-    logger.handlers.clear()
-
-    log_file = log_dir / "bot.log"
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(numeric_level)
-    file_handler.setFormatter(formatter)
-
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(numeric_level)
-    console_handler.setFormatter(formatter)
-
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-
-    logging.getLogger('aiogram').setLevel(logging.WARNING)
-    logging.getLogger('asyncio').setLevel(logging.WARNING)
-
-    return logger
-
-
 TOKEN = getenv('TOKEN')
-
-dp = Dispatcher()
+# Альтернативный Bot API (локальный сервер или фейковый API из loadtest)
+TELEGRAM_API_URL = getenv('TELEGRAM_API_URL')
+# polling — для локальной разработки, webhook — для продакшена за балансировщиком
+BOT_MODE = getenv('BOT_MODE', 'polling').lower()
+
+# postgres — общее для всех процессов хранилище, memory — для локальной отладки
+FSM_STORAGE = getenv('FSM_STORAGE', 'postgres').lower()
+storage = MemoryStorage() if FSM_STORAGE == 'memory' else PostgresStorage()
+
+# Стандартный FSM-middleware заменён буферизующим: одно чтение и одна запись
+# состояния на апдейт вместо обращения к хранилищу на каждый вызов state.*
+# Апдейты одного пользователя выполняются по очереди (UpdateSchedulerMiddleware),
+# иначе следующий апдейт прочитает состояние до того, как предыдущий его
+# сбросит. Эта очередь строже изоляции по ключу FSM, поэтому своя изоляция
+# FSM-middleware не нужна. Повторно доставленные апдейты отбрасываются
+# сразу после входа в очередь: проверка в БД не меняет порядок апдейтов.
+dp = Dispatcher(storage=storage, disable_fsm=True)
+update_dedupe = UpdateDedupeMiddleware()
+dp.update.outer_middleware(UpdateSchedulerMiddleware(MANAGER_IDS))
+dp.update.outer_middleware(update_dedupe)
+dp.update.outer_middleware(UpdateMetricsMiddleware())
+dp.update.outer_middleware(LogContextMiddleware())
+dp.update.outer_middleware(BufferedFSMMiddleware(
+    storage=storage, events_isolation=DisabledEventIsolation()))
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+dp.message.middleware(LogContextMiddleware())
+dp.callback_query.middleware(LogContextMiddleware())
+# Команды менеджера раньше опроса: их FSM-состояния не должны попадать в Form
+dp.include_router(broadcast_router)
+dp.include_router(export_router)
+dp.include_router(stats_router)
 dp.include_router(router)
 
 
@@ -68,17 +73,47 @@ async def main() -> None:
     logger = setup_logging()
     logger.info("Запуск Telegram бота...")
 
-    bot = Bot(token=TOKEN)
+    api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+    bot = Bot(token=TOKEN, session=KeyboardCacheSession(api=api))
+    bot.session.middleware(OutboundLimiter())
+    bot.session.middleware(TelegramApiMetrics())
     set_bot_instance(bot)
 
+    instrument_engine(engine)
+    metrics_runner = await start_metrics_server()
+
     try:
-        await init_db()
+        # Схема ведётся миграциями из database/migrations вместо create_all
+        await migrate(engine)
         logger.info("База данных инициализирована")
-        logger.info("Бот запущен и готов к работе")
-        await dp.start_polling(bot)
+        reminder_scheduler.start()
+        lead_dispatcher.start()
+        survey_stats.start()
+        survey_loader.start()
+        await broadcast_runner.resume(bot)
+        if isinstance(storage, PostgresStorage):
+            storage.start_cleanup()
+        update_dedupe.start_cleanup()
+        user_archiver.start()
+        logger.info("Бот запущен и готов к работе (режим: %s)", BOT_MODE)
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}", exc_info=True)
+        logger.error("Ошибка при запуске бота: %s", e, exc_info=True)
     finally:
+        await reminder_scheduler.stop()
+        await lead_dispatcher.stop()
+        await survey_stats.stop()
+        await survey_loader.stop()
+        await broadcast_runner.stop()
+        await update_dedupe.close()
+        await user_archiver.stop()
+        await history_renderer.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await bot.session.close()
         logger.info("Сессия бота закрыта")
 
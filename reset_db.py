@@ -2,7 +2,10 @@ import asyncio
 import sys
 from pathlib import Path
 
+from sqlalchemy import text
+
 from database.config import engine
+from database.migrate import migrate
 from database.models import Base
 
 # Добавляем корневую папку проекта в путь
@@ -12,13 +15,14 @@ sys.path.append(str(Path(__file__).parent.parent))
 async def reset_database():
     """Удаляет и создаёт заново все таблицы"""
     async with engine.begin() as conn:
-        # Удаляем все таблицы
+        # Удаляем все таблицы вместе с историей миграций
         await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("DROP TABLE IF EXISTS schema_version, users_answers_legacy"))
         print("🗑️  Старые таблицы удалены")
 
-        # Создаём заново
-        await conn.run_sync(Base.metadata.create_all)
-        print("✅ Новые таблицы созданы")
+    # Создаём заново теми же миграциями, что и при запуске бота
+    await migrate(engine)
+    print("✅ Новые таблицы созданы")
 
 
 if __name__ == '__main__':
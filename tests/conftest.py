@@ -0,0 +1,50 @@
+import asyncio
+import os
+
+import pytest
+
+# Тесты с базой требуют явный TEST_DATABASE_URL: схема в ней пересоздаётся
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+if TEST_DATABASE_URL:
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+
+def run(coro):
+    """Выполняет корутину в новом цикле; пул соединений закрывается в нём же"""
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            if TEST_DATABASE_URL:
+                from database.config import engine
+                await engine.dispose()
+    return asyncio.run(wrapper())
+
+
+async def _reset_schema(apply_migrations: bool):
+    from sqlalchemy import text
+
+    from database.config import engine
+    from database.migrate import migrate
+
+    async with engine.begin() as conn:
+        await conn.execute(text('DROP SCHEMA public CASCADE'))
+        await conn.execute(text('CREATE SCHEMA public'))
+    if apply_migrations:
+        await migrate(engine)
+
+
+@pytest.fixture
+def empty_db():
+    """База без единой таблицы"""
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL не задан')
+    run(_reset_schema(apply_migrations=False))
+    from database import crud
+    crud.user_status_cache._items.clear()
+
+
+@pytest.fixture
+def db(empty_db):
+    """Пустая база, схема накатывается миграциями"""
+    run(_reset_schema(apply_migrations=True))
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import select, update
+
+from conftest import run
+from database import crud
+from database.config import AsyncSessionLocal
+from database.models import User, UserArchive
+
+LONG_AGO = crud.now_utc() - timedelta(days=365)
+
+
+async def _users(model):
+    async with AsyncSessionLocal() as session:
+        return set((await session.execute(select(model.user_id))).scalars())
+
+
+async def _backdate(user_id, **columns):
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(User).where(User.user_id == user_id).values(**columns))
+        await session.commit()
+
+
+async def _archive(limit=100):
+    cutoff = crud.now_utc() - timedelta(days=30)
+    return await crud.archive_stale_users(cutoff, cutoff, limit)
+
+
+def test_only_stale_users_are_archived(db):
+    async def scenario():
+        for user_id in range(1, 6):
+            await crud.start_user(user_id, f'user{user_id}')
+        await crud.save_survey(1, qual=False, ans_1=0)   # давний неквал
+        await crud.save_survey(2, qual=True, ans_1=2)    # давний квал — остаётся
+        await crud.save_survey(3, qual=False, ans_1=0)   # свежий неквал — остаётся
+        await _backdate(1, survey_completed_at=LONG_AGO)
+        await _backdate(2, survey_completed_at=LONG_AGO)
+        await _backdate(4, started_at=LONG_AGO)          # бросил опрос давно
+        # 5 — начал опрос только что
+
+        assert await _archive() == 2
+        assert await _users(UserArchive) == {1, 4}
+        assert await _users(User) == {2, 3, 5}
+
+        crud.user_status_cache._items.clear()
+        status = await crud.get_user_status(1)
+        assert status.survey_completed and not status.qual
+        assert (await crud.get_user_by_id(4)).username == 'user4'
+    run(scenario())
+
+
+def test_limit_is_respected(db):
+    async def scenario():
+        for user_id in range(1, 6):
+            await crud.start_user(user_id, None)
+            await _backdate(user_id, started_at=LONG_AGO)
+        assert await _archive(limit=3) == 3
+        assert await _archive(limit=3) == 2
+        assert await _users(User) == set()
+    run(scenario())
+
+
+def test_locked_rows_are_skipped(db):
+    async def scenario():
+        for user_id in (1, 2):
+            await crud.start_user(user_id, None)
+            await _backdate(user_id, started_at=LONG_AGO)
+        async with AsyncSessionLocal() as session:
+            # Строку 1 держит другая транзакция, как /start этого пользователя
+            await session.execute(select(User).where(User.user_id == 1).with_for_update())
+            assert await asyncio.wait_for(_archive(), timeout=5) == 1
+            await session.commit()
+        assert await _users(User) == {1}
+        assert await _archive() == 1
+    run(scenario())
+
+
+def test_existing_archive_row_is_replaced(db):
+    async def scenario():
+        await crud.start_user(1, 'old')
+        await _backdate(1, started_at=LONG_AGO)
+        async with AsyncSessionLocal() as session:
+            # Остаток прерванного переноса: строка уже есть в архиве
+            session.add(UserArchive(user_id=1, username='stale', archived_at=LONG_AGO))
+            await session.commit()
+
+        assert await _archive() == 1
+        async with AsyncSessionLocal() as session:
+            row = await session.get(UserArchive, 1)
+        assert row.username == 'old' and row.archived_at > LONG_AGO
+    run(scenario())
+
+
+def test_start_during_archiving_restores_user(db):
+    async def scenario():
+        await crud.start_user(1, 'old')
+        await crud.save_survey(1, qual=False, ans_1=3)
+        await _backdate(1, survey_completed_at=LONG_AGO)
+        cutoff = crud.now_utc() - timedelta(days=30)
+        async with AsyncSessionLocal() as archiver:
+            # Архивация уже забрала строку, но ещё не закоммитила перенос
+            result = await archiver.execute(crud._archive_stale_users_query(cutoff, cutoff, 10))
+            assert result.rowcount == 1
+            start = asyncio.create_task(crud.start_user(1, 'back'))
+            await asyncio.sleep(0.3)
+            assert not start.done()
+            await archiver.commit()
+        status = await asyncio.wait_for(start, timeout=5)
+
+        assert status.survey_completed and not status.qual
+        assert await _users(UserArchive) == set()
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, 1)
+        assert (user.username, user.ans_1) == ('back', 3)
+    run(scenario())
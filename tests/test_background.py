@@ -0,0 +1,58 @@
+import asyncio
+
+from app.background import PeriodicWorker
+
+
+def test_tick_delay_and_notify():
+    async def scenario():
+        calls = []
+
+        async def tick():
+            calls.append(asyncio.get_running_loop().time())
+            # Первый вызов просит повторить сразу, дальше — долгая пауза
+            return 0 if len(calls) == 1 else 60
+
+        worker = PeriodicWorker("тест", 60, tick)
+        worker.start()
+        await asyncio.sleep(0.05)
+        assert len(calls) == 2
+        worker.notify()
+        await asyncio.sleep(0.05)
+        await worker.stop()
+        return len(calls)
+    assert asyncio.run(scenario()) == 3
+
+
+def test_error_does_not_stop_loop():
+    async def scenario():
+        calls = []
+
+        async def tick():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError('db is down')
+
+        worker = PeriodicWorker("тест", 0.01, tick)
+        worker.start()
+        await asyncio.sleep(0.1)
+        await worker.stop()
+        return len(calls)
+    assert asyncio.run(scenario()) > 1
+
+
+def test_first_delay_and_disabled_interval():
+    async def scenario():
+        calls = []
+
+        async def tick():
+            calls.append(1)
+
+        delayed = PeriodicWorker("тест", 60, tick, first_delay=60)
+        disabled = PeriodicWorker("тест", 0, tick)
+        delayed.start()
+        disabled.start()
+        await asyncio.sleep(0.05)
+        await delayed.stop()
+        await disabled.stop()
+        return calls
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import update
+
+from conftest import run
+from database import crud
+from database.config import AsyncSessionLocal
+from database.models import Broadcast
+
+LEASE = timedelta(minutes=2)
+
+
+async def _create(owner='a'):
+    return await crud.create_broadcast(created_by=1, from_chat_id=1, message_id=1,
+                                       segment={}, total=10, owner=owner, lease=LEASE)
+
+
+async def _expire(broadcast_id):
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Broadcast).where(Broadcast.id == broadcast_id)
+                              .values(lease_until=crud.now_utc() - timedelta(seconds=1)))
+        await session.commit()
+
+
+def test_leased_broadcast_is_not_claimed(db):
+    async def scenario():
+        await _create('a')
+        assert await crud.claim_broadcasts('b', LEASE) == []
+    run(scenario())
+
+
+def test_expired_lease_moves_to_one_owner(db):
+    async def scenario():
+        broadcast = await _create('a')
+        await _expire(broadcast.id)
+        claims = await asyncio.gather(*(crud.claim_broadcasts(owner, LEASE) for owner in 'bcdef'))
+        assert sorted(len(claimed) for claimed in claims) == [0, 0, 0, 0, 1]
+        [owner] = [owner for owner, claimed in zip('bcdef', claims) if claimed]
+
+        # Прежний владелец узнаёт о потере аренды при сохранении прогресса
+        assert await crud.checkpoint_broadcast(broadcast.id, 'a', LEASE, 5, 5, 0, 0) is None
+        assert await crud.checkpoint_broadcast(broadcast.id, owner, LEASE, 5, 5, 0, 0) == 'running'
+    run(scenario())
+
+
+def test_checkpoint_renews_lease(db):
+    async def scenario():
+        broadcast = await _create('a')
+        await _expire(broadcast.id)
+        assert await crud.checkpoint_broadcast(broadcast.id, 'a', LEASE, 5, 5, 0, 0) == 'running'
+        assert await crud.claim_broadcasts('b', LEASE) == []
+    run(scenario())
+
+
+def test_release_hands_over_immediately(db):
+    async def scenario():
+        broadcast = await _create('a')
+        await crud.release_broadcasts('a')
+        [claimed] = await crud.claim_broadcasts('b', LEASE)
+        assert (claimed.id, claimed.owner) == (broadcast.id, 'b')
+    run(scenario())
+
+
+def test_finished_broadcast_is_not_claimed(db):
+    async def scenario():
+        broadcast = await _create('a')
+        await crud.finish_broadcast(broadcast.id)
+        await _expire(broadcast.id)
+        assert await crud.claim_broadcasts('b', LEASE) == []
+    run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.types import Update
+
+from app.dedupe import RecentUpdates, UpdateDedupeMiddleware
+from conftest import run
+
+BOT = SimpleNamespace(id=1)
+
+
+class Handler:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self, event, data):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('обработчик упал')
+        return 'ok'
+
+
+async def _feed(middleware, handler, update_id=100):
+    return await middleware(handler, Update(update_id=update_id), {'bot': BOT})
+
+
+def test_window_forgets_oldest():
+    recent = RecentUpdates(size=2)
+    assert recent.add((1, 1)) and recent.add((1, 2)) and recent.add((1, 3))
+    assert recent.add((1, 1))
+    assert not recent.add((1, 3))
+
+
+def test_duplicate_is_dropped_in_memory():
+    async def scenario():
+        middleware, handler = UpdateDedupeMiddleware(persistent=False), Handler()
+        assert await _feed(middleware, handler) == 'ok'
+        assert await _feed(middleware, handler) is None
+        return handler.calls
+    assert asyncio.run(scenario()) == 1
+
+
+def test_failed_update_is_processed_on_redelivery():
+    async def scenario():
+        middleware = UpdateDedupeMiddleware(persistent=False)
+        with pytest.raises(RuntimeError):
+            await _feed(middleware, Handler(fail=True))
+        return await _feed(middleware, Handler())
+    assert asyncio.run(scenario()) == 'ok'
+
+
+def test_other_replica_sees_processed_update(db):
+    async def scenario():
+        first, second = UpdateDedupeMiddleware(persistent=True), UpdateDedupeMiddleware(persistent=True)
+        handler = Handler()
+        assert await _feed(first, handler) == 'ok'
+        assert await _feed(second, handler) is None
+        return handler.calls
+    assert run(scenario()) == 1
+
+
+def test_failed_update_is_unmarked_in_database(db):
+    async def scenario():
+        first, second = UpdateDedupeMiddleware(persistent=True), UpdateDedupeMiddleware(persistent=True)
+        with pytest.raises(RuntimeError):
+            await _feed(first, Handler(fail=True))
+        return await _feed(second, Handler())
+    assert run(scenario()) == 'ok'
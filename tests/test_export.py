@@ -0,0 +1,80 @@
+import asyncio
+import csv
+
+from aiogram.filters import CommandObject
+from openpyxl import load_workbook
+from sqlalchemy import update
+
+from app import export
+from app.export import EXPORT_HELP, export_command, export_segment
+from conftest import run
+from database import crud
+from database.config import AsyncSessionLocal
+from database.models import User
+
+
+class FakeMessage:
+    def __init__(self):
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+def test_unbalanced_quote_gets_usage():
+    message = FakeMessage()
+    asyncio.run(export_command(message, CommandObject(command='export', args='leads ans_7="Германия')))
+    [answer] = message.answers
+    assert answer.endswith(EXPORT_HELP)
+
+
+def test_unknown_condition_gets_usage():
+    message = FakeMessage()
+    asyncio.run(export_command(message, CommandObject(command='export', args='xlsx color=red')))
+    [answer] = message.answers
+    assert 'color' in answer and answer.endswith(EXPORT_HELP)
+
+
+async def _user_with_comment(comment):
+    await crud.start_user(1, '@admin')
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(User).values(comments=comment))
+        await session.commit()
+
+
+def test_formula_in_csv_is_text(db, tmp_path):
+    path = tmp_path / 'users.csv'
+    run(_user_with_comment('=1+1'))
+    assert run(export_segment({}, 'csv', str(path))) == 1
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        [_, row] = list(csv.reader(f))
+    assert row[-1] == "'=1+1"
+    assert row[1] == "'@admin"
+
+
+def test_formula_in_xlsx_is_text(db, tmp_path):
+    path = tmp_path / 'users.xlsx'
+    run(_user_with_comment('=HYPERLINK("http://example.com")'))
+    assert run(export_segment({}, 'xlsx', str(path))) == 1
+    comment = load_workbook(path).active.cell(row=2, column=16)
+    assert comment.data_type == 's'
+    assert comment.value == '=HYPERLINK("http://example.com")'
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append(text)
+
+
+def test_export_error_is_not_sent_to_chat(monkeypatch):
+    async def broken(segment, fmt, path):
+        raise RuntimeError('relation "users" does not exist')
+
+    monkeypatch.setattr(export, 'export_segment', broken)
+    bot = FakeBot()
+    asyncio.run(export._send_export(bot, 1, {}, 'users', 'csv'))
+    [message] = bot.messages
+    assert 'relation' not in message
@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.dispatcher.middlewares.user_context import (EVENT_CONTEXT_KEY,
+                                                         EventContext)
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+from aiogram.types import Chat, User
+
+from app.middlewares import BufferedFSMMiddleware
+
+BOT = SimpleNamespace(id=1)
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+        self.writes = 0
+
+    async def get_state(self, key):
+        self.reads += 1
+        return await super().get_state(key)
+
+    async def get_data(self, key):
+        self.reads += 1
+        return await super().get_data(key)
+
+    async def set_state(self, key, state=None):
+        self.writes += 1
+        await super().set_state(key, state)
+
+    async def set_data(self, key, data):
+        self.writes += 1
+        await super().set_data(key, data)
+
+
+def _data():
+    context = EventContext(chat=Chat(id=10, type='private'), user=User(id=10, is_bot=False, first_name='u'))
+    return {'bot': BOT, EVENT_CONTEXT_KEY: context}
+
+
+def _middleware(storage):
+    return BufferedFSMMiddleware(storage=storage, events_isolation=SimpleEventIsolation())
+
+
+def test_changes_are_flushed_once():
+    async def handler(event, data):
+        state = data['state']
+        await state.set_state('Survey:q1')
+        await state.update_data(ans_1=0)
+        await state.set_state('Survey:q2')
+        await state.update_data(ans_2=1)
+
+    async def scenario():
+        storage = CountingStorage()
+        await _middleware(storage)(handler, None, _data())
+        assert await storage.get_state(KEY) == 'Survey:q2'
+        assert await storage.get_data(KEY) == {'ans_1': 0, 'ans_2': 1}
+        return storage
+    storage = asyncio.run(scenario())
+    assert storage.writes == 2  # set_state + set_data, без промежуточных записей
+
+
+def test_unchanged_context_is_not_written():
+    async def handler(event, data):
+        await data['state'].get_data()
+        await data['state'].set_state(None)
+
+    async def scenario():
+        storage = CountingStorage()
+        await _middleware(storage)(handler, None, _data())
+        return storage
+    assert asyncio.run(scenario()).writes == 0
+
+
+def test_flushed_when_handler_fails():
+    async def handler(event, data):
+        await data['state'].set_state('Survey:q1')
+        raise RuntimeError
+
+    async def scenario():
+        storage = MemoryStorage()
+        with pytest.raises(RuntimeError):
+            await _middleware(storage)(handler, None, _data())
+        return await storage.get_state(KEY)
+    assert asyncio.run(scenario()) == 'Survey:q1'
+
+
+def test_concurrent_updates_of_one_user_do_not_overwrite():
+    async def handler(event, data):
+        counter = await data['state'].get_value('counter', 0)
+        await asyncio.sleep(0.01)
+        await data['state'].update_data(counter=counter + 1)
+
+    async def scenario():
+        storage = MemoryStorage()
+        middleware = _middleware(storage)
+        await asyncio.gather(*(middleware(handler, None, _data()) for _ in range(5)))
+        return await storage.get_data(KEY)
+    assert asyncio.run(scenario()) == {'counter': 5}
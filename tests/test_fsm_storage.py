@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import update
+
+from conftest import run
+from database.fsm_storage import PostgresStorage
+from database.models import FSMRecord
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=11, user_id=11)
+
+
+def test_state_and_data_roundtrip(db):
+    async def scenario():
+        storage = PostgresStorage()
+        assert await storage.get_record(KEY) == (None, {})
+        await storage.set_state(KEY, 'Survey:q1')
+        await storage.set_data(KEY, {'ans_1': 0})
+        assert await storage.get_state(KEY) == 'Survey:q1'
+        assert await storage.get_data(KEY) == {'ans_1': 0}
+        # Соседний ключ не затронут
+        assert await storage.get_record(OTHER_KEY) == (None, {})
+
+        await storage.set_record(KEY, 'Survey:q2')
+        assert await storage.get_record(KEY) == ('Survey:q2', {'ans_1': 0})
+        await storage.set_record(KEY, None, {})
+        assert await storage.get_record(KEY) == (None, {})
+    run(scenario())
+
+
+def test_update_data_merges_in_database(db):
+    async def scenario():
+        storage = PostgresStorage()
+        assert await storage.update_data(KEY, {'ans_1': 0}) == {'ans_1': 0}
+        assert await storage.update_data(KEY, {'ans_2': 1}) == {'ans_1': 0, 'ans_2': 1}
+        assert await storage.update_data(KEY, {'ans_1': 2}) == {'ans_1': 2, 'ans_2': 1}
+    run(scenario())
+
+
+def test_cleanup_removes_only_stale_sessions(db):
+    async def scenario():
+        storage = PostgresStorage(ttl=timedelta(hours=1))
+        await storage.set_state(KEY, 'Survey:q1')
+        await storage.set_state(OTHER_KEY, 'Survey:q1')
+        async with storage.engine.begin() as conn:
+            await conn.execute(
+                update(FSMRecord).where(FSMRecord.chat_id == KEY.chat_id)
+                .values(updated_at=FSMRecord.updated_at - timedelta(hours=2)))
+        assert await storage.cleanup() == 1
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_state(OTHER_KEY) == 'Survey:q1'
+    run(scenario())
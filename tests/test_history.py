@@ -0,0 +1,86 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import EditMessageText
+
+from app.history import (EMPTY_HISTORY, HISTORY_DIGEST_KEY, HistoryRenderer,
+                         history_digest)
+
+CHAT_ID = 10
+MESSAGE_ID = 5
+KEY = StorageKey(bot_id=1, chat_id=CHAT_ID, user_id=CHAT_ID)
+
+
+class FakeBot:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.edits = []
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        if self.fail:
+            raise TelegramBadRequest(method=EditMessageText(chat_id=chat_id, message_id=message_id,
+                                                            text=text),
+                                     message='Bad Request: message to edit not found')
+        self.edits.append(text)
+
+
+async def _answer(renderer: HistoryRenderer, bot: FakeBot, state: FSMContext, answer: str | None):
+    data = await state.get_data()
+    data.pop('question_1', None)
+    if answer is not None:
+        data['question_1'] = answer
+    await state.set_data(data)
+    await renderer.schedule(bot, CHAT_ID, state)
+    await renderer.close()
+
+
+def _state(storage):
+    return FSMContext(storage=storage, key=KEY)
+
+
+async def _start(storage):
+    await _state(storage).set_data({'history_message_id': MESSAGE_ID,
+                                    HISTORY_DIGEST_KEY: history_digest(EMPTY_HISTORY)})
+
+
+def test_replicas_share_rendered_digest():
+    async def scenario():
+        storage, bot = MemoryStorage(), FakeBot()
+        await _start(storage)
+        replica_a, replica_b = HistoryRenderer(debounce=0), HistoryRenderer(debounce=0)
+
+        await _answer(replica_a, bot, _state(storage), 'A')
+        await _answer(replica_b, bot, _state(storage), None)   # «назад» на другой реплике
+        await _answer(replica_a, bot, _state(storage), 'A')
+        return bot.edits
+    edits = asyncio.run(scenario())
+    assert len(edits) == 3
+    assert edits[1] == EMPTY_HISTORY and edits[0] == edits[2] != EMPTY_HISTORY
+
+
+def test_unchanged_history_is_not_edited():
+    async def scenario():
+        storage, bot = MemoryStorage(), FakeBot()
+        await _start(storage)
+        renderer = HistoryRenderer(debounce=0)
+        await _answer(renderer, bot, _state(storage), None)
+        await _answer(renderer, bot, _state(storage), 'A')
+        await _answer(renderer, bot, _state(storage), 'A')
+        return bot.edits
+    assert len(asyncio.run(scenario())) == 1
+
+
+def test_failed_edit_is_retried_with_same_text():
+    async def scenario():
+        storage = MemoryStorage()
+        await _start(storage)
+        renderer = HistoryRenderer(debounce=0)
+        await _answer(renderer, FakeBot(fail=True), _state(storage), 'A')
+        assert (await storage.get_data(KEY))[HISTORY_DIGEST_KEY] is None
+        bot = FakeBot()
+        await _answer(renderer, bot, _state(storage), 'A')
+        return bot.edits
+    assert len(asyncio.run(scenario())) == 1
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from conftest import TEST_DATABASE_URL, run
+from database import instrumentation
+
+
+def test_failed_query_does_not_leak_timing(monkeypatch):
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL не задан')
+    monkeypatch.setattr(instrumentation, 'DB_METRICS_ENABLED', True)
+
+    async def scenario():
+        engine = create_async_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0)
+        instrumentation.instrument_engine(engine)
+        try:
+            for _ in range(3):
+                async with engine.connect() as conn:
+                    with pytest.raises(DBAPIError):
+                        await conn.execute(text('SELECT 1/0'))
+            async with engine.connect() as conn:
+                queries = instrumentation.db_queries_total.get()
+                await conn.execute(text('SELECT 1'))
+                assert instrumentation.db_queries_total.get() == queries + 1
+                return list(conn.info.get('query_start', []))
+        finally:
+            await engine.dispose()
+    assert run(scenario()) == []
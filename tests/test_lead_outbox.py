@@ -0,0 +1,121 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from app import handers
+from conftest import run
+from database import crud
+from database.config import AsyncSessionLocal
+from database.models import LeadOutbox
+
+LEASE = 120
+
+
+async def _lead_user(user_id=1, qual=True):
+    await crud.start_user(user_id, 'user')
+    await crud.save_survey(user_id, qual=qual)
+    await crud.update_user_phone(user_id, '+70000000000')
+
+
+async def _outbox_rows():
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(func.count()).select_from(LeadOutbox))).scalar_one()
+
+
+def test_only_qualified_lead_is_queued(db):
+    async def scenario():
+        await _lead_user(1, qual=False)
+        assert await crud.submit_lead(1, 'комментарий') is False
+        await _lead_user(2)
+        assert await crud.submit_lead(2, 'комментарий') is True
+        assert await _outbox_rows() == 1
+    run(scenario())
+
+
+def test_repeated_submit_does_not_duplicate(db):
+    async def scenario():
+        await _lead_user()
+        results = await asyncio.gather(*(crud.submit_lead(1, 'комментарий') for _ in range(5)))
+        assert sorted(results) == [False] * 4 + [True]
+        assert await _outbox_rows() == 1
+
+        [lead] = await crud.claim_lead_outbox(10, LEASE)
+        assert await crud.mark_lead_sent(lead.outbox_id)
+        # После доставки новый лид того же пользователя снова можно поставить
+        assert await crud.submit_lead(1, 'ещё комментарий') is True
+    run(scenario())
+
+
+def test_claim_leases_lead(db):
+    async def scenario():
+        await _lead_user()
+        await crud.submit_lead(1, 'комментарий')
+        [lead] = await crud.claim_lead_outbox(10, LEASE)
+        assert (lead.user_id, lead.attempts, lead.comments) == (1, 1, 'комментарий')
+        assert await crud.claim_lead_outbox(10, LEASE) == []
+
+        assert await crud.mark_lead_sent(lead.outbox_id)
+        assert not await crud.mark_lead_sent(lead.outbox_id)
+        assert await crud.get_next_lead_due() is None
+    run(scenario())
+
+
+def test_expired_lease_and_retry(db):
+    async def scenario():
+        await _lead_user()
+        await crud.submit_lead(1, 'комментарий')
+        [lead] = await crud.claim_lead_outbox(10, 0)
+        [again] = await crud.claim_lead_outbox(10, 0)
+        assert (again.outbox_id, again.attempts) == (lead.outbox_id, 2)
+
+        await crud.retry_lead(lead.outbox_id, 'boom', delay=60)
+        assert await crud.claim_lead_outbox(10, LEASE) == []
+        assert await crud.get_next_lead_due() > crud.now_utc()
+    run(scenario())
+
+
+def test_concurrent_claims_do_not_overlap(db):
+    async def scenario():
+        for user_id in range(1, 21):
+            await _lead_user(user_id)
+            await crud.submit_lead(user_id, 'комментарий')
+        batches = await asyncio.gather(*(crud.claim_lead_outbox(5, LEASE) for _ in range(6)))
+        ids = [lead.outbox_id for batch in batches for lead in batch]
+        assert len(ids) == len(set(ids)) == 20
+    run(scenario())
+
+
+class FakeBot:
+    def __init__(self, fail_for=()):
+        self.fail_for = set(fail_for)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.fail_for:
+            raise RuntimeError('timeout')
+        self.sent.append(chat_id)
+
+
+def test_redelivery_skips_managers_who_got_the_lead(db, monkeypatch):
+    monkeypatch.setattr(handers, 'MANAGER_IDS', [101, 102])
+    monkeypatch.setattr(handers, 'LEAD_ROUTING', 'all')
+
+    async def scenario():
+        await _lead_user()
+        await crud.submit_lead(1, 'comment')
+        [lead] = await crud.claim_lead_outbox(10, 0)
+        first = FakeBot(fail_for={102})
+        monkeypatch.setattr(handers, 'bot_instance', first)
+        await handers.send_lead(lead)
+        # mark_lead_sent не дошёл до базы: аренда истекла, лид забирают снова
+        [again] = await crud.claim_lead_outbox(10, 0)
+        assert again.delivered_to == [101]
+        second = FakeBot()
+        monkeypatch.setattr(handers, 'bot_instance', second)
+        await handers.send_lead(again)
+        [last] = await crud.claim_lead_outbox(10, 0)
+        third = FakeBot()
+        monkeypatch.setattr(handers, 'bot_instance', third)
+        await handers.send_lead(last)
+        return first.sent, second.sent, third.sent, last.delivered_to
+    assert run(scenario()) == ([101], [102], [], [101, 102])
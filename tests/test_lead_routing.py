@@ -0,0 +1,42 @@
+import asyncio
+from datetime import timedelta
+
+from conftest import run
+from database import crud
+
+MANAGERS = [101, 102, 103, 104, 105]
+
+
+def test_first_assignment_is_kept(db):
+    async def scenario():
+        assert await crud.assign_lead(1, 101) == 101
+        # Повторная доставка лида не меняет адресата
+        assert await crud.assign_lead(1, 102) == 101
+    run(scenario())
+
+
+def test_concurrent_claims_have_one_winner(db):
+    async def scenario():
+        await crud.assign_lead(1, None)
+        owners = await asyncio.gather(*(crud.claim_lead(1, manager) for manager in MANAGERS))
+        assert len(set(owners)) == 1 and owners[0] in MANAGERS
+        # Поздний клик видит уже закреплённого менеджера
+        assert await crud.claim_lead(1, 101 if owners[0] != 101 else 102) == owners[0]
+    run(scenario())
+
+
+def test_claim_without_assignment_row(db):
+    async def scenario():
+        owners = await asyncio.gather(*(crud.claim_lead(2, manager) for manager in MANAGERS))
+        assert len(set(owners)) == 1
+    run(scenario())
+
+
+def test_least_loaded_manager(db):
+    async def scenario():
+        await crud.assign_lead(1, 101)
+        await crud.assign_lead(2, 101)
+        await crud.assign_lead(3, 102)
+        assert await crud.pick_least_loaded_manager([101, 102, 103], timedelta(hours=1)) == 103
+        assert await crud.pick_least_loaded_manager([101, 102], timedelta(hours=1)) == 102
+    run(scenario())
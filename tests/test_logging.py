@@ -0,0 +1,42 @@
+import ast
+import logging
+from pathlib import Path
+
+from app.logging_setup import ContextFilter, update_id_var
+
+ROOT = Path(__file__).parent.parent
+LEVELS = {'debug', 'info', 'warning', 'error', 'exception', 'critical'}
+
+
+def test_log_calls_are_lazy():
+    """Сообщение форматируется только если запись прошла уровень и сэмплирование"""
+    eager = []
+    for path in ROOT.rglob('*.py'):
+        if any(part.startswith('.') or part == 'tests' for part in path.relative_to(ROOT).parts):
+            continue
+        for node in ast.walk(ast.parse(path.read_text(encoding='utf-8'))):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in LEVELS and node.args
+                    and isinstance(node.args[0], ast.JoinedStr)):
+                eager.append(f'{path.relative_to(ROOT)}:{node.lineno}')
+    assert eager == []
+
+
+def test_sampling_keeps_whole_update_and_errors():
+    context_filter = ContextFilter(sample_rate=0.5)
+
+    def record(level):
+        return logging.LogRecord('bot', level, __file__, 1, 'сообщение %s', (1,), None)
+
+    kept = []
+    for update_id in range(1000):
+        token = update_id_var.set(update_id)
+        try:
+            info = [context_filter.filter(record(logging.INFO)) for _ in range(3)]
+            assert len(set(info)) == 1
+            assert context_filter.filter(record(logging.ERROR))
+            kept.append(info[0])
+        finally:
+            update_id_var.reset(token)
+    assert 400 < sum(kept) < 600
+    assert context_filter.filter(record(logging.INFO))
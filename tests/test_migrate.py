@@ -0,0 +1,71 @@
+import asyncio
+import shutil
+
+import pytest
+from sqlalchemy import text
+
+from conftest import run
+from database.config import engine
+from database.migrate import MIGRATIONS_DIR, load_migrations, migrate
+
+ALL_VERSIONS = [version for version, _, _ in load_migrations()]
+
+
+async def _applied():
+    async with engine.connect() as conn:
+        result = await conn.execute(text('SELECT version FROM schema_version ORDER BY version'))
+        return result.scalars().all()
+
+
+def test_versions_are_sorted_and_unique(tmp_path):
+    assert ALL_VERSIONS == sorted(set(ALL_VERSIONS))
+    (tmp_path / '0001_a.sql').write_text('')
+    (tmp_path / '0001_b.sql').write_text('')
+    with pytest.raises(RuntimeError):
+        load_migrations(tmp_path)
+
+
+def test_fresh_database_and_rerun(empty_db):
+    async def scenario():
+        assert await migrate(engine) == ALL_VERSIONS
+        assert await migrate(engine) == []
+        return await _applied()
+    assert run(scenario()) == ALL_VERSIONS
+
+
+def test_concurrent_runs_apply_once(empty_db):
+    async def scenario():
+        results = await asyncio.gather(migrate(engine), migrate(engine), migrate(engine))
+        return sorted(results, key=len)
+    assert run(scenario()) == [[], [], ALL_VERSIONS]
+
+
+def test_failed_migration_is_rolled_back(empty_db, tmp_path):
+    (tmp_path / '0001_ok.sql').write_text('CREATE TABLE t_ok (id INT);')
+    (tmp_path / '0002_bad.sql').write_text('CREATE TABLE t_bad (id INT); SELECT 1/0;')
+
+    async def scenario():
+        with pytest.raises(Exception):
+            await migrate(engine, tmp_path)
+        async with engine.connect() as conn:
+            tables = (await conn.execute(text(
+                "SELECT tablename FROM pg_tables WHERE schemaname = 'public' ORDER BY 1"))).scalars().all()
+        return await _applied(), tables
+    assert run(scenario()) == ([1], ['schema_version', 't_ok'])
+
+
+def test_legacy_text_answers_are_converted(empty_db, tmp_path):
+    shutil.copy(MIGRATIONS_DIR / '0001_initial.sql', tmp_path)
+
+    async def scenario():
+        await migrate(engine, tmp_path)
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "INSERT INTO users (user_id, ans_1, ans_7, ans_8) VALUES (1, '18–21', 'Германия', 'Физика')"))
+        await migrate(engine)
+        async with engine.connect() as conn:
+            row = (await conn.execute(text('SELECT ans_1, ans_7, ans_8 FROM users'))).one()
+            legacy = (await conn.execute(text('SELECT ans_1 FROM users_answers_legacy'))).scalar_one()
+        return tuple(row), legacy
+    assert run(scenario()) == ((2, 0, 'Физика'), '18–21')
+
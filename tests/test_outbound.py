@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage
+
+from app.outbound import OutboundLimiter
+
+BOT = SimpleNamespace(id=1)
+RETRY_AFTER = 0.2
+
+
+class FlakyApi:
+    """Отвечает 429 на первые failures вызовов и записывает время попыток"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = []
+
+    async def __call__(self, bot, method):
+        loop = asyncio.get_running_loop()
+        self.attempts.append(loop.time())
+        if len(self.attempts) <= self.failures:
+            raise TelegramRetryAfter(method=method, message='Too Many Requests', retry_after=RETRY_AFTER)
+        return 'ok'
+
+
+def _gaps(attempts):
+    return [b - a for a, b in zip(attempts, attempts[1:])]
+
+
+def _call(method, failures=2):
+    async def scenario():
+        api = FlakyApi(failures)
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=1000, chat_burst=10)
+        assert await limiter(api, BOT, method) == 'ok'
+        return api.attempts
+    return asyncio.run(scenario())
+
+
+def test_edit_waits_retry_after():
+    attempts = _call(EditMessageText(chat_id=1, message_id=1, text='x'))
+    assert len(attempts) == 3
+    assert all(gap >= RETRY_AFTER * 0.9 for gap in _gaps(attempts))
+
+
+def test_send_waits_retry_after():
+    attempts = _call(SendMessage(chat_id=1, text='x'))
+    assert len(attempts) == 3
+    assert all(gap >= RETRY_AFTER * 0.9 for gap in _gaps(attempts))
+
+
+def test_chat_pause_does_not_block_other_chats():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        limiter = OutboundLimiter(global_rate=1000, chat_rate=1000, chat_burst=10)
+        flaky = asyncio.create_task(limiter(FlakyApi(1), BOT, SendMessage(chat_id=1, text='x')))
+        await asyncio.sleep(0.01)
+        started = loop.time()
+        await limiter(FlakyApi(0), BOT, SendMessage(chat_id=2, text='x'))
+        elapsed = loop.time() - started
+        await flaky
+        return elapsed
+    assert asyncio.run(scenario()) < RETRY_AFTER / 2
+
+
+def test_gives_up_after_max_retries():
+    async def scenario():
+        limiter = OutboundLimiter(max_retries=1)
+        try:
+            await limiter(FlakyApi(5), BOT, EditMessageText(chat_id=1, message_id=1, text='x'))
+        except TelegramRetryAfter:
+            return True
+        return False
+    assert asyncio.run(scenario())
+
+
+async def _no_sleep(delay):
+    pass
+
+
+class Timeout:
+    """Обрыв соединения на первые failures вызовов"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self, bot, method):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TelegramNetworkError(method=method, message='Request timeout error')
+        return 'ok'
+
+
+@pytest.mark.parametrize('method', [
+    EditMessageText(chat_id=1, message_id=1, text='x'),
+    AnswerCallbackQuery(callback_query_id='1'),
+])
+def test_idempotent_method_is_retried_after_timeout(method, monkeypatch):
+    monkeypatch.setattr(asyncio, 'sleep', _no_sleep)
+    api = Timeout(1)
+    assert asyncio.run(OutboundLimiter()(api, BOT, method)) == 'ok'
+    assert api.calls == 2
+
+
+def test_send_is_not_retried_after_timeout(monkeypatch):
+    monkeypatch.setattr(asyncio, 'sleep', _no_sleep)
+    api = Timeout(1)
+    with pytest.raises(TelegramNetworkError):
+        asyncio.run(OutboundLimiter()(api, BOT, SendMessage(chat_id=1, text='x')))
+    # Telegram мог принять сообщение до обрыва: повтор отправил бы дубль
+    assert api.calls == 1
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from sqlalchemy import select, update
+
+from app import handers
+from conftest import run
+from database.config import AsyncSessionLocal
+from database.crud import (claim_due_reminders, complete_reminder, now_utc,
+                           save_survey, schedule_user_reminders, start_user)
+from database.models import Reminder
+
+USER_ID = 1001
+LEASE = timedelta(minutes=5)
+
+
+class FakeBot:
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.error:
+            raise self.error
+        self.sent.append((chat_id, text))
+
+
+async def _schedule(*overdue_minutes):
+    """Планирует все этапы и переносит перечисленные в прошлое"""
+    await start_user(USER_ID, 'user')
+    await schedule_user_reminders(USER_ID, USER_ID, (10, 120, 1440))
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Reminder)
+            .where(Reminder.minutes.in_(overdue_minutes))
+            .values(due_at=now_utc() - timedelta(minutes=1)))
+        await session.commit()
+
+
+async def _remaining():
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Reminder.minutes).order_by(Reminder.minutes))
+        return result.scalars().all()
+
+
+def test_claim_leases_without_deleting(db):
+    async def scenario():
+        await _schedule(10)
+        claimed = await claim_due_reminders(10, LEASE)
+        assert [r.minutes for r in claimed] == [10]
+        # Арендованное напоминание не забирается повторно, но и не удаляется
+        assert await claim_due_reminders(10, LEASE) == []
+        assert await _remaining() == [10, 120, 1440]
+        await complete_reminder(USER_ID, 10, claimed[0].due_at)
+        assert await _remaining() == [120, 1440]
+    run(scenario())
+
+
+def test_expired_lease_is_claimed_again(db):
+    async def scenario():
+        await _schedule(10)
+        assert len(await claim_due_reminders(10, timedelta(0))) == 1
+        assert len(await claim_due_reminders(10, LEASE)) == 1
+    run(scenario())
+
+
+def test_only_latest_overdue_stage_is_sent(db):
+    async def scenario():
+        await _schedule(10, 120, 1440)
+        claimed = await claim_due_reminders(10, LEASE)
+        assert [r.minutes for r in claimed] == [1440]
+        assert await _remaining() == [1440]
+    run(scenario())
+
+
+def test_failed_send_keeps_reminder(db, monkeypatch):
+    async def scenario():
+        await _schedule(10)
+        [reminder] = await claim_due_reminders(10, LEASE)
+        monkeypatch.setattr(handers, 'bot_instance', FakeBot(RuntimeError('5xx')))
+        await handers.send_reminder(reminder)
+        assert await _remaining() == [10, 120, 1440]
+
+        bot = FakeBot()
+        monkeypatch.setattr(handers, 'bot_instance', bot)
+        await handers.send_reminder(reminder)
+        assert len(bot.sent) == 1
+        assert await _remaining() == [120, 1440]
+    run(scenario())
+
+
+def test_completed_survey_drops_reminder_unsent(db, monkeypatch):
+    async def scenario():
+        await _schedule(10)
+        [reminder] = await claim_due_reminders(10, LEASE)
+        await save_survey(USER_ID, qual=True)
+        bot = FakeBot()
+        monkeypatch.setattr(handers, 'bot_instance', bot)
+        await handers.send_reminder(reminder)
+        assert bot.sent == []
+        assert await _remaining() == [120, 1440]
+    run(scenario())
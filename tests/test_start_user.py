@@ -0,0 +1,58 @@
+from sqlalchemy import select, update
+
+from conftest import run
+from database import crud
+from database.config import AsyncSessionLocal
+from database.models import User, UserArchive
+
+
+async def _user(user_id):
+    async with AsyncSessionLocal() as session:
+        return await session.get(User, user_id)
+
+
+def test_new_user(db):
+    async def scenario():
+        status = await crud.start_user(1, 'first')
+        assert status == crud.UserStatus(False, False, False, False)
+        user = await _user(1)
+        assert user.username == 'first'
+        assert user.registered_at and user.started_at
+    run(scenario())
+
+
+def test_repeated_start_resets_progress_only(db):
+    async def scenario():
+        await crud.start_user(1, 'first')
+        await crud.save_survey(1, qual=True, ans_1=2)
+        started_at = (await _user(1)).started_at
+
+        status = await crud.start_user(1, 'renamed', reset_progress=False)
+        user = await _user(1)
+        assert status.survey_completed and status.qual
+        assert (user.username, user.started_at) == ('renamed', started_at)
+
+        await crud.start_user(1, 'renamed')
+        user = await _user(1)
+        assert user.started_at > started_at
+        assert user.ans_1 == 2
+    run(scenario())
+
+
+def test_archived_user_is_moved_back(db):
+    async def scenario():
+        await crud.start_user(1, 'first')
+        await crud.save_survey(1, qual=False, ans_1=3)
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(User).values(survey_completed_at=crud.now_utc().replace(year=2000)))
+            await session.commit()
+        assert await crud.archive_stale_users(crud.now_utc(), crud.now_utc().replace(year=2000), 10) == 1
+        assert await _user(1) is None
+
+        status = await crud.start_user(1, 'back')
+        assert status.survey_completed and not status.qual
+        user = await _user(1)
+        assert (user.username, user.ans_1) == ('back', 3)
+        async with AsyncSessionLocal() as session:
+            assert (await session.execute(select(UserArchive))).first() is None
+    run(scenario())
@@ -0,0 +1,62 @@
+import pytest
+
+from app.survey import compile_survey
+
+
+def definition(options, aliases=None, disqualify=None):
+    question = {'id': 1, 'text': 'Сколько вам лет?', 'options': options}
+    if aliases:
+        question['aliases'] = aliases
+    return {'questions': [question], 'disqualify': disqualify or {}}
+
+
+OLD = compile_survey(definition(['до 14', '14–17', '18+'], disqualify={'1': ['до 14']}))
+
+
+def test_appended_option_keeps_indexes():
+    survey = compile_survey(definition(['до 14', '14–17', '18+', 'не скажу']), OLD)
+    assert survey.questions[1].indexes == {'до 14': 0, '14–17': 1, '18+': 2, 'не скажу': 3}
+
+
+def test_reordered_options_are_rejected():
+    with pytest.raises(ValueError, match='сменил номер'):
+        compile_survey(definition(['14–17', 'до 14', '18+']), OLD)
+
+
+def test_removed_option_is_rejected():
+    with pytest.raises(ValueError, match='удалять варианты'):
+        compile_survey(definition(['до 14', '14–17']), OLD)
+
+
+def test_rename_without_alias_is_rejected():
+    with pytest.raises(ValueError, match='aliases'):
+        compile_survey(definition(['до 14', '14–17', '18 и старше']), OLD)
+
+
+def test_rename_with_alias_keeps_old_text():
+    survey = compile_survey(definition(['до 14', '14–17', '18 и старше'],
+                                       aliases={'18+': '18 и старше'}), OLD)
+    assert survey.questions[1].indexes['18+'] == survey.questions[1].indexes['18 и старше'] == 2
+    # Следующая перезагрузка без alias уже не пройдёт: старый текст мог остаться в сессиях
+    with pytest.raises(ValueError, match='aliases'):
+        compile_survey(definition(['до 14', '14–17', '18 и старше']), survey)
+
+
+def test_alias_pointing_to_other_index_is_rejected():
+    with pytest.raises(ValueError, match='сменил номер'):
+        compile_survey(definition(['до 14', '14–17', '18 и старше'],
+                                  aliases={'18+': '14–17'}), OLD)
+
+
+def test_alias_must_target_existing_option():
+    with pytest.raises(ValueError, match='неизвестный вариант'):
+        compile_survey(definition(['до 14', '14–17', '18+'], aliases={'старше 18': '19+'}))
+
+
+def test_disqualify_accepts_alias_and_rejects_unknown():
+    survey = compile_survey(definition(['младше 14', '14–17', '18+'],
+                                       aliases={'до 14': 'младше 14'},
+                                       disqualify={'1': ['до 14']}), OLD)
+    assert survey.disqualify == {1: frozenset({0})}
+    with pytest.raises(ValueError, match='нет вариантов'):
+        compile_survey(definition(['до 14', '14–17', '18+'], disqualify={'1': ['до 13']}))
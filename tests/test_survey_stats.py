@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from app import handers
+from app.monitoring import SurveyStats, today_msk
+from app.survey import survey_loader
+
+
+def _answers(stats, q_num, day=None):
+    return {option: count for (counted_on, metric, question, option), count in stats._counts.items()
+            if metric == 'answer' and question == q_num and count
+            and (day is None or counted_on == day)}
+
+
+def test_reanswer_replaces_previous_answer(monkeypatch):
+    stats = SurveyStats()
+    monkeypatch.setattr(handers, 'survey_stats', stats)
+    survey = survey_loader.survey
+    question = next(q for q in survey.questions.values() if len(q.options) > 1)
+    first, second = question.options[:2]
+
+    data = handers._count_answer(survey, question.id, first, {})
+    assert _answers(stats, question.id) == {0: 1}
+    # «Назад» и другой ответ: учитывается только последний
+    handers._count_answer(survey, question.id, second, data)
+    assert _answers(stats, question.id) == {1: 1}
+
+
+def test_text_answer_is_counted_once(monkeypatch):
+    stats = SurveyStats()
+    monkeypatch.setattr(handers, 'survey_stats', stats)
+    survey = survey_loader.survey
+    question = next(q for q in survey.questions.values() if q.is_text)
+
+    data = handers._count_answer(survey, question.id, 'первый', {})
+    handers._count_answer(survey, question.id, 'второй', data)
+    assert _answers(stats, question.id) == {-1: 1}
+    assert stats._counts[(today_msk(), 'answer', question.id, -1)] == 1
+
+
+def test_reanswer_next_day_decrements_original_day(monkeypatch):
+    stats = SurveyStats()
+    monkeypatch.setattr(handers, 'survey_stats', stats)
+    survey = survey_loader.survey
+    question = next(q for q in survey.questions.values() if len(q.options) > 1)
+    yesterday = today_msk() - timedelta(days=1)
+
+    data = handers._count_answer(survey, question.id, question.options[0], {})
+    assert data[f'answered_on_{question.id}'] == today_msk().isoformat()
+    # Первый ответ был посчитан вчера, сессия продолжилась сегодня
+    stats._counts.clear()
+    stats.incr('answer', question.id, 0, day=yesterday)
+    data[f'answered_on_{question.id}'] = yesterday.isoformat()
+
+    handers._count_answer(survey, question.id, question.options[1], data)
+    assert _answers(stats, question.id, yesterday) == {}
+    assert _answers(stats, question.id, today_msk()) == {1: 1}
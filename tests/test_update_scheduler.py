@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.types import User
+
+from app import handers
+from app.middlewares import UpdateSchedulerMiddleware
+
+
+def _data(user_id):
+    return {'event_from_user': User(id=user_id, is_bot=False, first_name='u')}
+
+
+def test_updates_of_one_user_run_in_order():
+    order = []
+
+    async def handler(event, data):
+        order.append(('start', event))
+        await asyncio.sleep(0.01)
+        order.append(('end', event))
+
+    async def scenario():
+        scheduler = UpdateSchedulerMiddleware()
+        await asyncio.gather(*(scheduler(handler, i, _data(1)) for i in range(3)))
+        return scheduler._queues
+    assert asyncio.run(scenario()) == {}
+    assert order == [(step, i) for i in range(3) for step in ('start', 'end')]
+
+
+def test_concurrency_is_bounded_and_managers_have_own_lane():
+    running = {'user': 0, 'manager': 0}
+    peak = {'user': 0, 'manager': 0}
+
+    async def handler(event, data):
+        lane = 'manager' if data['event_from_user'].id == 999 else 'user'
+        running[lane] += 1
+        peak[lane] = max(peak[lane], running[lane])
+        await asyncio.sleep(0.01)
+        running[lane] -= 1
+
+    async def scenario():
+        scheduler = UpdateSchedulerMiddleware(manager_ids=[999], concurrency=3, manager_concurrency=1)
+        users = [scheduler(handler, None, _data(user_id)) for user_id in range(10)]
+        managers = [scheduler(handler, None, _data(999)) for _ in range(2)]
+        await asyncio.gather(*users, *managers)
+    asyncio.run(scenario())
+    assert peak == {'user': 3, 'manager': 1}
+
+
+def test_faq_is_sent_without_holding_the_handler(monkeypatch):
+    monkeypatch.setattr(handers, 'FAQ_DELAY', 0.05)
+    sent = []
+
+    async def answer(text, **kwargs):
+        sent.append(text)
+
+    async def scenario():
+        message = SimpleNamespace(answer=answer, chat=SimpleNamespace(id=1))
+        handers.send_faq_later(message)
+        assert sent == []
+        await asyncio.sleep(0.1)
+    asyncio.run(scenario())
+    assert sent == [handers.FAQ]
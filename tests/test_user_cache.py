@@ -0,0 +1,54 @@
+from database import crud
+from database.crud import UserStatus, UserStatusCache
+
+from conftest import run
+
+STATUS = UserStatus(survey_completed=False, qual=False, has_phone=False, has_comments=False)
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(crud.time, 'monotonic', lambda: clock[0])
+    cache = UserStatusCache(maxsize=10, ttl=5)
+    cache.set(1, STATUS)
+    clock[0] += 4.9
+    assert cache.get(1) == STATUS
+    clock[0] += 0.2
+    assert cache.get(1) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = UserStatusCache(maxsize=2, ttl=60)
+    cache.set(1, STATUS)
+    cache.set(2, STATUS)
+    cache.get(1)
+    cache.set(3, STATUS)
+    assert cache.get(2) is None
+    assert cache.get(1) == STATUS
+    assert cache.get(3) == STATUS
+
+
+def test_update_and_invalidate():
+    cache = UserStatusCache(maxsize=10, ttl=60)
+    cache.update(1, qual=True)
+    assert cache.get(1) is None
+    cache.set(1, STATUS)
+    cache.update(1, qual=True)
+    assert cache.get(1).qual
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_writes_go_through_cache(db):
+    async def scenario():
+        await crud.start_user(1, 'user')
+        assert await crud.get_user_status(1) == STATUS
+        await crud.save_survey(1, qual=True)
+        await crud.update_user_phone(1, '+70000000000')
+        cached = crud.user_status_cache.get(1)
+        assert cached == UserStatus(survey_completed=True, qual=True, has_phone=True, has_comments=False)
+        # Кэш совпадает с базой
+        crud.user_status_cache.invalidate(1)
+        assert await crud.get_user_status(1) == cached
+    run(scenario())
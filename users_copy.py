@@ -0,0 +1,244 @@
+"""
+Массовая выгрузка и загрузка таблицы users через COPY.
+
+    python users_copy.py export users.csv
+    python users_copy.py export users.bin --format binary --columns user_id,phone,qual
+    python users_copy.py export archive.csv --table users_archive
+    python users_copy.py import crm.csv --map "ID=user_id,Телефон=phone" --on-conflict update
+
+Выгрузка пишет таблицу потоком COPY TO. Загрузка идёт в два шага:
+COPY FROM во временную staging-таблицу, затем один
+INSERT ... SELECT ... ON CONFLICT (user_id) в users. Весь импорт —
+одна транзакция: при ошибке в users ничего не попадает. Пользователи
+файла, перенесённые архивацией в users_archive, сначала возвращаются
+в users, и --on-conflict действует на них как на существующих.
+
+Колонки CSV берутся из заголовка (или --columns), --map переименовывает
+их в колонки users, остальные колонки файла пропускаются. Ответы ans_N —
+номера вариантов, как в самой таблице. Бот кэширует статусы
+пользователей до USER_CACHE_TTL секунд.
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+
+import asyncpg
+
+from database.models import User
+
+USERS_COLUMNS = [column.name for column in User.__table__.columns]
+CHUNK_SIZE = 1024 * 1024
+# Память под сортировку staging в DISTINCT ON: с 4 МБ по умолчанию она уходит на диск
+IMPORT_WORK_MEM = os.getenv('IMPORT_WORK_MEM', '256MB')
+PROGRESS_INTERVAL = 0.5
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class Progress:
+    """Печатает объём переданных данных не чаще раза в PROGRESS_INTERVAL."""
+
+    def __init__(self, action: str, total: int | None = None):
+        self.action = action
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+        self._printed = 0.0
+
+    def add(self, size: int):
+        self.done += size
+        now = time.perf_counter()
+        if now - self._printed >= PROGRESS_INTERVAL:
+            self._printed = now
+            self._print()
+
+    def _print(self, end: str = ''):
+        line = f"\r{self.action}: {self.done / 2 ** 20:.1f} МБ"
+        if self.total:
+            line += f" из {self.total / 2 ** 20:.1f} МБ ({self.done * 100 / self.total:.0f}%)"
+        elapsed = time.perf_counter() - self.started
+        line += f", {elapsed:.1f} с"
+        print(line, end=end, file=sys.stderr, flush=True)
+
+    def finish(self):
+        self._print(end='\n')
+
+
+def parse_mapping(value: str | None) -> dict[str, str]:
+    mapping = {}
+    for pair in filter(None, (value or '').split(',')):
+        source, sep, target = pair.partition('=')
+        if not sep:
+            raise SystemExit(f"--map: ожидается колонка_файла=колонка_users, получено {pair!r}")
+        mapping[source.strip()] = target.strip()
+    return mapping
+
+
+def read_csv_header(path: str, delimiter: str) -> list[str]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f, delimiter=delimiter), [])
+
+
+async def _driver_connection(engine):
+    conn = await engine.connect()
+    raw = await conn.get_raw_connection()
+    return conn, raw.driver_connection
+
+
+async def export_users(engine, path: str, fmt: str, columns: list[str], delimiter: str,
+                       table: str = 'users'):
+    progress = Progress("Выгружено")
+    options = dict(format=fmt)
+    if fmt == 'csv':
+        options.update(header=True, delimiter=delimiter)
+
+    with open(path, 'wb') as f:
+        async def write(chunk: bytes):
+            await asyncio.to_thread(f.write, chunk)
+            progress.add(len(chunk))
+
+        conn, driver = await _driver_connection(engine)
+        try:
+            status = await driver.copy_from_table(
+                table, columns=columns, output=write, **options)
+        finally:
+            await conn.close()
+    progress.finish()
+    print(f"✅ {status.split()[-1]} строк записано в {path}")
+
+
+async def _read_chunks(path: str, progress: Progress):
+    with open(path, 'rb') as f:
+        while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+            progress.add(len(chunk))
+            yield chunk
+
+
+async def import_users(engine, path: str, fmt: str, file_columns: list[str],
+                       mapping: dict[str, str], on_conflict: str, header: bool,
+                       delimiter: str):
+    # Колонки файла -> колонки users; неизвестные грузятся в staging как текст и пропускаются
+    targets = [mapping.get(name, name) for name in file_columns]
+    columns = [name for name in targets if name in USERS_COLUMNS]
+    if 'user_id' not in columns:
+        raise SystemExit("В файле должна быть колонка user_id (или укажите её через --map)")
+    if len(columns) != len(set(columns)):
+        raise SystemExit(f"Несколько колонок файла указывают на одну колонку users: {columns}")
+    skipped = [source for source, target in zip(file_columns, targets) if target not in USERS_COLUMNS]
+    if skipped:
+        print(f"Пропускаются колонки файла: {', '.join(skipped)}", file=sys.stderr)
+    if fmt == 'binary' and skipped:
+        raise SystemExit("В бинарном формате все колонки файла должны быть колонками users")
+
+    staging_columns = [name if name in USERS_COLUMNS else f'skip_{i}'
+                       for i, name in enumerate(targets)]
+    column_list = ', '.join(map(_quote, columns))
+    if on_conflict == 'update':
+        updates = ', '.join(f"{_quote(c)} = EXCLUDED.{_quote(c)}" for c in columns if c != 'user_id')
+        conflict = f"ON CONFLICT (user_id) DO UPDATE SET {updates}" if updates else "ON CONFLICT DO NOTHING"
+    elif on_conflict == 'skip':
+        conflict = "ON CONFLICT (user_id) DO NOTHING"
+    else:
+        conflict = ""
+
+    options = dict(format=fmt)
+    if fmt == 'csv':
+        options.update(header=header, delimiter=delimiter)
+    progress = Progress("Загружено", os.path.getsize(path))
+
+    conn, driver = await _driver_connection(engine)
+    try:
+        async with driver.transaction():
+            # staging без ограничений и индексов, временная — без записи в WAL
+            await driver.execute(
+                f"CREATE TEMP TABLE users_staging ON COMMIT DROP AS "
+                f"SELECT {column_list} FROM users WITH NO DATA")
+            for name in staging_columns:
+                if name not in USERS_COLUMNS:
+                    await driver.execute(f"ALTER TABLE users_staging ADD COLUMN {name} TEXT")
+            status = await driver.copy_to_table(
+                'users_staging', source=_read_chunks(path, progress),
+                columns=staging_columns, **options)
+            progress.finish()
+            print(f"Во временную таблицу загружено {status.split()[-1]} строк", file=sys.stderr)
+
+            await driver.execute("ANALYZE users_staging")
+            all_columns = ', '.join(map(_quote, USERS_COLUMNS))
+            status = await driver.execute(
+                f"WITH moved AS (DELETE FROM users_archive a USING users_staging s "
+                f"WHERE a.user_id = s.user_id RETURNING a.*) "
+                f"INSERT INTO users ({all_columns}) SELECT {all_columns} FROM moved")
+            if restored := int(status.split()[-1]):
+                print(f"Возвращено из архива: {restored}", file=sys.stderr)
+            await driver.execute(f"SET LOCAL work_mem = '{IMPORT_WORK_MEM}'")
+            started = time.perf_counter()
+            # Повторы user_id в файле: остаётся последняя строка, иначе ON CONFLICT
+            # DO UPDATE упадёт на втором изменении той же строки
+            status = await driver.execute(
+                f"INSERT INTO users ({column_list}) "
+                f"SELECT DISTINCT ON (user_id) {column_list} FROM users_staging "
+                f"WHERE user_id IS NOT NULL ORDER BY user_id, ctid DESC {conflict}")
+            print(f"Вставка в users: {time.perf_counter() - started:.1f} с", file=sys.stderr)
+    finally:
+        await conn.close()
+    print(f"✅ В users записано {status.split()[-1]} строк")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('path', help='файл для выгрузки или загрузки')
+    parser.add_argument('--format', choices=('csv', 'binary'), default='csv')
+    parser.add_argument('--columns',
+                        help='колонки через запятую; для export — колонки users (по умолчанию все), '
+                             'для import — колонки файла, если у CSV нет заголовка или формат binary')
+    parser.add_argument('--map', help='переименование колонок файла: колонка_файла=колонка_users,...')
+    parser.add_argument('--on-conflict', choices=('update', 'skip', 'error'), default='update',
+                        help='что делать с уже существующими user_id (по умолчанию update)')
+    parser.add_argument('--no-header', action='store_true', help='у CSV нет строки заголовка')
+    parser.add_argument('--delimiter', default=',', help='разделитель CSV')
+    parser.add_argument('--table', choices=('users', 'users_archive'), default='users',
+                        help='для export: горячая таблица или архив')
+    parser.add_argument('--database-url', help='подменяет DATABASE_URL')
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    columns = [c.strip() for c in args.columns.split(',')] if args.columns else None
+
+    # После подмены DATABASE_URL
+    from database.config import engine
+
+    if args.command == 'export':
+        table_columns = USERS_COLUMNS + ['archived_at'] if args.table == 'users_archive' else USERS_COLUMNS
+        columns = columns or table_columns
+        if unknown := set(columns) - set(table_columns):
+            raise SystemExit(f"Нет таких колонок в {args.table}: {', '.join(sorted(unknown))}")
+        coro = export_users(engine, args.path, args.format, columns, args.delimiter, args.table)
+    else:
+        header = args.format == 'csv' and not args.no_header
+        if columns is None:
+            if not header:
+                raise SystemExit("Укажите --columns: у файла нет заголовка")
+            columns = read_csv_header(args.path, args.delimiter)
+        coro = import_users(engine, args.path, args.format, columns, parse_mapping(args.map),
+                            args.on_conflict, header, args.delimiter)
+
+    async def run():
+        try:
+            await coro
+        except asyncpg.PostgresError as e:
+            raise SystemExit(f"❌ Ошибка PostgreSQL, изменения отменены: {e}")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()